@@ -0,0 +1,340 @@
+import os
+import ast
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import rasterio
+import numpy as np
+import logging
+
+from ndvi_calculation import (
+    DEFAULT_BLOCK_SIZE, NDVI_NODATA, OUTPUT_TILE_SIZE, QUANTIZED_INDEX_NODATA, QUANTIZED_INDEX_SCALE,
+    generate_windows, quantize_index
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Nodata value written for pixels without a valid index value
+INDEX_NODATA = NDVI_NODATA
+
+# Common spectral indices over reflectance-scaled bands (0-1)
+INDEX_FORMULAS = {
+    "ndvi": "(nir - red) / (nir + red)",
+    "ndwi": "(green - nir) / (green + nir)",
+    "nbr": "(nir - swir2) / (nir + swir2)",
+    "evi": "2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)",
+    "savi": "1.5 * (nir - red) / (nir + red + 0.5)",
+}
+
+# Functions that may be called inside a formula
+FORMULA_FUNCTIONS = {
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "exp": np.exp,
+    "minimum": np.minimum,
+    "maximum": np.maximum,
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd,
+)
+
+def compile_formula(formula):
+    """
+    Parse, validate and compile a band-math formula once for repeated evaluation.
+
+    Formulas are arithmetic expressions over band names, numeric constants and the
+    functions in FORMULA_FUNCTIONS, e.g. "(nir - red) / (nir + red)".
+
+    Parameters:
+        formula (str): The formula to compile.
+
+    Returns:
+        tuple: (code object, set of band names used by the formula).
+
+    Raises:
+        ValueError: If the formula has invalid syntax or uses unsupported operations.
+    """
+    try:
+        tree = ast.parse(formula, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid formula '{formula}': {e.msg}")
+
+    band_names = set()
+    called = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"Unsupported operation in formula '{formula}': {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Only numeric constants are allowed in formula '{formula}'.")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FORMULA_FUNCTIONS:
+                raise ValueError(f"Unsupported function in formula '{formula}'. "
+                                 f"Choose from {sorted(FORMULA_FUNCTIONS)}.")
+        elif isinstance(node, ast.Name):
+            if node.id not in FORMULA_FUNCTIONS:
+                band_names.add(node.id)
+            elif id(node) not in called:
+                raise ValueError(f"Function '{node.id}' must be called in formula '{formula}'.")
+
+    return compile(tree, f"<formula {formula}>", 'eval'), band_names
+
+def evaluate_formulas(compiled, band_data, shape):
+    """
+    Evaluate compiled formulas over a set of band arrays.
+
+    Every result is a new array of the window shape, so a formula that is a
+    bare band name or a constant never aliases a band buffer or stays 0-d.
+
+    Parameters:
+        compiled (dict): Mapping of output name to (code object, band names) from compile_formula.
+        band_data (dict): Mapping of band name to float32 array.
+        shape (tuple): Shape of the window (rows, cols).
+
+    Returns:
+        dict: Mapping of output name to float32 array, with INDEX_NODATA where the
+            result is not finite (e.g. division by zero).
+    """
+    namespace = dict(FORMULA_FUNCTIONS)
+    namespace.update(band_data)
+
+    results = {}
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for name, (code, _) in compiled.items():
+            result = np.array(np.broadcast_to(eval(code, {"__builtins__": {}}, namespace), shape),
+                              dtype=np.float32)
+            result[~np.isfinite(result)] = INDEX_NODATA
+            results[name] = result
+    return results
+
+def parse_band_source(source):
+    """
+    Normalise a band source to a (path, band index) pair.
+
+    Parameters:
+        source (str or tuple): Path to a single-band raster, or a (path, band index) tuple.
+
+    Returns:
+        tuple: (path, band index).
+    """
+    if isinstance(source, (tuple, list)):
+        return source[0], int(source[1])
+    return source, 1
+
+def validate_band_sources(sources):
+    """
+    Validate that all input rasters share the same dimensions, CRS and transform.
+
+    Parameters:
+        sources (dict): Mapping of path to opened DatasetReader.
+
+    Raises:
+        ValueError: If the rasters do not line up.
+    """
+    logging.info("Validating raster dimensions and CRS.")
+    reference = next(iter(sources.values()))
+    for path, src in sources.items():
+        if src.shape != reference.shape:
+            raise ValueError(f"All input bands must have the same dimensions ({path} differs).")
+        if src.crs != reference.crs:
+            raise ValueError(f"All input bands must have the same CRS ({path} differs).")
+        if src.transform != reference.transform:
+            raise ValueError(f"All input bands must share the same grid ({path} differs).")
+
+def process_window(sources, band_map, compiled, destinations, window, buffers, block_size, reflectance_scale,
+                   read_lock, write_lock, quantize=False):
+    """
+    Read every required band for one window once, evaluate all formulas and write the results.
+
+    Parameters:
+        sources (dict): Mapping of path to opened DatasetReader.
+        band_map (dict): Mapping of band name to (path, band index).
+        compiled (dict): Mapping of output name to (code object, band names).
+        destinations (dict): Mapping of output name to opened output dataset.
+        window (Window): The window to process.
+        buffers (threading.local): Thread-local storage for the band buffers.
+        block_size (int): Size of the processing windows in pixels.
+        reflectance_scale (float): Factor applied to band values before evaluation.
+        read_lock (Lock): Lock guarding reads from the source datasets.
+        write_lock (Lock): Lock guarding writes to the output datasets.
+        quantize (bool): Write int16 values of index * 10000 (default: False).
+    """
+    if not hasattr(buffers, "bands"):
+        buffers.bands = {name: np.empty(block_size * block_size, dtype=np.float32) for name in band_map}
+        buffers.mask = np.empty(block_size * block_size, dtype=bool)
+
+    size = window.height * window.width
+    shape = (window.height, window.width)
+    band_data = {name: buffer[:size].reshape(shape) for name, buffer in buffers.bands.items()}
+    mask = buffers.mask[:size].reshape(shape)
+
+    with read_lock:
+        for name, (path, index) in band_map.items():
+            sources[path].read(index, window=window, out=band_data[name])
+
+    mask.fill(False)
+    for name, (path, _) in band_map.items():
+        nodata = sources[path].nodata
+        if nodata is not None:
+            mask |= band_data[name] == nodata
+        if reflectance_scale != 1:
+            band_data[name] *= reflectance_scale
+
+    results = evaluate_formulas(compiled, band_data, shape)
+    for name, values in results.items():
+        values[mask] = INDEX_NODATA
+        if quantize:
+            if not hasattr(buffers, "quantized"):
+                buffers.quantized = {key: np.empty(block_size * block_size, dtype=np.int16) for key in compiled}
+            results[name] = quantize_index(values, buffers.quantized[name][:size].reshape(shape))
+
+    with write_lock:
+        for name, dst in destinations.items():
+            dst.write(results[name], 1, window=window)
+
+def calculate_and_save_indices(bands, outputs, formulas=None, reflectance_scale=1.0,
+                               block_size=DEFAULT_BLOCK_SIZE, num_workers=None, quantize=False):
+    """
+    Calculate several spectral indices from named bands in one fused windowed pass.
+
+    Each formula is compiled once. Every window of every required band is read
+    once, all requested indices are evaluated from the same buffers and each is
+    written to its own tiled float32 GeoTIFF, or int16 GeoTIFF holding index * 10000
+    with a matching scale in its metadata when quantize is set.
+
+    Parameters:
+        bands (dict): Mapping of band name (e.g. 'red', 'nir') to a raster path or (path, band index).
+        outputs (dict): Mapping of index name to output path. Names are looked up in
+            formulas first, then INDEX_FORMULAS.
+        formulas (dict): Additional or overriding formulas keyed by index name (optional).
+        reflectance_scale (float): Factor converting band values to reflectance, e.g.
+            0.0001 for Sentinel-2 L2A digital numbers (default: 1).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
+        quantize (bool): Write scaled int16 instead of float32 outputs (default: False).
+    """
+    sources = {}
+    destinations = {}
+    try:
+        if not outputs:
+            raise ValueError("No indices requested.")
+        num_workers = num_workers or os.cpu_count() or 1
+        available_formulas = dict(INDEX_FORMULAS)
+        available_formulas.update(formulas or {})
+
+        compiled = {}
+        for name in outputs:
+            if name not in available_formulas:
+                raise ValueError(f"No formula defined for index '{name}'.")
+            compiled[name] = compile_formula(available_formulas[name])
+            logging.info(f"Compiled {name}: {available_formulas[name]}")
+
+        required = set().union(*(names for _, names in compiled.values()))
+        missing = required - set(bands)
+        if missing:
+            raise ValueError(f"Missing input bands for the requested indices: {sorted(missing)}")
+        band_map = {name: parse_band_source(bands[name]) for name in sorted(required)}
+
+        # Open each input file once, even when it supplies several bands
+        for path, _ in band_map.values():
+            if path not in sources:
+                logging.info(f"Opening input raster: {path}")
+                sources[path] = rasterio.open(path)
+        validate_band_sources(sources)
+        reference = next(iter(sources.values()))
+
+        for name, path in outputs.items():
+            logging.info(f"Saving {name} to: {path}")
+            destinations[name] = rasterio.open(
+                path,
+                'w',
+                driver='GTiff',
+                height=reference.height,
+                width=reference.width,
+                count=1,
+                dtype='int16' if quantize else 'float32',
+                crs=reference.crs,
+                transform=reference.transform,
+                nodata=QUANTIZED_INDEX_NODATA if quantize else INDEX_NODATA,
+                tiled=True,
+                blockxsize=OUTPUT_TILE_SIZE,
+                blockysize=OUTPUT_TILE_SIZE,
+                BIGTIFF='IF_SAFER'
+            )
+            if quantize:
+                destinations[name].scales = (1 / QUANTIZED_INDEX_SCALE,)
+                destinations[name].offsets = (0.0,)
+
+        windows = list(generate_windows(reference.width, reference.height, block_size))
+        logging.info(f"Calculating {', '.join(outputs)} over {len(windows)} windows "
+                     f"using {num_workers} worker threads.")
+
+        buffers = threading.local()
+        read_lock = threading.Lock()
+        write_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(
+                    process_window, sources, band_map, compiled, destinations, window, buffers, block_size,
+                    reflectance_scale, read_lock, write_lock, quantize
+                )
+                for window in windows
+            ]
+            for future in futures:
+                future.result()
+
+        logging.info("Index calculation and saving completed successfully.")
+
+    except FileNotFoundError as e:
+        logging.error(f"File not found: {e}")
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
+    except rasterio.errors.RasterioIOError as e:
+        logging.error(f"Rasterio error occurred: {e}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+    finally:
+        for dataset in list(destinations.values()) + list(sources.values()):
+            dataset.close()
+
+def parse_assignments(values):
+    """
+    Parse NAME=VALUE command-line arguments into a dictionary.
+
+    Parameters:
+        values (list): Strings of the form NAME=VALUE.
+
+    Returns:
+        dict: Mapping of NAME to VALUE.
+    """
+    assignments = {}
+    for value in values or []:
+        name, sep, rest = value.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got '{value}'")
+        assignments[name.strip()] = rest.strip()
+    return assignments
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculate spectral indices from named bands in one pass.")
+    parser.add_argument('--band', action='append', required=True, help="Band input as NAME=PATH, e.g. red=B04.tif")
+    parser.add_argument('--index', action='append', required=True, help="Index output as NAME=PATH, e.g. ndvi=ndvi.tif")
+    parser.add_argument('--formula', action='append', help="Custom formula as NAME=EXPRESSION")
+    parser.add_argument('--reflectance-scale', type=float, default=1.0,
+                        help="Factor converting band values to reflectance (default: 1)")
+    parser.add_argument('--quantize', action='store_true', help="Write int16 index * 10000 instead of float32")
+    args = parser.parse_args()
+
+    calculate_and_save_indices(
+        parse_assignments(args.band),
+        parse_assignments(args.index),
+        formulas=parse_assignments(args.formula),
+        reflectance_scale=args.reflectance_scale,
+        quantize=args.quantize
+    )
+
+if __name__ == "__main__":
+    main()
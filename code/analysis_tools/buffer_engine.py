@@ -0,0 +1,551 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+import numpy as np
+import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+import logging
+
+try:
+    import pyogrio
+    import pyarrow as pa
+except ImportError:  # geopandas before 1.0 reads through fiona instead
+    pyogrio = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Number of features read, buffered and written at a time
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Buffer styles accepted by shapely.buffer
+CAP_STYLES = ("round", "flat", "square")
+JOIN_STYLES = ("round", "mitre", "bevel")
+
+# Segments used to approximate a quarter circle (GeoSeries.buffer's default)
+DEFAULT_QUAD_SEGMENTS = 16
+
+# How layers without a metric CRS are buffered: in the UTM zone of each feature, in an
+# azimuthal equidistant projection centred near each feature, or in Web Mercator
+METRIC_PROJECTIONS = ("utm", "aeqd", "mercator")
+
+# Size of the lon/lat cells whose centres are used as azimuthal equidistant projection centres
+AEQD_CELL_DEGREES = 2.0
+
+# Latitude limits of the UTM zones; features beyond them use the polar UPS projections
+UTM_NORTH_LIMIT = 84.0
+UTM_SOUTH_LIMIT = -80.0
+
+def ensure_crs_in_meters(gdf):
+    """
+    Ensure the GeoDataFrame has a CRS in meters. Reprojects if necessary.
+
+    Parameters:
+        gdf (GeoDataFrame): The input GeoDataFrame.
+
+    Returns:
+        GeoDataFrame: A GeoDataFrame with a CRS in meters.
+
+    Raises:
+        ValueError: If the GeoDataFrame has no CRS.
+    """
+    if gdf.crs is None:
+        raise ValueError("The GeoDataFrame does not have a defined CRS.")
+
+    crs = CRS.from_user_input(gdf.crs)
+    if not crs.is_projected or crs.axis_info[0].unit_name != 'metre':
+        logging.warning("CRS is not in meters. Reprojecting to EPSG:3857 (Web Mercator).")
+        gdf = gdf.to_crs(epsg=3857)
+    return gdf
+
+def is_metric_crs(crs):
+    """
+    Check whether a CRS is projected with metre units.
+
+    Parameters:
+        crs: Anything accepted by pyproj.CRS.from_user_input.
+
+    Returns:
+        bool: True if distances in the CRS are metres.
+    """
+    crs = CRS.from_user_input(crs)
+    return crs.is_projected and crs.axis_info[0].unit_name == 'metre'
+
+def local_projection_keys(lons, lats, projection="utm"):
+    """
+    Choose a local metric projection for every feature from its centre.
+
+    Parameters:
+        lons, lats (ndarray): Longitude and latitude of each feature's centre in degrees.
+        projection (str): 'utm' for the UTM zone (UPS near the poles) or 'aeqd' for an azimuthal
+            equidistant projection centred on the feature's AEQD_CELL_DEGREES cell.
+
+    Returns:
+        ndarray: An integer key per feature (see local_projection); features sharing a key form a group.
+    """
+    if projection == "utm":
+        zones = np.clip(np.floor((lons + 180) / 6).astype(np.int64), 0, 59) + 1
+        keys = np.where(lats >= 0, 32600, 32700) + zones
+        keys = np.where(lats > UTM_NORTH_LIMIT, 32661, keys)
+        return np.where(lats < UTM_SOUTH_LIMIT, 32761, keys)
+
+    rows = np.clip(np.floor((lats + 90) / AEQD_CELL_DEGREES).astype(np.int64), 0, int(180 / AEQD_CELL_DEGREES) - 1)
+    cols = np.clip(np.floor((lons + 180) / AEQD_CELL_DEGREES).astype(np.int64), 0, int(360 / AEQD_CELL_DEGREES) - 1)
+    return rows * int(360 / AEQD_CELL_DEGREES) + cols
+
+def local_projection(key, projection="utm"):
+    """
+    Build the PROJ definition of a local metric projection on the WGS84 ellipsoid.
+
+    Parameters:
+        key (int): Key from local_projection_keys: a UTM/UPS EPSG code, or an AEQD cell index.
+        projection (str): 'utm' or 'aeqd'.
+
+    Returns:
+        str: The PROJ definition.
+    """
+    if projection == "utm":
+        if key in (32661, 32761):
+            return "+proj=ups +south +ellps=WGS84" if key == 32761 else "+proj=ups +ellps=WGS84"
+        south = " +south" if key // 100 == 327 else ""
+        return f"+proj=utm +zone={key % 100}{south} +ellps=WGS84"
+
+    row, col = divmod(int(key), int(360 / AEQD_CELL_DEGREES))
+    lat = -90 + (row + 0.5) * AEQD_CELL_DEGREES
+    lon = -180 + (col + 0.5) * AEQD_CELL_DEGREES
+    return f"+proj=aeqd +lat_0={lat:g} +lon_0={lon:g} +ellps=WGS84"
+
+def local_central_meridian(key, projection="utm"):
+    """
+    Return the central meridian of a local metric projection.
+
+    Parameters:
+        key (int): Key from local_projection_keys.
+        projection (str): 'utm' or 'aeqd'.
+
+    Returns:
+        float: Central meridian in degrees, or None for the polar UPS projections.
+    """
+    if projection == "utm":
+        if key in (32661, 32761):
+            return None
+        return (key % 100) * 6 - 183.0
+
+    _, col = divmod(int(key), int(360 / AEQD_CELL_DEGREES))
+    return -180 + (col + 0.5) * AEQD_CELL_DEGREES
+
+def unwrap_longitudes(geometries, lon_0):
+    """
+    Shift longitudes into [lon_0 - 180, lon_0 + 180), so features next to the antimeridian stay contiguous.
+
+    Parameters:
+        geometries (ndarray): Geometries in longitude/latitude.
+        lon_0 (float): Central longitude in degrees.
+
+    Returns:
+        ndarray: The shifted geometries.
+    """
+    def shift(coordinates):
+        coordinates[:, 0] = lon_0 + np.mod(coordinates[:, 0] - lon_0 + 180, 360) - 180
+        return coordinates
+
+    return shapely.transform(geometries, shift)
+
+def split_at_antimeridian(geometries):
+    """
+    Split geometries that extend beyond longitude -180 or 180 into parts on either side of the antimeridian.
+
+    Parts beyond the antimeridian are shifted by 360 degrees, so every result
+    lies within [-180, 180] and a buffer crossing it becomes a valid MultiPolygon.
+
+    Parameters:
+        geometries (ndarray): Geometries in longitude/latitude, possibly unwrapped.
+
+    Returns:
+        ndarray: The normalised geometries.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    bounds = shapely.bounds(geometries)
+    crossing = np.flatnonzero((bounds[:, 0] < -180) | (bounds[:, 2] > 180))
+    if crossing.size == 0:
+        return geometries
+
+    parts = geometries[crossing]
+    west = shapely.transform(shapely.clip_by_rect(parts, -540, -90, -180, 90), lambda xy: xy + [360, 0])
+    east = shapely.transform(shapely.clip_by_rect(parts, 180, -90, 540, 90), lambda xy: xy - [360, 0])
+    middle = shapely.clip_by_rect(parts, -180, -90, 180, 90)
+    normalised = geometries.copy()
+    normalised[crossing] = shapely.union(shapely.union(middle, west), east)
+    return normalised
+
+@lru_cache(maxsize=256)
+def get_transformer(source, target):
+    """
+    Create, or reuse, a transformer between two CRSs with lon/lat axis order.
+
+    Parameters:
+        source, target: CRS definitions accepted by pyproj (WKT, PROJ string or EPSG code).
+
+    Returns:
+        Transformer: The cached transformer.
+    """
+    return Transformer.from_crs(source, target, always_xy=True)
+
+@lru_cache(maxsize=1024)
+def get_local_transformer(definition):
+    """
+    Create, or reuse, a transformer from longitude/latitude in degrees to a local projection.
+
+    A bare PROJ pipeline is used because it is built in microseconds, where a
+    CRS-to-CRS transformer takes milliseconds, which matters with many groups.
+    +over keeps inverse longitudes continuous around the central meridian
+    instead of wrapping them into [-180, 180].
+
+    Parameters:
+        definition (str): PROJ definition of the local projection.
+
+    Returns:
+        Transformer: The cached transformer; use direction='INVERSE' to go back to degrees.
+    """
+    return Transformer.from_pipeline(
+        f"+proj=pipeline +step +proj=unitconvert +xy_in=deg +xy_out=rad +step {definition} +over"
+    )
+
+def transform_geometries(geometries, transformer, direction="FORWARD"):
+    """
+    Transform all coordinates of an array of geometries in one batched call.
+
+    Parameters:
+        geometries (ndarray): Geometries to transform.
+        transformer (Transformer): The transformer to apply.
+        direction (str): 'FORWARD' or 'INVERSE' (default: 'FORWARD').
+
+    Returns:
+        ndarray: The transformed geometries.
+    """
+    def transform_coordinates(coordinates):
+        x, y = transformer.transform(coordinates[:, 0], coordinates[:, 1], direction=direction)
+        return np.column_stack([x, y])
+
+    return shapely.transform(geometries, transform_coordinates)
+
+def buffer_geometries_geodesic(geometries, crs, distance, projection="utm", **style):
+    """
+    Buffer geometries in a non-metric CRS by a distance in metres.
+
+    The geometries are converted to longitude/latitude once and grouped by
+    the local metric projection of their centre (see local_projection_keys).
+    Each group is projected with one batched pyproj call, buffered with one
+    vectorized shapely call and converted back, so buffers keep their metric
+    size wherever the features are, unlike a buffer in Web Mercator, which
+    grows with 1 / cos(latitude). UTM keeps distances within about 0.1% inside
+    a zone (0.6% in the polar UPS zones); AEQD is exact at the cell centre and
+    within about 0.01% across it. Longitudes are unwrapped around each group's
+    central meridian, so buffers crossing the antimeridian are split into
+    valid parts on either side of it (see split_at_antimeridian).
+
+    Parameters:
+        geometries (ndarray): Geometries to buffer.
+        crs: CRS of the geometries (WKT, PROJ string or EPSG code).
+        distance (float or array-like): Buffer distance in metres, for all or for each geometry.
+        projection (str): 'utm' or 'aeqd' (default: 'utm').
+        **style: quad_segs, cap_style, join_style and mitre_limit for buffer_geometries.
+
+    Returns:
+        ndarray: The buffered geometries in the input CRS.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    distances = np.broadcast_to(np.asarray(distance, dtype=np.float64), geometries.shape)
+    buffered = geometries.copy()
+
+    present = np.flatnonzero(~(shapely.is_missing(geometries) | shapely.is_empty(geometries)))
+    if present.size == 0:
+        return buffered
+
+    geographic = CRS.from_user_input(crs) == CRS.from_epsg(4326)
+    lonlat = geometries[present]
+    if not geographic:
+        lonlat = transform_geometries(lonlat, get_transformer(crs, "EPSG:4326"))
+
+    centres = shapely.get_coordinates(shapely.centroid(lonlat))
+    keys = local_projection_keys(centres[:, 0], centres[:, 1], projection)
+    result = np.empty(present.size, dtype=object)
+    for key in np.unique(keys):
+        group = np.flatnonzero(keys == key)
+        transformer = get_local_transformer(local_projection(key, projection))
+        lon_0 = local_central_meridian(key, projection)
+        group_lonlat = lonlat[group] if lon_0 is None else unwrap_longitudes(lonlat[group], lon_0)
+        projected = transform_geometries(group_lonlat, transformer)
+        projected = buffer_geometries(projected, distances[present[group]], **style)
+        result[group] = transform_geometries(projected, transformer, direction="INVERSE")
+    result = split_at_antimeridian(result)
+
+    if not geographic:
+        result = transform_geometries(result, get_transformer("EPSG:4326", crs))
+    buffered[present] = result
+    return buffered
+
+def buffer_chunk(geometries, crs, distance, projection="utm", **style):
+    """
+    Buffer a chunk of geometries by a distance in metres, planar in a metric CRS and geodesic otherwise.
+
+    Parameters:
+        geometries (ndarray): Geometries to buffer.
+        crs: CRS of the geometries (WKT, PROJ string or EPSG code).
+        distance (float or array-like): Buffer distance in metres.
+        projection (str): One of METRIC_PROJECTIONS, used when the CRS is not metric (default: 'utm').
+        **style: quad_segs, cap_style, join_style and mitre_limit for buffer_geometries.
+
+    Returns:
+        ndarray: The buffered geometries in the input CRS.
+    """
+    if is_metric_crs(crs) or projection == "mercator":
+        return buffer_geometries(geometries, distance, **style)
+    return buffer_geometries_geodesic(geometries, crs, distance, projection, **style)
+
+def validate_buffer_style(cap_style="round", join_style="round"):
+    """
+    Check that the cap and join styles are supported.
+
+    Parameters:
+        cap_style (str): One of CAP_STYLES.
+        join_style (str): One of JOIN_STYLES.
+
+    Raises:
+        ValueError: If a style is not supported.
+    """
+    if cap_style not in CAP_STYLES:
+        raise ValueError(f"Invalid cap style: {cap_style}. Choose from {CAP_STYLES}.")
+    if join_style not in JOIN_STYLES:
+        raise ValueError(f"Invalid join style: {join_style}. Choose from {JOIN_STYLES}.")
+
+def buffer_geometries(geometries, distance, quad_segs=DEFAULT_QUAD_SEGMENTS, cap_style="round",
+                      join_style="round", mitre_limit=5.0):
+    """
+    Buffer an array of geometries with one vectorized shapely call.
+
+    Parameters:
+        geometries (array-like): Geometries to buffer.
+        distance (float or array-like): Buffer distance in CRS units, for all or for each geometry.
+        quad_segs (int): Segments used to approximate a quarter circle (default: 16).
+        cap_style (str): End cap style of buffered lines, one of CAP_STYLES (default: 'round').
+        join_style (str): Style of buffered corners, one of JOIN_STYLES (default: 'round').
+        mitre_limit (float): Limit on the mitre ratio for 'mitre' joins (default: 5.0).
+
+    Returns:
+        ndarray: The buffered geometries.
+    """
+    return shapely.buffer(
+        geometries,
+        distance,
+        quad_segs=quad_segs,
+        cap_style=cap_style,
+        join_style=join_style,
+        mitre_limit=mitre_limit
+    )
+
+def buffer_geodataframe(gdf, distance, projection="utm", **style):
+    """
+    Buffer the geometries of a GeoDataFrame in place by a distance in meters.
+
+    Layers in a metric CRS are buffered directly. Other layers are buffered
+    geodesically (see buffer_geometries_geodesic) and stay in their CRS, or
+    with projection='mercator' are reprojected to Web Mercator first.
+
+    Parameters:
+        gdf (GeoDataFrame): The input GeoDataFrame.
+        distance (float): Buffer distance in meters.
+        projection (str): One of METRIC_PROJECTIONS, used when the CRS is not metric (default: 'utm').
+        **style: quad_segs, cap_style, join_style and mitre_limit for buffer_geometries.
+
+    Returns:
+        GeoDataFrame: The GeoDataFrame with buffered geometries.
+    """
+    if projection == "mercator":
+        gdf = ensure_crs_in_meters(gdf)
+    elif gdf.crs is None:
+        raise ValueError("The GeoDataFrame does not have a defined CRS.")
+
+    gdf[gdf.geometry.name] = buffer_chunk(gdf.geometry.values, gdf.crs.to_wkt(), distance, projection, **style)
+    return gdf
+
+def read_chunks(input_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a vector file chunk by chunk through a single open reader.
+
+    With pyogrio the layer is streamed as Arrow record batches; otherwise fiona
+    iterates over the features. Either way the file is opened and scanned once,
+    so formats without random access such as GeoJSON are not re-parsed from the
+    start for every chunk.
+
+    Parameters:
+        input_file (str): Path to the input vector file.
+        chunk_size (int): Number of features per chunk.
+
+    Yields:
+        GeoDataFrame: Consecutive chunks of the file, with the geometry column named 'geometry'.
+    """
+    if pyogrio is not None:
+        with pyogrio.open_arrow(input_file, batch_size=chunk_size, use_pyarrow=True) as (meta, reader):
+            for batch in reader:
+                if batch.num_rows == 0:
+                    continue
+                chunk = gpd.GeoDataFrame.from_arrow(pa.Table.from_batches([batch]))
+                if chunk.crs is None and meta["crs"]:
+                    chunk = chunk.set_crs(meta["crs"])
+                yield chunk.rename_geometry("geometry")
+        return
+
+    import fiona
+    with fiona.open(input_file) as source:
+        features = iter(source)
+        while True:
+            batch = list(islice(features, chunk_size))
+            if not batch:
+                return
+            yield gpd.GeoDataFrame.from_features(batch, crs=source.crs_wkt or None)
+
+def write_chunk(chunk, output_file, driver, first):
+    """
+    Write a chunk to the output file, creating it for the first chunk and appending afterwards.
+
+    Parameters:
+        chunk (GeoDataFrame): The buffered chunk.
+        output_file (str): Path to the output vector file.
+        driver (str): OGR driver name, or None to infer it from the file extension.
+        first (bool): Whether this is the first chunk.
+    """
+    chunk.to_file(output_file, driver=driver, mode='w' if first else 'a')
+
+def finish_chunk(job, output_file, driver, first):
+    """
+    Wait for a chunk's buffered geometries and write the chunk.
+
+    Parameters:
+        job (tuple): (GeoDataFrame chunk, Future returning its buffered geometries).
+        output_file (str): Path to the output vector file.
+        driver (str): OGR driver name, or None to infer it from the file extension.
+        first (bool): Whether this is the first chunk written.
+
+    Returns:
+        int: Number of features written.
+    """
+    chunk, future = job
+    chunk[chunk.geometry.name] = future.result()
+    write_chunk(chunk, output_file, driver, first)
+    return len(chunk)
+
+def buffer_vector_file(input_file, output_file, distance, quad_segs=DEFAULT_QUAD_SEGMENTS, cap_style="round",
+                       join_style="round", mitre_limit=5.0, projection="utm", driver=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE, num_workers=None):
+    """
+    Buffer every feature of a vector file and save the result.
+
+    The file is streamed in chunks of chunk_size features. Geometries are
+    buffered with vectorized shapely calls in a process pool while the next
+    chunks are read, and each buffered chunk is appended to the output in
+    input order, so memory use is bounded by the chunk size and number of
+    workers rather than the size of the layer. Attributes stay in the main
+    process; only the geometries are sent to the workers.
+
+    Layers without a metric CRS are buffered geodesically, grouped by UTM zone
+    or local azimuthal equidistant projection, and written in their own CRS.
+    projection='mercator' keeps the old behaviour of reprojecting them to Web
+    Mercator, which overstates distances by 1 / cos(latitude).
+
+    Parameters:
+        input_file (str): Path to the input vector file.
+        output_file (str): Path to save the buffered features.
+        distance (float): Buffer distance in meters.
+        quad_segs (int): Segments used to approximate a quarter circle (default: 16).
+        cap_style (str): End cap style of buffered lines, one of CAP_STYLES (default: 'round').
+        join_style (str): Style of buffered corners, one of JOIN_STYLES (default: 'round').
+        mitre_limit (float): Limit on the mitre ratio for 'mitre' joins (default: 5.0).
+        projection (str): One of METRIC_PROJECTIONS, used when the CRS is not metric (default: 'utm').
+        driver (str): OGR driver of the output (default: inferred from the file extension).
+        chunk_size (int): Number of features per chunk (default: 100000).
+        num_workers (int): Number of worker processes (default: number of CPU cores).
+
+    Returns:
+        int: Number of features written.
+    """
+    validate_buffer_style(cap_style, join_style)
+    if projection not in METRIC_PROJECTIONS:
+        raise ValueError(f"Invalid projection: {projection}. Choose from {METRIC_PROJECTIONS}.")
+    if not os.path.exists(input_file):
+        raise FileNotFoundError(f"Input file does not exist: {input_file}")
+
+    num_workers = num_workers or os.cpu_count() or 1
+    style = {"quad_segs": quad_segs, "cap_style": cap_style, "join_style": join_style, "mitre_limit": mitre_limit}
+
+    output_dir = Path(output_file).parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    logging.info(f"Buffering features of {input_file} by {distance} meters in chunks of {chunk_size} "
+                 f"using {num_workers} worker processes.")
+    written = 0
+    target_crs = None
+    pending = []
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for chunk in read_chunks(input_file, chunk_size):
+            if target_crs is None:
+                if chunk.crs is None:
+                    raise ValueError("The GeoDataFrame does not have a defined CRS.")
+                if projection == "mercator":
+                    chunk = ensure_crs_in_meters(chunk)
+                elif not is_metric_crs(chunk.crs):
+                    logging.info(f"CRS is not in meters. Buffering geodesically by {projection} projection groups.")
+                target_crs = chunk.crs
+            elif chunk.crs != target_crs:
+                chunk = chunk.to_crs(target_crs)
+
+            future = executor.submit(buffer_chunk, chunk.geometry.values, target_crs.to_wkt(), distance,
+                                     projection, **style)
+            pending.append((chunk, future))
+
+            # Keep at most two chunks per worker in flight so memory stays bounded
+            while len(pending) > 2 * num_workers:
+                written += finish_chunk(pending.pop(0), output_file, driver, written == 0)
+
+        while pending:
+            written += finish_chunk(pending.pop(0), output_file, driver, written == 0)
+
+    logging.info(f"Saved {written} buffered features to: {output_file}")
+    return written
+
+def add_buffer_arguments(parser):
+    """
+    Add the buffer style, projection and worker options shared by the buffer tools to a parser.
+
+    Parameters:
+        parser (ArgumentParser): Command-line parser of a buffer tool.
+    """
+    parser.add_argument('--quad-segs', type=int, default=DEFAULT_QUAD_SEGMENTS,
+                        help="Segments per quarter circle (default: 16)")
+    parser.add_argument('--cap-style', choices=CAP_STYLES, default="round",
+                        help="End cap style of lines (default: round)")
+    parser.add_argument('--join-style', choices=JOIN_STYLES, default="round", help="Corner style (default: round)")
+    parser.add_argument('--projection', choices=METRIC_PROJECTIONS, default="utm",
+                        help="How layers without a metric CRS are buffered: per UTM zone, per local azimuthal "
+                             "equidistant projection, or in Web Mercator (default: utm)")
+    parser.add_argument('--workers', type=int, help="Number of worker processes (default: number of CPU cores)")
+
+def buffer_style_options(args):
+    """
+    Collect the buffer style and projection options parsed by add_buffer_arguments.
+
+    Parameters:
+        args (Namespace): Parsed command-line arguments.
+
+    Returns:
+        dict: projection, quad_segs, cap_style and join_style keyword arguments.
+    """
+    return {
+        "projection": args.projection,
+        "quad_segs": args.quad_segs,
+        "cap_style": args.cap_style,
+        "join_style": args.join_style,
+    }
@@ -1,69 +1,43 @@
-import os
-import geopandas as gpd
-from pathlib import Path
-from pyproj import CRS
 import logging
 
+from buffer_engine import add_buffer_arguments, buffer_geodataframe, buffer_style_options, buffer_vector_file
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def ensure_crs_in_meters(gdf):
-    """
-    Ensures the GeoDataFrame's CRS is in meters. Reprojects if necessary.
-
-    Parameters:
-        gdf (GeoDataFrame): The input GeoDataFrame.
-
-    Returns:
-        GeoDataFrame: A GeoDataFrame with a CRS in meters.
-    """
-    if gdf.crs is None:
-        raise ValueError("Input file does not have a defined CRS.")
-
-    crs = CRS.from_user_input(gdf.crs)
-    if not crs.is_projected or crs.axis_info[0].unit_name != 'metre':
-        logging.warning("CRS is not in meters. Reprojecting to EPSG:3857 (Web Mercator).")
-        gdf = gdf.to_crs(epsg=3857)
-    return gdf
-
-def calculate_buffer(gdf, buffer_distance):
+def calculate_buffer(gdf, buffer_distance, **style):
     """
     Calculates buffer zones around geometries.
 
     Parameters:
         gdf (GeoDataFrame): The input GeoDataFrame.
         buffer_distance (float): Distance for the buffer zone.
+        **style: projection, quad_segs, cap_style, join_style and mitre_limit (see buffer_engine).
 
     Returns:
         GeoDataFrame: A GeoDataFrame with buffered geometries.
     """
     logging.info(f"Creating buffer zones with a distance of {buffer_distance} meters.")
-    gdf['geometry'] = gdf.geometry.buffer(buffer_distance)
-    return gdf
+    return buffer_geodataframe(gdf, buffer_distance, **style)
 
-def process_shapefile(input_file, output_file, buffer_distance=100):
+def process_shapefile(input_file, output_file, buffer_distance=100, num_workers=None, **style):
     """
     Loads a shapefile, calculates buffer zones, and saves the result.
 
+    The layer is streamed through the buffer engine in chunks, so large inputs
+    are buffered in parallel without being loaded whole.
+
     Parameters:
         input_file (str): Path to the input shapefile.
         output_file (str): Path to save the output file with buffers.
         buffer_distance (float): Distance for the buffer zone (default: 100 meters).
+        num_workers (int): Number of worker processes (default: number of CPU cores).
+        **style: projection, quad_segs, cap_style, join_style and mitre_limit (see buffer_engine).
     """
     try:
-        # Load geospatial data
-        logging.info(f"Loading input file: {input_file}")
-        gdf = gpd.read_file(input_file)
-
-        # Ensure CRS is in meters
-        gdf = ensure_crs_in_meters(gdf)
-
-        # Calculate buffer zones
-        gdf = calculate_buffer(gdf, buffer_distance)
-
-        # Save the buffered geometries
-        logging.info(f"Saving output to: {output_file}")
-        gdf.to_file(output_file, driver="GPKG")  # GeoPackage format
+        # Buffer the geometries and save them in GeoPackage format
+        buffer_vector_file(input_file, output_file, buffer_distance, driver="GPKG", num_workers=num_workers,
+                           **style)
 
         logging.info("Process completed successfully.")
     except FileNotFoundError:
@@ -98,10 +72,11 @@ def main():
     parser.add_argument('--input', required=True, help="Path to the input shapefile")
     parser.add_argument('--buffer', required=False, type=float, default=100, help="Buffer distance in meters (default: 100)")
     parser.add_argument('--output', required=True, help="Path to save the output file")
+    add_buffer_arguments(parser)
     args = parser.parse_args()
 
     try:
-        process_shapefile(args.input, args.output, args.buffer)
+        process_shapefile(args.input, args.output, args.buffer, num_workers=args.workers, **buffer_style_options(args))
     except Exception as e:
         logging.error(f"Error while running from command line: {e}")
 
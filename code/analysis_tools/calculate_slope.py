@@ -1,78 +1,274 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import rasterio
 import numpy as np
 import logging
 from rasterio.enums import Resampling
+from rasterio.windows import Window
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Processing window size (pixels) and internal tile size of the output GeoTIFF.
+# The window size should be a multiple of the tile size so each window maps onto whole tiles.
+DEFAULT_BLOCK_SIZE = 1024
+OUTPUT_TILE_SIZE = 256
+
 def calculate_slope(dem_data, x_res, y_res, output_format):
     """
     Calculate the slope from a DEM raster.
 
     Parameters:
         dem_data (ndarray): 2D array of DEM elevation values.
-        x_res (float): Resolution of the raster in the x-direction.
-        y_res (float): Resolution of the raster in the y-direction.
+        x_res (float or ndarray): Resolution of the raster in the x-direction, either a scalar
+            or a (rows, 1) array of per-row pixel widths.
+        y_res (float or ndarray): Resolution of the raster in the y-direction, either a scalar
+            or a (rows, 1) array of per-row pixel heights.
         output_format (str): Desired slope output format ('percent', 'degrees', or 'raw').
 
     Returns:
         ndarray: 2D array of slope values in the chosen format.
     """
-    logging.info("Calculating slope.")
-    x_slope = np.gradient(dem_data, axis=1) / x_res
-    y_slope = np.gradient(dem_data, axis=0) / y_res
-    slope = np.sqrt(x_slope**2 + y_slope**2)
+    logging.debug("Calculating slope.")
+    x_slope = np.gradient(dem_data, axis=1)
+    x_slope /= x_res
+    y_slope = np.gradient(dem_data, axis=0)
+    y_slope /= y_res
+    slope = np.hypot(x_slope, y_slope, out=x_slope)
+
+    return convert_slope(slope, output_format)
+
+def convert_slope(slope, output_format):
+    """
+    Convert a gradient magnitude array to the requested slope format, in place.
 
-    # Convert slope based on the chosen format
+    Parameters:
+        slope (ndarray): Floating point array of gradient magnitudes (rise over run).
+        output_format (str): Desired slope output format ('percent', 'degrees', or 'raw').
+
+    Returns:
+        ndarray: The input array holding slope values in the chosen format.
+    """
     if output_format == "degrees":
-        logging.info("Converting slope to degrees.")
-        slope = np.arctan(slope) * (180 / np.pi)
+        logging.debug("Converting slope to degrees.")
+        np.arctan(slope, out=slope)
+        slope *= 180 / np.pi
     elif output_format == "percent":
-        logging.info("Converting slope to percent.")
-        slope = slope * 100
+        logging.debug("Converting slope to percent.")
+        slope *= 100
     elif output_format == "raw":
-        logging.info("Keeping raw gradient values.")
+        logging.debug("Keeping raw gradient values.")
     else:
         raise ValueError(f"Invalid slope format: {output_format}. Choose 'percent', 'degrees', or 'raw'.")
 
     return slope
 
-def process_dem(src_file, slope_file, output_format):
+def calculate_pixel_sizes(src):
+    """
+    Determine the pixel size of a raster in ground units.
+
+    Projected rasters use their resolution directly. For geographic rasters the
+    resolution is in degrees, so per-row pixel sizes in metres are derived from the
+    WGS84 metre-per-degree series at each row's centre latitude. This lets slope be
+    computed on EPSG:4326 DEMs without reprojecting them first.
+
+    Parameters:
+        src (DatasetReader): Opened DEM dataset.
+
+    Returns:
+        tuple: (x_res, y_res) as scalars, or as (height, 1) arrays for geographic rasters.
+    """
+    x_res, y_res = src.res
+    if src.crs is None or not src.crs.is_geographic:
+        return x_res, y_res
+
+    logging.info("Geographic CRS detected. Scaling pixel sizes from degrees to metres per row.")
+    rows = np.arange(src.height, dtype=np.float64) + 0.5
+    latitude = np.radians(src.transform.f + rows * src.transform.e)
+    metres_per_degree_lat = (111132.92 - 559.82 * np.cos(2 * latitude)
+                             + 1.175 * np.cos(4 * latitude) - 0.0023 * np.cos(6 * latitude))
+    metres_per_degree_lon = (111412.84 * np.cos(latitude) - 93.5 * np.cos(3 * latitude)
+                             + 0.118 * np.cos(5 * latitude))
+    return (x_res * metres_per_degree_lon)[:, np.newaxis], (y_res * metres_per_degree_lat)[:, np.newaxis]
+
+def window_pixel_sizes(pixel_sizes, window):
+    """
+    Select the pixel sizes covering the rows of a window.
+
+    Parameters:
+        pixel_sizes (tuple): (x_res, y_res) as returned by calculate_pixel_sizes.
+        window (Window): The window being processed.
+
+    Returns:
+        tuple: (x_res, y_res) for the rows of the window.
+    """
+    x_res, y_res = pixel_sizes
+    if np.ndim(x_res) == 0:
+        return x_res, y_res
+    rows = slice(window.row_off, window.row_off + window.height)
+    return x_res[rows], y_res[rows]
+
+def nodata_mask(block, nodata):
+    """
+    Find the nodata cells of a block.
+
+    NaN never compares equal to itself, so a NaN nodata value is matched with np.isnan.
+
+    Parameters:
+        block (ndarray): Raster values.
+        nodata (float): Nodata value of the raster, or None.
+
+    Returns:
+        ndarray: Boolean mask, True where the block holds nodata.
+    """
+    if nodata is None:
+        return np.zeros(block.shape, dtype=bool)
+    if np.isnan(nodata):
+        return np.isnan(block)
+    return block == nodata
+
+def generate_windows(width, height, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Split a raster extent into processing windows.
+
+    Parameters:
+        width (int): Width of the raster in pixels.
+        height (int): Height of the raster in pixels.
+        block_size (int): Maximum width and height of each window in pixels.
+
+    Yields:
+        Window: Windows covering the raster from the top-left, row by row.
+    """
+    for row_off in range(0, height, block_size):
+        for col_off in range(0, width, block_size):
+            yield Window(
+                col_off,
+                row_off,
+                min(block_size, width - col_off),
+                min(block_size, height - row_off)
+            )
+
+def expand_window(window, width, height, halo=1):
+    """
+    Grow a window by a halo of neighbouring pixels, clipped to the raster extent.
+
+    Parameters:
+        window (Window): The window to expand.
+        width (int): Width of the raster in pixels.
+        height (int): Height of the raster in pixels.
+        halo (int): Number of pixels to add on each side (default: 1).
+
+    Returns:
+        tuple: (expanded Window, (row slice, column slice)) where the slices crop
+            an array read with the expanded window back to the original window.
+    """
+    row_start = max(window.row_off - halo, 0)
+    col_start = max(window.col_off - halo, 0)
+    row_stop = min(window.row_off + window.height + halo, height)
+    col_stop = min(window.col_off + window.width + halo, width)
+
+    expanded = Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+    inner = (
+        slice(window.row_off - row_start, window.row_off - row_start + window.height),
+        slice(window.col_off - col_start, window.col_off - col_start + window.width)
+    )
+    return expanded, inner
+
+def process_window(src, dst, window, output_format, pixel_sizes, read_lock, write_lock):
+    """
+    Calculate slope for a single window and write it to the output raster.
+
+    The window is read with a one-pixel halo so the gradient at the window edges
+    matches the gradient of the full array. Reads and writes are serialised with
+    locks because rasterio dataset handles are not thread-safe; the gradient
+    computation itself runs in parallel.
+
+    Parameters:
+        src (DatasetReader): Opened DEM dataset.
+        dst (DatasetWriter): Opened output slope dataset.
+        window (Window): The window to process.
+        output_format (str): Desired slope output format ('percent', 'degrees', or 'raw').
+        pixel_sizes (tuple): (x_res, y_res) as returned by calculate_pixel_sizes.
+        read_lock (Lock): Lock guarding reads from the source dataset.
+        write_lock (Lock): Lock guarding writes to the output dataset.
+    """
+    expanded, inner = expand_window(window, src.width, src.height)
+    x_res, y_res = window_pixel_sizes(pixel_sizes, expanded)
+
+    with read_lock:
+        dem_block = src.read(1, window=expanded, out_dtype='float32')
+
+    slope = calculate_slope(dem_block, x_res, y_res, output_format)[inner]
+
+    # Carry nodata cells through to the output instead of writing slopes computed from them
+    if src.nodata is not None:
+        slope[nodata_mask(dem_block[inner], src.nodata)] = src.nodata
+
+    with write_lock:
+        dst.write(slope.astype(np.float32, copy=False), 1, window=window)
+
+def process_dem(src_file, slope_file, output_format, block_size=DEFAULT_BLOCK_SIZE, num_workers=None):
     """
     Process the DEM file to calculate slope and save it to a new raster file.
 
+    The DEM is processed window by window in a thread pool, so memory use is bounded
+    by the block size and number of workers rather than the size of the DEM. The
+    output is written as a tiled float32 GeoTIFF. DEMs in a geographic CRS are
+    handled directly with per-row metre-per-degree scaling, so no reprojection pass
+    is needed beforehand.
+
     Parameters:
         src_file (str): Path to the input DEM file.
         slope_file (str): Path to save the slope raster file.
         output_format (str): Desired slope output format ('percent', 'degrees', or 'raw').
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
     """
     try:
+        if output_format not in ("percent", "degrees", "raw"):
+            raise ValueError(f"Invalid slope format: {output_format}. Choose 'percent', 'degrees', or 'raw'.")
+
+        num_workers = num_workers or os.cpu_count() or 1
+
         # Open the source DEM file
         logging.info(f"Opening DEM file: {src_file}")
         with rasterio.open(src_file) as src:
-            # Read the DEM data
-            dem_data = src.read(1)
-            x_res, y_res = src.res
-
-            # Calculate slope
-            slope = calculate_slope(dem_data, x_res, y_res, output_format)
+            pixel_sizes = calculate_pixel_sizes(src)
 
-            # Write the slope to a new raster file
+            # Write the slope to a new tiled raster file
             logging.info(f"Saving slope raster to: {slope_file}")
             with rasterio.open(
                 slope_file,
                 'w',
                 driver='GTiff',
-                height=slope.shape[0],
-                width=slope.shape[1],
+                height=src.height,
+                width=src.width,
                 count=1,
-                dtype=slope.dtype,
+                dtype='float32',
                 crs=src.crs,
                 transform=src.transform,
-                nodata=src.nodata  # Preserve nodata value if present
+                nodata=src.nodata,  # Preserve nodata value if present
+                tiled=True,
+                blockxsize=OUTPUT_TILE_SIZE,
+                blockysize=OUTPUT_TILE_SIZE,
+                BIGTIFF='IF_SAFER'
             ) as dst:
-                dst.write(slope, 1)
+                windows = list(generate_windows(src.width, src.height, block_size))
+                logging.info(f"Calculating slope over {len(windows)} windows using {num_workers} worker threads.")
+
+                read_lock = threading.Lock()
+                write_lock = threading.Lock()
+                with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                    futures = [
+                        executor.submit(
+                            process_window, src, dst, window, output_format, pixel_sizes, read_lock, write_lock
+                        )
+                        for window in windows
+                    ]
+                    # Surface the first error raised by any worker
+                    for future in futures:
+                        future.result()
 
         logging.info("Slope calculation complete and saved successfully.")
     except Exception as e:
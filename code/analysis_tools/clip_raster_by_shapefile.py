@@ -1,6 +1,13 @@
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
 import geopandas as gpd
 import rasterio
-from rasterio.mask import mask
+from rasterio.mask import raster_geometry_mask
+from rasterio.windows import Window
+from pathlib import Path
 import logging
 
 # Configure logging
@@ -31,14 +38,96 @@ def validate_shapefile(gdf):
     # Combine all geometries into a single geometry for masking
     return [gdf.geometry.unary_union]
 
-def clip_raster_with_shapefile(raster_file, shapefile, output_file):
+def mask_cache_path(cache_dir, geometry, src):
+    """
+    Return the cache file path for a clip geometry on a raster grid.
+
+    Co-registered rasters share the same key, so the window and mask computed
+    for the first of them are reused by the rest.
+
+    Parameters:
+        cache_dir (str): Directory holding the mask cache.
+        geometry (Geometry): The clip geometry in raster CRS.
+        src (DatasetReader): Opened raster dataset.
+
+    Returns:
+        Path: Path of the cached .npz file.
+    """
+    key = json.dumps({
+        "crs": src.crs.to_wkt() if src.crs else None,
+        "transform": list(src.transform)[:6],
+        "shape": [src.height, src.width],
+    }, sort_keys=True)
+    digest = hashlib.sha256(geometry.wkb + key.encode()).hexdigest()[:32]
+    return Path(cache_dir) / f"{digest}.npz"
+
+def load_geometry_mask(src, geometry, cache_dir=None):
+    """
+    Compute, or load from the mask cache, the crop window and mask of a clip geometry.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        geometry (Geometry): The clip geometry in raster CRS.
+        cache_dir (str): Directory holding the mask cache (optional).
+
+    Returns:
+        tuple: (Boolean mask of the window, True outside the geometry; Window covering the geometry).
+    """
+    if cache_dir is None:
+        shape_mask, _, window = raster_geometry_mask(src, [geometry], crop=True)
+        return shape_mask, window
+
+    cache_path = mask_cache_path(cache_dir, geometry, src)
+    if cache_path.exists():
+        logging.info(f"Using cached geometry mask: {cache_path}")
+        with np.load(cache_path) as cached:
+            col_off, row_off, width, height = (int(value) for value in cached["window"])
+            shape_mask = np.unpackbits(cached["mask"], count=width * height).reshape(height, width)
+        return shape_mask.astype(bool), Window(col_off, row_off, width, height)
+
+    shape_mask, _, window = raster_geometry_mask(src, [geometry], crop=True)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_path, 'wb') as f:
+        np.savez(
+            f,
+            window=np.array([window.col_off, window.row_off, window.width, window.height], dtype=np.int64),
+            mask=np.packbits(shape_mask)
+        )
+    os.replace(temp_path, cache_path)
+    return shape_mask, window
+
+def clip_to_mask(src, shape_mask, window, nodata):
+    """
+    Read the crop window of a raster and set pixels outside the clip geometry to nodata.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        shape_mask (ndarray): Boolean mask of the window, True outside the geometry.
+        window (Window): Window covering the geometry.
+        nodata (float): Value written outside the geometry.
+
+    Returns:
+        tuple: (Clipped array of shape (bands, rows, cols), Affine transform of the clip).
+    """
+    data = src.read(window=window)
+    data[:, shape_mask] = nodata
+    return data, src.window_transform(window)
+
+def clip_raster_with_shapefile(raster_file, shapefile, output_file, mask_cache_dir=None):
     """
     Clip a raster file using a polygon shapefile and save the result.
 
+    With mask_cache_dir set, the crop window and mask of the geometry are cached
+    per raster grid, so clipping a stack of co-registered rasters to the same
+    shapefile rasterizes the geometry only once and the later clips are a
+    windowed read plus a mask apply.
+
     Parameters:
         raster_file (str): Path to the input raster file.
         shapefile (str): Path to the shapefile containing the polygon geometry.
         output_file (str): Path to save the clipped raster.
+        mask_cache_dir (str): Directory for the geometry mask cache (optional).
     """
     try:
         # Load the shapefile
@@ -53,7 +142,9 @@ def clip_raster_with_shapefile(raster_file, shapefile, output_file):
         with rasterio.open(raster_file) as src:
             # Clip the raster using the shapefile geometry
             logging.info("Clipping raster with the shapefile geometry.")
-            out_image, out_transform = mask(src, geometry, crop=True, nodata=src.nodata)
+            shape_mask, window = load_geometry_mask(src, geometry[0], mask_cache_dir)
+            nodata = src.nodata if src.nodata is not None else 0
+            out_image, out_transform = clip_to_mask(src, shape_mask, window, nodata)
 
             # Save the clipped raster
             logging.info(f"Saving clipped raster to: {output_file}")
@@ -69,7 +160,7 @@ def clip_raster_with_shapefile(raster_file, shapefile, output_file):
                 transform=out_transform,
                 nodata=src.nodata
             ) as dst:
-                dst.write(out_image, 1)
+                dst.write(out_image)
 
         logging.info("Raster clipping completed successfully.")
     except FileNotFoundError as e:
@@ -80,13 +171,17 @@ def clip_raster_with_shapefile(raster_file, shapefile, output_file):
         logging.error(f"An unexpected error occurred: {e}")
 
 def main():
-    # Define file paths
-    raster_file = 'processed_data/dem.tif'
-    shapefile = 'processed_data/clip_polygon.shp'
-    output_file = 'processed_data/clipped_dem.tif'
+    parser = argparse.ArgumentParser(description="Clip a raster by the union of a polygon shapefile.")
+    parser.add_argument('raster', nargs='?', default='processed_data/dem.tif', help="Path to the input raster")
+    parser.add_argument('shapefile', nargs='?', default='processed_data/clip_polygon.shp',
+                        help="Path to the polygon shapefile")
+    parser.add_argument('output', nargs='?', default='processed_data/clipped_dem.tif',
+                        help="Path to save the clipped raster")
+    parser.add_argument('--mask-cache', help="Directory for caching geometry masks across runs")
+    args = parser.parse_args()
 
     # Perform raster clipping
-    clip_raster_with_shapefile(raster_file, shapefile, output_file)
+    clip_raster_with_shapefile(args.raster, args.shapefile, args.output, mask_cache_dir=args.mask_cache)
 
 if __name__ == "__main__":
     main()
@@ -1,51 +1,561 @@
+import os
+import json
+import argparse
 import rasterio
 import numpy as np
 import logging
+from rasterio.enums import Resampling
+
+from calculate_slope import generate_windows
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def calculate_raster_statistics(raster_file):
+# Processing window size in pixels
+DEFAULT_BLOCK_SIZE = 1024
+
+# Number of histogram bins used for approximate percentiles
+DEFAULT_HISTOGRAM_BINS = 4096
+
+# Maximum number of values held in memory while selecting an exact percentile
+EXACT_SELECTION_LIMIT = 1_000_000
+
+# Longest side, in pixels, of the decimated read used for approximate statistics
+APPROXIMATE_MAX_SIZE = 1024
+
+# Statistics sidecar file suffix
+SIDECAR_SUFFIX = ".stats.json"
+
+def band_encoding(src, band):
+    """
+    Return the nodata value, scale and offset of a raster band.
+
+    Quantized rasters store value = stored * scale + offset, with the scale and
+    offset in the GeoTIFF metadata.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        band (int): Band index (1-based).
+
+    Returns:
+        tuple: (nodata value or None, scale, offset).
+    """
+    scale = src.scales[band - 1] if src.scales else 1.0
+    offset = src.offsets[band - 1] if src.offsets else 0.0
+    return src.nodatavals[band - 1], scale or 1.0, offset or 0.0
+
+def valid_values(values, nodata, scale=1.0, offset=0.0):
+    """
+    Return the valid values of a block as a flat float64 array.
+
+    Parameters:
+        values (ndarray): Raster values for one band and window.
+        nodata (float): Nodata value of the band, or None.
+        scale (float): Scale decoding stored values (default: 1).
+        offset (float): Offset decoding stored values (default: 0).
+
+    Returns:
+        ndarray: 1D array of finite, decoded values that are not nodata.
+    """
+    valid = np.isfinite(values) if values.dtype.kind == 'f' else np.ones(values.shape, dtype=bool)
+    if nodata is not None:
+        valid &= values != nodata
+    values = values[valid].astype(np.float64, copy=False)
+    if scale != 1 or offset != 0:
+        values = values * scale + offset
+    return values
+
+def merge_moments(accumulator, values):
+    """
+    Merge a block of values into running count, mean, M2, min and max (Chan/Welford update).
+
+    Parameters:
+        accumulator (dict): Running statistics with keys count, mean, m2, min and max, updated in place.
+        values (ndarray): 1D array of valid values from one block.
+    """
+    count = values.size
+    if count == 0:
+        return
+    values = values.astype(np.float64, copy=False)
+    mean = values.mean()
+    m2 = np.square(values - mean).sum()
+
+    total = accumulator["count"] + count
+    delta = mean - accumulator["mean"]
+    accumulator["mean"] += delta * count / total
+    accumulator["m2"] += m2 + delta * delta * accumulator["count"] * count / total
+    accumulator["count"] = total
+    accumulator["min"] = min(accumulator["min"], values.min())
+    accumulator["max"] = max(accumulator["max"], values.max())
+
+def bin_indices(values, low, high, bins):
+    """
+    Assign values to equal-width histogram bins over [low, high].
+
+    The same formula is used for histograms and for selecting bin members, so a
+    value always falls in the same bin in every pass.
+
+    Parameters:
+        values (ndarray): 1D array of values.
+        low (float): Lower edge of the first bin.
+        high (float): Upper edge of the last bin (inclusive).
+        bins (int): Number of bins.
+
+    Returns:
+        ndarray: Bin index of every value; values outside [low, high] are clipped to the end bins.
+    """
+    if high <= low:
+        return np.zeros(values.size, dtype=np.int64)
+    indices = ((values.astype(np.float64, copy=False) - low) * (bins / (high - low))).astype(np.int64)
+    return np.clip(indices, 0, bins - 1, out=indices)
+
+def histogram_value_at_rank(counts, low, high, rank, per_value=False):
+    """
+    Estimate the value at a zero-based rank from a histogram.
+
+    The value is interpolated linearly inside the bin holding the rank, so the
+    error is at most one bin width. Histograms with one bin per stored integer value
+    return the bin centre, which is exact.
+
+    Parameters:
+        counts (ndarray): Histogram counts.
+        low (float): Lower edge of the first bin.
+        high (float): Upper edge of the last bin.
+        rank (int): Zero-based rank of the value in sorted order.
+        per_value (bool): Whether every bin holds a single stored integer value (default: False).
+
+    Returns:
+        float: Estimated value at the rank.
+    """
+    cumulative = np.cumsum(counts)
+    index = int(np.searchsorted(cumulative, rank, side='right'))
+    width = (high - low) / counts.size
+    if per_value:
+        return low + width * (index + 0.5)
+    before = cumulative[index - 1] if index > 0 else 0
+    return low + width * (index + (rank - before + 0.5) / counts[index])
+
+def percentile_ranks(count, percentile):
+    """
+    Return the ranks and interpolation weight numpy uses for a linear percentile.
+
+    Parameters:
+        count (int): Number of valid values.
+        percentile (float): Percentile in [0, 100].
+
+    Returns:
+        tuple: (lower rank, upper rank, weight of the upper value).
+    """
+    position = percentile / 100 * (count - 1)
+    lower = int(np.floor(position))
+    return lower, min(lower + 1, count - 1), position - lower
+
+def iterate_band_values(src, band, block_size):
+    """
+    Yield the valid, decoded values of one band window by window.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        band (int): Band index (1-based).
+        block_size (int): Size of the processing windows in pixels.
+
+    Yields:
+        ndarray: 1D float64 array of valid values for each window.
+    """
+    encoding = band_encoding(src, band)
+    for window in generate_windows(src.width, src.height, block_size):
+        yield valid_values(src.read(band, window=window), *encoding)
+
+def select_exact_ranks(iterate_values, ranks, low, high, bins=DEFAULT_HISTOGRAM_BINS):
     """
-    Calculate basic statistics (mean, median, max, min) for a raster file.
+    Find the exact values at several ranks with streaming histogram selection.
+
+    Each pass histograms, for every rank still open, only the values inside its
+    current candidate bin and narrows the search to the sub-bin holding the
+    rank, so a few extreme values cannot blur the result however far they
+    stretch the range. Once a candidate bin holds at most EXACT_SELECTION_LIMIT
+    values they are gathered in one more pass and the value is selected with
+    np.partition, so memory stays bounded. All open ranks share each pass over
+    the data.
+
+    Parameters:
+        iterate_values (callable): Returns a fresh iterator over 1D arrays of the values.
+        ranks (list): Zero-based ranks of the values to select.
+        low (float): Minimum of the values.
+        high (float): Maximum of the values.
+        bins (int): Number of bins used at each refinement level.
+
+    Returns:
+        list: The exact value at each rank.
+    """
+    # Each level is (low, high, bin index); a value is a candidate if it falls in every level's bin
+    targets = [
+        {"rank": rank, "levels": [], "low": low, "high": high, "collect": False}
+        for rank in ranks
+    ]
+    results = [None] * len(ranks)
+
+    def candidates(values, levels):
+        keep = np.ones(values.size, dtype=bool)
+        for level_low, level_high, index in levels:
+            keep &= bin_indices(values, level_low, level_high, bins) == index
+        return values[keep]
+
+    pending = list(range(len(ranks)))
+    while pending:
+        counts = {target: np.zeros(bins, dtype=np.int64) for target in pending}
+        gathered = {target: [] for target in pending}
+        extents = {target: [np.inf, -np.inf] for target in pending}
+        for values in iterate_values():
+            for target in pending:
+                state = targets[target]
+                members = candidates(values, state["levels"])
+                if not members.size:
+                    continue
+                extents[target][0] = min(extents[target][0], members.min())
+                extents[target][1] = max(extents[target][1], members.max())
+                if state["collect"]:
+                    gathered[target].append(members)
+                else:
+                    counts[target] += np.bincount(
+                        bin_indices(members, state["low"], state["high"], bins), minlength=bins
+                    )
+
+        remaining = []
+        for target in pending:
+            state = targets[target]
+            member_min, member_max = extents[target]
+            if member_min == member_max:
+                results[target] = float(member_min)
+            elif state["collect"]:
+                members = np.concatenate(gathered[target])
+                results[target] = float(np.partition(members, state["rank"])[state["rank"]])
+            else:
+                cumulative = np.cumsum(counts[target])
+                index = int(np.searchsorted(cumulative, state["rank"], side='right'))
+                state["rank"] -= int(cumulative[index - 1]) if index > 0 else 0
+                state["levels"].append((state["low"], state["high"], index))
+                width = (state["high"] - state["low"]) / bins
+                state["low"], state["high"] = state["low"] + index * width, state["low"] + (index + 1) * width
+                state["collect"] = counts[target][index] <= EXACT_SELECTION_LIMIT or state["high"] <= state["low"]
+                remaining.append(target)
+        pending = remaining
+    return results
+
+def select_exact_percentiles(iterate_values, count, percentiles, low, high, bins=DEFAULT_HISTOGRAM_BINS):
+    """
+    Calculate exact percentiles of streamed values, interpolated linearly as np.percentile does.
+
+    Parameters:
+        iterate_values (callable): Returns a fresh iterator over 1D arrays of the values.
+        count (int): Number of values.
+        percentiles (list): Percentiles in [0, 100].
+        low (float): Minimum of the values.
+        high (float): Maximum of the values.
+        bins (int): Number of bins used at each refinement level.
+
+    Returns:
+        list: The value at each percentile.
+    """
+    positions = [percentile_ranks(count, percentile) for percentile in percentiles]
+    ranks = sorted({rank for lower, upper, _ in positions for rank in (lower, upper)})
+    values = dict(zip(ranks, select_exact_ranks(iterate_values, ranks, low, high, bins)))
+    return [values[lower] + weight * (values[upper] - values[lower]) for lower, upper, weight in positions]
+
+def compute_streaming_statistics(src, percentiles, exact=False, bins=DEFAULT_HISTOGRAM_BINS,
+                                 block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Calculate full-resolution statistics for every band of an open raster.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        percentiles (list): Percentiles to calculate, including 50.
+        exact (bool): Calculate exact percentiles with extra selection passes.
+        bins (int): Number of histogram bins for percentiles.
+        block_size (int): Size of the processing windows in pixels.
+
+    Returns:
+        dict: Statistics per band index.
+    """
+    bands = list(range(1, src.count + 1))
+    for band, nodata_value in zip(bands, src.nodatavals):
+        if nodata_value is not None:
+            logging.info(f"Band {band} has nodata value: {nodata_value}. Ignoring nodata values in calculations.")
+
+    # First pass: moments, extremes and nodata counts for all bands
+    logging.info(f"Calculating moments for {src.count} band(s).")
+    accumulators = {
+        band: {"count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf}
+        for band in bands
+    }
+    for window in generate_windows(src.width, src.height, block_size):
+        data = src.read(window=window)
+        for band in bands:
+            merge_moments(accumulators[band], valid_values(data[band - 1], *band_encoding(src, band)))
+
+    if all(accumulator["count"] == 0 for accumulator in accumulators.values()):
+        raise ValueError("The raster contains only nodata values. Statistics cannot be computed.")
+
+    # Histogram layout per band: one bin per stored value for narrow integer ranges
+    layouts = {}
+    for band, accumulator in accumulators.items():
+        if accumulator["count"] == 0:
+            logging.warning(f"Band {band} contains only nodata values.")
+            continue
+        low, high = accumulator["min"], accumulator["max"]
+        band_bins, per_value = bins, False
+        step = abs(band_encoding(src, band)[1])
+        levels = int(round((high - low) / step)) + 1
+        if np.dtype(src.dtypes[band - 1]).kind in 'iu' and levels <= bins:
+            band_bins, per_value = levels, True
+            low, high = low - step / 2, high + step / 2
+        layouts[band] = (low, high, band_bins, per_value)
+
+    # Second pass: histograms for all bands
+    logging.info("Calculating histograms for percentiles.")
+    histograms = {band: np.zeros(layout[2], dtype=np.int64) for band, layout in layouts.items()}
+    for window in generate_windows(src.width, src.height, block_size):
+        data = src.read(window=window)
+        for band, (low, high, band_bins, _) in layouts.items():
+            values = valid_values(data[band - 1], *band_encoding(src, band))
+            histograms[band] += np.bincount(bin_indices(values, low, high, band_bins), minlength=band_bins)
+
+    stats = {}
+    pixels = src.width * src.height
+    for band, accumulator in accumulators.items():
+        count = accumulator["count"]
+        band_stats = {
+            "count": count,
+            "nodata_count": pixels - count,
+            "mean": None, "std": None, "min": None, "max": None, "median": None,
+            "percentiles": {},
+        }
+        if count:
+            low, high, band_bins, per_value = layouts[band]
+            if exact and not per_value:
+                logging.info(f"Selecting exact percentiles for band {band}.")
+                selected = select_exact_percentiles(
+                    lambda band=band: iterate_band_values(src, band, block_size), count, percentiles,
+                    accumulator["min"], accumulator["max"], bins
+                )
+            else:
+                selected = []
+                for percentile in percentiles:
+                    lower, upper, weight = percentile_ranks(count, percentile)
+                    lower_value = histogram_value_at_rank(histograms[band], low, high, lower, per_value)
+                    upper_value = histogram_value_at_rank(histograms[band], low, high, upper, per_value)
+                    selected.append(lower_value + weight * (upper_value - lower_value))
+            band_stats["percentiles"] = {
+                percentile: float(value) for percentile, value in zip(percentiles, selected)
+            }
+            band_stats.update({
+                "mean": float(accumulator["mean"]),
+                "std": float(np.sqrt(accumulator["m2"] / count)),
+                "min": float(accumulator["min"]),
+                "max": float(accumulator["max"]),
+                "median": band_stats["percentiles"][50],
+            })
+        stats[band] = band_stats
+
+    return stats
+
+def compute_approximate_statistics(src, percentiles, max_size=APPROXIMATE_MAX_SIZE):
+    """
+    Calculate approximate statistics from a decimated read of every band.
+
+    The raster is read at reduced resolution so its longest side is at most
+    max_size pixels. GDAL serves such reads from the internal or external
+    overviews when they exist, so this returns in milliseconds even for very
+    large rasters. Counts are scaled back to full resolution.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        percentiles (list): Percentiles to calculate, including 50.
+        max_size (int): Maximum width or height of the decimated read in pixels.
+
+    Returns:
+        dict: Statistics per band index.
+    """
+    factor = max(1, int(np.ceil(max(src.width, src.height) / max_size)))
+    out_shape = (src.count, int(np.ceil(src.height / factor)), int(np.ceil(src.width / factor)))
+    logging.info(f"Reading {src.count} band(s) decimated by {factor} to {out_shape[2]}x{out_shape[1]} pixels.")
+    data = src.read(out_shape=out_shape, resampling=Resampling.nearest)
+
+    stats = {}
+    pixels = src.width * src.height
+    scale = pixels / (out_shape[1] * out_shape[2])
+    for band in range(1, src.count + 1):
+        values = valid_values(data[band - 1], *band_encoding(src, band))
+        count = int(round(values.size * scale))
+        band_stats = {
+            "count": count,
+            "nodata_count": pixels - count,
+            "mean": None, "std": None, "min": None, "max": None, "median": None,
+            "percentiles": {},
+        }
+        if values.size:
+            band_stats["percentiles"] = {
+                percentile: float(value)
+                for percentile, value in zip(percentiles, np.percentile(values, percentiles))
+            }
+            band_stats.update({
+                "mean": float(values.mean()),
+                "std": float(values.std()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "median": band_stats["percentiles"][50],
+            })
+        else:
+            logging.warning(f"Band {band} contains no valid values at the decimated resolution.")
+        stats[band] = band_stats
+
+    if all(band_stats["mean"] is None for band_stats in stats.values()):
+        raise ValueError("The raster contains only nodata values. Statistics cannot be computed.")
+    return stats
+
+def sidecar_path(raster_file):
+    """
+    Return the path of the statistics sidecar file for a raster.
+
+    Parameters:
+        raster_file (str): Path to the raster file.
+
+    Returns:
+        str: Path of the sidecar JSON file.
+    """
+    return f"{raster_file}{SIDECAR_SUFFIX}"
+
+def statistics_cache_key(approximate, exact, percentiles, bins):
+    """
+    Build the sidecar entry key for a set of statistics options.
+
+    Parameters:
+        approximate (bool): Whether approximate statistics were requested.
+        exact (bool): Whether exact percentiles were requested.
+        percentiles (list): Percentiles requested.
+        bins (int): Number of histogram bins.
+
+    Returns:
+        str: Entry key.
+    """
+    if approximate:
+        options = {"mode": "approximate"}
+    else:
+        options = {"mode": "exact" if exact else "histogram", "bins": bins}
+    options["percentiles"] = [float(percentile) for percentile in percentiles]
+    return json.dumps(options, sort_keys=True)
+
+def load_cached_statistics(raster_file, key):
+    """
+    Look up statistics in a raster's sidecar if the sidecar still matches the file.
+
+    The sidecar matches only while the file size and modification time are
+    unchanged; any rewrite of the file, even one of the same size, discards it.
+
+    Parameters:
+        raster_file (str): Path to the raster file.
+        key (str): Entry key from statistics_cache_key.
+
+    Returns:
+        tuple: (sidecar dict valid for the current file, cached statistics or None).
+    """
+    info = os.stat(raster_file)
+    fresh = {"size": info.st_size, "mtime_ns": info.st_mtime_ns, "entries": {}}
+    try:
+        with open(sidecar_path(raster_file)) as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return fresh, None
+
+    if sidecar.get("size") != info.st_size or sidecar.get("mtime_ns") != info.st_mtime_ns:
+        return fresh, None
+
+    cached = sidecar.get("entries", {}).get(key)
+    if cached is None:
+        return sidecar, None
+    stats = {
+        int(band): dict(band_stats, percentiles={
+            float(percentile): value for percentile, value in band_stats["percentiles"].items()
+        })
+        for band, band_stats in cached.items()
+    }
+    return sidecar, stats
+
+def save_cached_statistics(raster_file, sidecar, key, stats):
+    """
+    Store statistics in a raster's sidecar file.
+
+    Parameters:
+        raster_file (str): Path to the raster file.
+        sidecar (dict): Sidecar contents from load_cached_statistics.
+        key (str): Entry key from statistics_cache_key.
+        stats (dict): Statistics per band index.
+    """
+    sidecar.setdefault("entries", {})[key] = stats
+    try:
+        with open(sidecar_path(raster_file), 'w') as f:
+            json.dump(sidecar, f, indent=2)
+    except OSError as e:
+        logging.warning(f"Could not write statistics sidecar: {e}")
+
+def calculate_raster_statistics(raster_file, percentiles=(50,), exact=False, bins=DEFAULT_HISTOGRAM_BINS,
+                                block_size=DEFAULT_BLOCK_SIZE, approximate=False, use_cache=True):
+    """
+    Calculate statistics for every band of a raster file in bounded memory.
+
+    The raster is streamed window by window. A first pass over all bands gathers
+    count, nodata count, min, max, mean and standard deviation (Welford/Chan
+    updates). Percentiles, including the median, come from a second histogram
+    pass and are accurate to one bin width, (max - min) / bins; integer bands
+    with a value range no wider than the bin count get one bin per value and are
+    exact. With exact=True the percentiles are refined with streaming selection.
+    Quantized bands are decoded with their GeoTIFF scale and offset first.
+
+    With approximate=True the statistics are calculated from overviews or a
+    decimated read instead. Results are kept in a "<raster>.stats.json" sidecar
+    keyed by file size and modification time, so repeat
+    queries on an unchanged file are answered without reading the raster.
 
     Parameters:
         raster_file (str): Path to the input raster file.
+        percentiles (iterable): Percentiles to calculate in [0, 100] (default: median only).
+        exact (bool): Calculate exact percentiles with extra selection passes (default: False).
+        bins (int): Number of histogram bins for percentiles (default: 4096).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        approximate (bool): Calculate quick statistics from overviews (default: False).
+        use_cache (bool): Read and write the statistics sidecar (default: True).
 
     Returns:
-        dict: A dictionary containing raster statistics (mean, median, max, min).
+        dict: Statistics per band index (count, nodata_count, mean, std, min, max,
+            median and percentiles), or None if an error occurred.
     """
     try:
-        logging.info(f"Opening raster file: {raster_file}")
-        with rasterio.open(raster_file) as src:
-            # Read the first band of raster data
-            logging.info("Reading raster data.")
-            data = src.read(1)
-
-            # Handle nodata values if they exist
-            nodata_value = src.nodata
-            if nodata_value is not None:
-                logging.info(f"Raster has nodata value: {nodata_value}. Ignoring nodata values in calculations.")
-                data = np.where(data == nodata_value, np.nan, data)
-
-            # Check if the raster data contains valid values
-            if np.isnan(data).all():
-                raise ValueError("The raster contains only nodata values. Statistics cannot be computed.")
-
-            # Calculate statistics, ignoring nan values
-            logging.info("Calculating statistics.")
-            stats = {
-                "mean": np.nanmean(data),
-                "median": np.nanmedian(data),
-                "max": np.nanmax(data),
-                "min": np.nanmin(data),
-            }
+        percentiles = sorted(set(percentiles) | {50})
+        stats = None
+        sidecar = None
+        key = statistics_cache_key(approximate, exact, percentiles, bins)
+        # Virtual rasters are not cached: their content depends on the files they reference
+        if use_cache and os.path.isfile(raster_file) and not raster_file.lower().endswith('.vrt'):
+            sidecar, stats = load_cached_statistics(raster_file, key)
+            if stats is not None:
+                logging.info(f"Using cached statistics from: {sidecar_path(raster_file)}")
+
+        if stats is None:
+            logging.info(f"Opening raster file: {raster_file}")
+            with rasterio.open(raster_file) as src:
+                if approximate:
+                    stats = compute_approximate_statistics(src, percentiles)
+                else:
+                    stats = compute_streaming_statistics(src, percentiles, exact, bins, block_size)
+            if sidecar is not None:
+                save_cached_statistics(raster_file, sidecar, key, stats)
 
-            # Log the statistics
-            for key, value in stats.items():
-                logging.info(f"{key.capitalize()}: {value}")
+        # Log the statistics
+        for band, band_stats in stats.items():
+            for key in ("mean", "median", "max", "min", "std"):
+                logging.info(f"Band {band} {key.capitalize()}: {band_stats[key]}")
 
-            return stats
+        return stats
 
     except FileNotFoundError:
         logging.error(f"File not found: {raster_file}")
@@ -61,23 +571,41 @@ def print_statistics(stats):
     Print raster statistics in a user-friendly format.
 
     Parameters:
-        stats (dict): Dictionary containing raster statistics.
+        stats (dict): Dictionary containing raster statistics per band.
     """
     if stats:
         print("Raster Statistics:")
-        print(f"Mean: {stats['mean']}")
-        print(f"Median: {stats['median']}")
-        print(f"Max: {stats['max']}")
-        print(f"Min: {stats['min']}")
+        for band, band_stats in stats.items():
+            print(f"Band {band}:")
+            print(f"  Mean: {band_stats['mean']}")
+            print(f"  Median: {band_stats['median']}")
+            print(f"  Max: {band_stats['max']}")
+            print(f"  Min: {band_stats['min']}")
+            print(f"  Std: {band_stats['std']}")
+            print(f"  Valid pixels: {band_stats['count']} (nodata: {band_stats['nodata_count']})")
+            for percentile, value in band_stats["percentiles"].items():
+                if percentile != 50:
+                    print(f"  P{percentile:g}: {value}")
     else:
         print("No statistics available.")
 
 def main():
-    # Define the raster file path
-    raster_file = 'processed_data/dem.tif'
+    parser = argparse.ArgumentParser(description="Calculate statistics for every band of a raster.")
+    parser.add_argument('--input', default='processed_data/dem.tif', help="Path to the input raster")
+    parser.add_argument('--percentiles', type=float, nargs='*', default=[50], help="Percentiles to calculate")
+    parser.add_argument('--exact', action='store_true', help="Calculate exact percentiles")
+    parser.add_argument('--quick', action='store_true', help="Calculate approximate statistics from overviews")
+    parser.add_argument('--no-cache', action='store_true', help="Ignore and do not update the statistics sidecar")
+    args = parser.parse_args()
 
     # Calculate statistics
-    stats = calculate_raster_statistics(raster_file)
+    stats = calculate_raster_statistics(
+        args.input,
+        percentiles=args.percentiles,
+        exact=args.exact,
+        approximate=args.quick,
+        use_cache=not args.no_cache
+    )
 
     # Print statistics
     print_statistics(stats)
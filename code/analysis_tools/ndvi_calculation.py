@@ -1,10 +1,36 @@
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
 import rasterio
 import numpy as np
 import logging
 
+from calculate_slope import generate_windows
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Nodata value written for pixels without a valid NDVI
+NDVI_NODATA = -9999
+
+# Quantized index output: int16 values of index * 10000, decoded through the GeoTIFF scale
+QUANTIZED_INDEX_SCALE = 10000
+QUANTIZED_INDEX_NODATA = -32768
+
+# Processing window size (pixels) and internal tile size of the output GeoTIFF
+DEFAULT_BLOCK_SIZE = 1024
+OUTPUT_TILE_SIZE = 256
+
+# Band file suffixes used to pair scenes in batch mode (Sentinel-2 naming by default)
+DEFAULT_RED_SUFFIX = "_B04.tif"
+DEFAULT_NIR_SUFFIX = "_B08.tif"
+
+# Estimated peak memory of one batch worker process (buffers plus GDAL block cache), in MB
+DEFAULT_WORKER_MEMORY_MB = 512
+
 def calculate_ndvi(red, nir):
     """
     Calculate NDVI from red and NIR raster bands.
@@ -14,14 +40,127 @@ def calculate_ndvi(red, nir):
         nir (ndarray): NIR band raster data as a numpy array.
 
     Returns:
-        ndarray: NDVI raster as a numpy array.
+        ndarray: float32 NDVI raster as a numpy array, with NDVI_NODATA where red + NIR is zero.
     """
-    logging.info("Calculating NDVI.")
-    # Suppress warnings for division by zero or invalid operations
-    np.seterr(divide='ignore', invalid='ignore')
-    ndvi = (nir - red) / (nir + red)
-    ndvi = np.nan_to_num(ndvi, nan=-9999)  # Replace NaN values with -9999
-    return ndvi
+    logging.debug("Calculating NDVI.")
+    # Work on a float32 copy of the red band so the caller's array is left untouched
+    red = red.astype(np.float32)
+    nir = np.asarray(nir, dtype=np.float32)
+    return calculate_ndvi_in_place(red, nir, np.empty_like(red))
+
+def calculate_ndvi_in_place(red, nir, out):
+    """
+    Calculate NDVI into a preallocated buffer without creating full-size temporaries.
+
+    The inputs must already be float32, which also avoids the wrap-around that
+    unsigned integer bands suffer in (nir - red). The red buffer is overwritten
+    with the denominator.
+
+    Parameters:
+        red (ndarray): float32 red band values. Overwritten.
+        nir (ndarray): float32 NIR band values.
+        out (ndarray): float32 buffer that receives the NDVI values.
+
+    Returns:
+        ndarray: The out buffer.
+    """
+    np.subtract(nir, red, out=out)
+    np.add(nir, red, out=red)
+    np.divide(out, red, out=out, where=red != 0)
+    out[red == 0] = NDVI_NODATA
+    return out
+
+def quantize_index(index, out):
+    """
+    Encode index values as int16 multiples of 1 / QUANTIZED_INDEX_SCALE.
+
+    Values are rounded to four decimals and clipped to the int16 range. Pixels
+    holding NDVI_NODATA, which lies outside that range, become
+    QUANTIZED_INDEX_NODATA. The index buffer is overwritten.
+
+    Parameters:
+        index (ndarray): float32 index values. Overwritten.
+        out (ndarray): int16 buffer that receives the encoded values.
+
+    Returns:
+        ndarray: The out buffer.
+    """
+    invalid = index == NDVI_NODATA
+    index *= QUANTIZED_INDEX_SCALE
+    np.rint(index, out=index)
+    np.clip(index, -32767, 32767, out=index)
+    out[...] = index
+    out[invalid] = QUANTIZED_INDEX_NODATA
+    return out
+
+def get_window_buffers(buffers, block_size, window):
+    """
+    Return this thread's preallocated red, NIR, NDVI and mask buffers shaped to a window.
+
+    Each worker thread allocates its buffers once for a full block and reuses them
+    for every window it processes. The buffers are kept flat so the views handed
+    out for smaller edge windows stay contiguous.
+
+    Parameters:
+        buffers (threading.local): Thread-local storage holding the buffers.
+        block_size (int): Size of the processing windows in pixels.
+        window (Window): The window being processed.
+
+    Returns:
+        tuple: (red, nir, ndvi, mask) arrays shaped (window.height, window.width).
+    """
+    if not hasattr(buffers, "red"):
+        buffers.red = np.empty(block_size * block_size, dtype=np.float32)
+        buffers.nir = np.empty(block_size * block_size, dtype=np.float32)
+        buffers.ndvi = np.empty(block_size * block_size, dtype=np.float32)
+        buffers.mask = np.empty(block_size * block_size, dtype=bool)
+
+    size = window.height * window.width
+    shape = (window.height, window.width)
+    return (
+        buffers.red[:size].reshape(shape),
+        buffers.nir[:size].reshape(shape),
+        buffers.ndvi[:size].reshape(shape),
+        buffers.mask[:size].reshape(shape)
+    )
+
+def process_window(red_src, nir_src, dst, window, buffers, block_size, read_lock, write_lock, quantize=False):
+    """
+    Calculate NDVI for one window and write it to the output raster.
+
+    Parameters:
+        red_src (DatasetReader): Rasterio object for the red band.
+        nir_src (DatasetReader): Rasterio object for the NIR band.
+        dst (DatasetWriter): Opened output NDVI dataset.
+        window (Window): The window to process.
+        buffers (threading.local): Thread-local storage for the window buffers.
+        block_size (int): Size of the processing windows in pixels.
+        read_lock (Lock): Lock guarding reads from the source datasets.
+        write_lock (Lock): Lock guarding writes to the output dataset.
+        quantize (bool): Write int16 values of NDVI * 10000 (default: False).
+    """
+    red, nir, ndvi, mask = get_window_buffers(buffers, block_size, window)
+
+    with read_lock:
+        red_src.read(1, window=window, out=red)
+        nir_src.read(1, window=window, out=nir)
+
+    # Remember input nodata pixels before the red buffer is overwritten
+    mask.fill(False)
+    if red_src.nodata is not None:
+        mask |= red == red_src.nodata
+    if nir_src.nodata is not None:
+        mask |= nir == nir_src.nodata
+
+    calculate_ndvi_in_place(red, nir, ndvi)
+    ndvi[mask] = NDVI_NODATA
+    if quantize:
+        if not hasattr(buffers, "quantized"):
+            buffers.quantized = np.empty(block_size * block_size, dtype=np.int16)
+        ndvi = quantize_index(ndvi, buffers.quantized[:ndvi.size].reshape(ndvi.shape))
+
+    with write_lock:
+        dst.write(ndvi, 1, window=window)
 
 def validate_rasters(red_src, nir_src):
     """
@@ -40,34 +179,36 @@ def validate_rasters(red_src, nir_src):
     if red_src.crs != nir_src.crs:
         raise ValueError("The red and NIR bands must have the same CRS.")
 
-def calculate_and_save_ndvi(red_band, nir_band, output_file):
+def calculate_and_save_ndvi(red_band, nir_band, output_file, block_size=DEFAULT_BLOCK_SIZE, num_workers=None,
+                            quantize=False):
     """
     Calculate NDVI from red and NIR raster bands and save the result.
 
+    The bands are streamed window by window into preallocated float32 buffers and
+    evaluated in a thread pool, so memory use stays constant regardless of scene size.
+    With quantize=True the output holds int16 values of NDVI * 10000 with a
+    matching scale in the GeoTIFF metadata, half the size of float32 output.
+
     Parameters:
         red_band (str): Path to the red band raster file.
         nir_band (str): Path to the NIR band raster file.
         output_file (str): Path to save the NDVI raster.
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
+        quantize (bool): Write scaled int16 instead of float32 output (default: False).
+
+    Returns:
+        bool: True if the NDVI raster was written successfully, False otherwise.
     """
     try:
         logging.info(f"Opening red band: {red_band}")
         logging.info(f"Opening NIR band: {nir_band}")
+        num_workers = num_workers or os.cpu_count() or 1
 
         with rasterio.open(red_band) as red_src, rasterio.open(nir_band) as nir_src:
             # Validate rasters
             validate_rasters(red_src, nir_src)
 
-            # Read raster data
-            logging.info("Reading raster data.")
-            red = red_src.read(1)
-            nir = nir_src.read(1)
-
-            # Calculate NDVI
-            ndvi = calculate_ndvi(red, nir)
-
-            # Preserve nodata value if it exists
-            nodata_value = red_src.nodata or -9999
-
             # Save NDVI raster
             logging.info(f"Saving NDVI to: {output_file}")
             with rasterio.open(
@@ -77,14 +218,37 @@ def calculate_and_save_ndvi(red_band, nir_band, output_file):
                 height=red_src.height,
                 width=red_src.width,
                 count=1,
-                dtype=ndvi.dtype,
+                dtype='int16' if quantize else 'float32',
                 crs=red_src.crs,
                 transform=red_src.transform,
-                nodata=nodata_value
+                nodata=QUANTIZED_INDEX_NODATA if quantize else NDVI_NODATA,
+                tiled=True,
+                blockxsize=OUTPUT_TILE_SIZE,
+                blockysize=OUTPUT_TILE_SIZE,
+                BIGTIFF='IF_SAFER'
             ) as dst:
-                dst.write(ndvi, 1)
+                if quantize:
+                    dst.scales = (1 / QUANTIZED_INDEX_SCALE,)
+                    dst.offsets = (0.0,)
+                windows = list(generate_windows(red_src.width, red_src.height, block_size))
+                logging.info(f"Calculating NDVI over {len(windows)} windows using {num_workers} worker threads.")
+
+                buffers = threading.local()
+                read_lock = threading.Lock()
+                write_lock = threading.Lock()
+                with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                    futures = [
+                        executor.submit(
+                            process_window, red_src, nir_src, dst, window, buffers, block_size,
+                            read_lock, write_lock, quantize
+                        )
+                        for window in windows
+                    ]
+                    for future in futures:
+                        future.result()
 
         logging.info("NDVI calculation and saving completed successfully.")
+        return True
 
     except FileNotFoundError as e:
         logging.error(f"File not found: {e}")
@@ -94,15 +258,209 @@ def calculate_and_save_ndvi(red_band, nir_band, output_file):
         logging.error(f"Rasterio error occurred: {e}")
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
+    return False
+
+def find_scene_pairs(root_dir, red_suffix=DEFAULT_RED_SUFFIX, nir_suffix=DEFAULT_NIR_SUFFIX):
+    """
+    Find matching red and NIR band files anywhere below a directory.
+
+    A red band file named <scene><red_suffix> is paired with <scene><nir_suffix>
+    in the same directory.
+
+    Parameters:
+        root_dir (str): Directory to search recursively.
+        red_suffix (str): File name suffix of red band files (default: '_B04.tif').
+        nir_suffix (str): File name suffix of NIR band files (default: '_B08.tif').
+
+    Returns:
+        list: Sorted (scene name, red path, NIR path) tuples.
+    """
+    pairs = []
+    for red_path in Path(root_dir).rglob(f"*{red_suffix}"):
+        scene = red_path.name[:-len(red_suffix)]
+        nir_path = red_path.with_name(scene + nir_suffix)
+        if nir_path.exists():
+            pairs.append((scene, red_path, nir_path))
+        else:
+            logging.warning(f"No NIR band found for {red_path}. Skipping scene.")
+    return sorted(pairs)
+
+def is_output_up_to_date(output_file, input_files):
+    """
+    Check whether an output file exists and is newer than all of its inputs.
+
+    Parameters:
+        output_file (str): Path to the output file.
+        input_files (list): Paths to the input files.
+
+    Returns:
+        bool: True if the output can be reused.
+    """
+    output_file = Path(output_file)
+    if not output_file.exists():
+        return False
+    output_mtime = output_file.stat().st_mtime
+    return all(Path(path).stat().st_mtime <= output_mtime for path in input_files)
+
+def determine_worker_count(max_workers=None, worker_memory_mb=DEFAULT_WORKER_MEMORY_MB):
+    """
+    Size the batch process pool to the available CPU cores and memory.
+
+    Parameters:
+        max_workers (int): Upper limit on the number of processes (default: number of CPU cores).
+        worker_memory_mb (int): Estimated peak memory of one worker in MB.
+
+    Returns:
+        int: Number of worker processes to start.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    try:
+        available_mb = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+        workers = min(workers, max(1, available_mb // worker_memory_mb))
+    except (AttributeError, ValueError, OSError):
+        logging.info("Available memory could not be determined. Sizing the pool by CPU cores only.")
+    return workers
+
+def process_scene(scene, red_band, nir_band, output_file, block_size=DEFAULT_BLOCK_SIZE, quantize=False):
+    """
+    Calculate NDVI for one scene in a batch worker process and time it.
+
+    Each process handles one scene at a time with a single thread, so the pool
+    spreads scenes across cores without oversubscribing them. The NDVI is
+    written to a temporary file that replaces the output only on success, so
+    a failed or interrupted scene never leaves an output that a later run
+    would take as up to date.
+
+    Parameters:
+        scene (str): Scene name used in the report.
+        red_band (str): Path to the red band raster file.
+        nir_band (str): Path to the NIR band raster file.
+        output_file (str): Path to save the NDVI raster.
+        block_size (int): Size of the processing windows in pixels.
+        quantize (bool): Write scaled int16 instead of float32 output.
+
+    Returns:
+        dict: Scene name, success flag, elapsed seconds, pixel count and bytes read.
+    """
+    start = time.perf_counter()
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    try:
+        success = calculate_and_save_ndvi(
+            red_band, nir_band, str(temp_path), block_size=block_size, num_workers=1, quantize=quantize
+        )
+        if success:
+            os.replace(temp_path, output_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+    elapsed = time.perf_counter() - start
+
+    pixels = 0
+    if success:
+        with rasterio.open(output_file) as dst:
+            pixels = dst.width * dst.height
+    return {
+        "scene": scene,
+        "success": success,
+        "seconds": elapsed,
+        "pixels": pixels,
+        "bytes_read": os.path.getsize(red_band) + os.path.getsize(nir_band),
+    }
+
+def run_ndvi_batch(root_dir, output_dir, red_suffix=DEFAULT_RED_SUFFIX, nir_suffix=DEFAULT_NIR_SUFFIX,
+                   max_workers=None, worker_memory_mb=DEFAULT_WORKER_MEMORY_MB, overwrite=False,
+                   block_size=DEFAULT_BLOCK_SIZE, quantize=False):
+    """
+    Calculate NDVI for every red/NIR scene pair below a directory on a process pool.
+
+    Outputs mirror the input directory layout below output_dir and are named
+    <scene>_NDVI.tif. Scenes whose output is newer than both bands are skipped
+    unless overwrite is set. Throughput is logged for each scene.
+
+    Parameters:
+        root_dir (str): Directory to search recursively for band files.
+        output_dir (str): Directory to save the NDVI rasters.
+        red_suffix (str): File name suffix of red band files (default: '_B04.tif').
+        nir_suffix (str): File name suffix of NIR band files (default: '_B08.tif').
+        max_workers (int): Upper limit on the number of processes (default: number of CPU cores).
+        worker_memory_mb (int): Estimated peak memory of one worker in MB, used to size the pool.
+        overwrite (bool): Recalculate scenes even if their output is up to date (default: False).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        quantize (bool): Write scaled int16 instead of float32 output (default: False).
+
+    Returns:
+        list: Per-scene result dictionaries for the scenes that were processed.
+    """
+    pairs = find_scene_pairs(root_dir, red_suffix, nir_suffix)
+    logging.info(f"Found {len(pairs)} scene pairs under {root_dir}.")
+
+    jobs = []
+    for scene, red_path, nir_path in pairs:
+        relative_dir = red_path.parent.relative_to(root_dir)
+        output_file = Path(output_dir) / relative_dir / f"{scene}_NDVI.tif"
+        if not overwrite and is_output_up_to_date(output_file, [red_path, nir_path]):
+            logging.info(f"Skipping {scene}: output is up to date.")
+            continue
+        jobs.append((scene, str(red_path), str(nir_path), str(output_file)))
+
+    if not jobs:
+        logging.info("All scenes are up to date.")
+        return []
+
+    workers = min(determine_worker_count(max_workers, worker_memory_mb), len(jobs))
+    logging.info(f"Processing {len(jobs)} scenes with {workers} worker processes.")
+
+    results = []
+    batch_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_scene, *job, block_size=block_size, quantize=quantize) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["success"]:
+                seconds = max(result["seconds"], 1e-9)
+                logging.info(
+                    f"{result['scene']}: {result['seconds']:.2f} s, "
+                    f"{result['pixels'] / seconds / 1e6:.1f} Mpixel/s, "
+                    f"{result['bytes_read'] / seconds / (1024 * 1024):.1f} MB/s read"
+                )
+            else:
+                logging.error(f"{result['scene']}: NDVI calculation failed.")
+
+    succeeded = sum(1 for result in results if result["success"])
+    logging.info(f"Batch completed: {succeeded} of {len(jobs)} scenes in "
+                 f"{time.perf_counter() - batch_start:.1f} s.")
+    return results
 
 def main():
-    # Define file paths
-    red_band = 'raw_data/landsat_red.tif'
-    nir_band = 'raw_data/landsat_nir.tif'
-    output_file = 'processed_data/ndvi.tif'
+    parser = argparse.ArgumentParser(description="Calculate NDVI for one scene or a directory of scenes.")
+    parser.add_argument('--red', default='raw_data/landsat_red.tif', help="Path to the red band file")
+    parser.add_argument('--nir', default='raw_data/landsat_nir.tif', help="Path to the NIR band file")
+    parser.add_argument('--output', default='processed_data/ndvi.tif', help="Path to save the NDVI raster")
+    parser.add_argument('--batch-dir', help="Process every red/NIR pair found below this directory")
+    parser.add_argument('--output-dir', default='processed_data/ndvi', help="Output directory in batch mode")
+    parser.add_argument('--red-suffix', default=DEFAULT_RED_SUFFIX, help="Red band file suffix in batch mode")
+    parser.add_argument('--nir-suffix', default=DEFAULT_NIR_SUFFIX, help="NIR band file suffix in batch mode")
+    parser.add_argument('--workers', type=int, help="Maximum number of worker processes in batch mode")
+    parser.add_argument('--overwrite', action='store_true', help="Recalculate scenes that are up to date")
+    parser.add_argument('--quantize', action='store_true', help="Write int16 NDVI * 10000 instead of float32")
+    args = parser.parse_args()
 
-    # Perform NDVI calculation and save the result
-    calculate_and_save_ndvi(red_band, nir_band, output_file)
+    if args.batch_dir:
+        run_ndvi_batch(
+            args.batch_dir,
+            args.output_dir,
+            red_suffix=args.red_suffix,
+            nir_suffix=args.nir_suffix,
+            max_workers=args.workers,
+            overwrite=args.overwrite,
+            quantize=args.quantize
+        )
+    else:
+        # Perform NDVI calculation and save the result
+        calculate_and_save_ndvi(args.red, args.nir, args.output, quantize=args.quantize)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,304 @@
+import os
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import rasterio
+import numpy as np
+import logging
+
+from calculate_slope import (
+    DEFAULT_BLOCK_SIZE,
+    OUTPUT_TILE_SIZE,
+    calculate_pixel_sizes,
+    convert_slope,
+    expand_window,
+    generate_windows,
+    nodata_mask,
+    window_pixel_sizes,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PRODUCTS = ("slope", "aspect", "hillshade", "curvature")
+KERNELS = ("horn", "zevenbergen-thorne")
+
+def pad_block(dem_block, window, expanded):
+    """
+    Pad a haloed DEM block so every cell of the window has a full 3x3 neighbourhood.
+
+    Sides where the halo was clipped by the raster edge are filled by repeating
+    the edge cells.
+
+    Parameters:
+        dem_block (ndarray): DEM values read with the expanded window.
+        window (Window): The window being processed.
+        expanded (Window): The expanded window the block was read with.
+
+    Returns:
+        ndarray: Array of shape (window.height + 2, window.width + 2).
+    """
+    top = 1 - (window.row_off - expanded.row_off)
+    left = 1 - (window.col_off - expanded.col_off)
+    bottom = window.height + 2 - dem_block.shape[0] - top
+    right = window.width + 2 - dem_block.shape[1] - left
+    if top or left or bottom or right:
+        dem_block = np.pad(dem_block, ((top, bottom), (left, right)), mode='edge')
+    return dem_block
+
+def calculate_terrain_derivatives(z, x_res, y_res, products, kernel="horn", slope_format="degrees",
+                                  azimuth=315.0, altitude=45.0, z_factor=1.0):
+    """
+    Calculate terrain derivatives from a padded DEM block in a single pass.
+
+    Each 3x3 neighbourhood is taken from shifted views of the padded block, so the
+    elevations are read once and shared by every product.
+
+    Parameters:
+        z (ndarray): float32 DEM block padded by one cell on every side.
+        x_res (float or ndarray): Pixel width, a scalar or a (rows, 1) array of per-row widths.
+        y_res (float or ndarray): Pixel height, a scalar or a (rows, 1) array of per-row heights.
+        products (iterable): Products to calculate ('slope', 'aspect', 'hillshade', 'curvature').
+        kernel (str): Gradient kernel, 'horn' or 'zevenbergen-thorne' (default: 'horn').
+        slope_format (str): Slope output format ('percent', 'degrees', or 'raw').
+        azimuth (float): Illumination azimuth in degrees clockwise from north (default: 315).
+        altitude (float): Illumination altitude in degrees above the horizon (default: 45).
+        z_factor (float): Vertical exaggeration applied to elevations (default: 1).
+
+    Returns:
+        dict: Mapping of product name to a float32 array the size of the unpadded block.
+    """
+    # Neighbourhood views:  a b c
+    #                       d e f
+    #                       g h i
+    a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+    d, e, f = z[1:-1, :-2], z[1:-1, 1:-1], z[1:-1, 2:]
+    g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+
+    if kernel == "horn":
+        dz_dx = np.add(c, i)
+        dz_dx -= a
+        dz_dx -= g
+        tmp = np.subtract(f, d)
+        tmp *= 2
+        dz_dx += tmp
+        dz_dx /= 8 * x_res
+
+        dz_dy = np.add(g, i)
+        dz_dy -= a
+        dz_dy -= c
+        np.subtract(h, b, out=tmp)
+        tmp *= 2
+        dz_dy += tmp
+        dz_dy /= 8 * y_res
+    elif kernel == "zevenbergen-thorne":
+        dz_dx = np.subtract(f, d)
+        dz_dx /= 2 * x_res
+        dz_dy = np.subtract(h, b)
+        dz_dy /= 2 * y_res
+        tmp = np.empty_like(dz_dx)
+    else:
+        raise ValueError(f"Invalid kernel: {kernel}. Choose 'horn' or 'zevenbergen-thorne'.")
+
+    if z_factor != 1:
+        dz_dx *= z_factor
+        dz_dy *= z_factor
+
+    results = {}
+    gradient = None
+    if "slope" in products or "hillshade" in products:
+        gradient = np.hypot(dz_dx, dz_dy)
+
+    if "hillshade" in products:
+        zenith = np.radians(90.0 - altitude)
+        azimuth_math = np.radians((450.0 - azimuth) % 360.0)
+        slope_rad = np.arctan(gradient)
+        aspect_rad = np.arctan2(dz_dy, -dz_dx, out=tmp)
+        aspect_rad -= azimuth_math
+        np.cos(aspect_rad, out=aspect_rad)
+        aspect_rad *= np.sin(slope_rad)
+        aspect_rad *= np.sin(zenith)
+        np.cos(slope_rad, out=slope_rad)
+        slope_rad *= np.cos(zenith)
+        slope_rad += aspect_rad
+        np.clip(slope_rad, 0, None, out=slope_rad)
+        slope_rad *= 255
+        results["hillshade"] = slope_rad
+
+    if "slope" in products:
+        results["slope"] = convert_slope(gradient, slope_format)
+
+    if "aspect" in products:
+        # Compass bearing of the downslope direction, -1 for flat cells
+        aspect = np.degrees(np.arctan2(dz_dy, -dz_dx))
+        aspect = np.subtract(90.0, aspect, out=aspect)
+        aspect[aspect < 0] += 360.0
+        aspect[(dz_dx == 0) & (dz_dy == 0)] = -1
+        results["aspect"] = aspect
+
+    if "curvature" in products:
+        # Zevenbergen-Thorne second derivatives, reported like the ESRI curvature (1/100 z units)
+        d2z_dx2 = np.add(d, f)
+        d2z_dx2 /= 2
+        d2z_dx2 -= e
+        d2z_dx2 /= x_res ** 2
+        d2z_dy2 = np.add(b, h)
+        d2z_dy2 /= 2
+        d2z_dy2 -= e
+        d2z_dy2 /= y_res ** 2
+        curvature = np.add(d2z_dx2, d2z_dy2, out=d2z_dx2)
+        curvature *= -200 * z_factor
+        results["curvature"] = curvature
+
+    return {name: results[name].astype(np.float32, copy=False) for name in products}
+
+def process_window(src, destinations, window, options, pixel_sizes, read_lock, write_lock):
+    """
+    Calculate the requested terrain derivatives for one window and write them out.
+
+    Parameters:
+        src (DatasetReader): Opened DEM dataset.
+        destinations (dict): Mapping of product name to opened output dataset.
+        window (Window): The window to process.
+        options (dict): Keyword arguments for calculate_terrain_derivatives.
+        pixel_sizes (tuple): (x_res, y_res) as returned by calculate_pixel_sizes.
+        read_lock (Lock): Lock guarding reads from the source dataset.
+        write_lock (Lock): Lock guarding writes to the output datasets.
+    """
+    expanded, _ = expand_window(window, src.width, src.height)
+    x_res, y_res = window_pixel_sizes(pixel_sizes, window)
+
+    with read_lock:
+        dem_block = src.read(1, window=expanded, out_dtype='float32')
+
+    padded = pad_block(dem_block, window, expanded)
+    results = calculate_terrain_derivatives(padded, x_res, y_res, destinations.keys(), **options)
+
+    if src.nodata is not None:
+        # Any cell whose 3x3 neighbourhood touches nodata has no valid derivative
+        invalid = nodata_mask(padded, src.nodata)
+        touches_nodata = np.zeros(results[next(iter(results))].shape, dtype=bool)
+        for row in range(3):
+            for col in range(3):
+                touches_nodata |= invalid[row:row + window.height, col:col + window.width]
+        for values in results.values():
+            values[touches_nodata] = src.nodata
+
+    with write_lock:
+        for name, dst in destinations.items():
+            dst.write(results[name], 1, window=window)
+
+def process_terrain(src_file, outputs, kernel="horn", slope_format="degrees", azimuth=315.0, altitude=45.0,
+                    z_factor=1.0, block_size=DEFAULT_BLOCK_SIZE, num_workers=None):
+    """
+    Calculate any set of terrain derivatives from a DEM in one windowed pass.
+
+    Every window is read once and all requested products are derived from the same
+    3x3 neighbourhoods and written as tiled float32 GeoTIFFs. DEMs in a geographic
+    CRS are handled directly with per-row metre-per-degree scaling.
+
+    Parameters:
+        src_file (str): Path to the input DEM file.
+        outputs (dict): Mapping of product name ('slope', 'aspect', 'hillshade', 'curvature') to output path.
+        kernel (str): Gradient kernel, 'horn' or 'zevenbergen-thorne' (default: 'horn').
+        slope_format (str): Slope output format ('percent', 'degrees', or 'raw').
+        azimuth (float): Hillshade illumination azimuth in degrees (default: 315).
+        altitude (float): Hillshade illumination altitude in degrees (default: 45).
+        z_factor (float): Vertical exaggeration applied to elevations (default: 1).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
+    """
+    destinations = {}
+    try:
+        if not outputs:
+            raise ValueError("No terrain products requested.")
+        unknown = set(outputs) - set(PRODUCTS)
+        if unknown:
+            raise ValueError(f"Invalid terrain products: {sorted(unknown)}. Choose from {list(PRODUCTS)}.")
+        if kernel not in KERNELS:
+            raise ValueError(f"Invalid kernel: {kernel}. Choose 'horn' or 'zevenbergen-thorne'.")
+        if slope_format not in ("percent", "degrees", "raw"):
+            raise ValueError(f"Invalid slope format: {slope_format}. Choose 'percent', 'degrees', or 'raw'.")
+
+        num_workers = num_workers or os.cpu_count() or 1
+        options = {
+            "kernel": kernel,
+            "slope_format": slope_format,
+            "azimuth": azimuth,
+            "altitude": altitude,
+            "z_factor": z_factor,
+        }
+
+        logging.info(f"Opening DEM file: {src_file}")
+        with rasterio.open(src_file) as src:
+            pixel_sizes = calculate_pixel_sizes(src)
+            for name, path in outputs.items():
+                logging.info(f"Saving {name} raster to: {path}")
+                destinations[name] = rasterio.open(
+                    path,
+                    'w',
+                    driver='GTiff',
+                    height=src.height,
+                    width=src.width,
+                    count=1,
+                    dtype='float32',
+                    crs=src.crs,
+                    transform=src.transform,
+                    nodata=src.nodata,
+                    tiled=True,
+                    blockxsize=OUTPUT_TILE_SIZE,
+                    blockysize=OUTPUT_TILE_SIZE,
+                    BIGTIFF='IF_SAFER'
+                )
+
+            windows = list(generate_windows(src.width, src.height, block_size))
+            logging.info(f"Calculating {', '.join(outputs)} over {len(windows)} windows "
+                         f"using the {kernel} kernel and {num_workers} worker threads.")
+
+            read_lock = threading.Lock()
+            write_lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = [
+                    executor.submit(
+                        process_window, src, destinations, window, options, pixel_sizes, read_lock, write_lock
+                    )
+                    for window in windows
+                ]
+                for future in futures:
+                    future.result()
+
+        logging.info("Terrain derivatives calculated and saved successfully.")
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+    finally:
+        for dst in destinations.values():
+            dst.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculate slope, aspect, hillshade and curvature from a DEM.")
+    parser.add_argument('--input', required=True, help="Path to the input DEM")
+    parser.add_argument('--slope', help="Path to save the slope raster")
+    parser.add_argument('--aspect', help="Path to save the aspect raster")
+    parser.add_argument('--hillshade', help="Path to save the hillshade raster")
+    parser.add_argument('--curvature', help="Path to save the curvature raster")
+    parser.add_argument('--kernel', choices=KERNELS, default="horn", help="Gradient kernel (default: horn)")
+    parser.add_argument('--slope-format', choices=("percent", "degrees", "raw"), default="degrees",
+                        help="Slope output format (default: degrees)")
+    parser.add_argument('--azimuth', type=float, default=315.0, help="Hillshade azimuth in degrees (default: 315)")
+    parser.add_argument('--altitude', type=float, default=45.0, help="Hillshade altitude in degrees (default: 45)")
+    parser.add_argument('--z-factor', type=float, default=1.0, help="Vertical exaggeration (default: 1)")
+    args = parser.parse_args()
+
+    outputs = {name: getattr(args, name) for name in PRODUCTS if getattr(args, name)}
+    process_terrain(
+        args.input,
+        outputs,
+        kernel=args.kernel,
+        slope_format=args.slope_format,
+        azimuth=args.azimuth,
+        altitude=args.altitude,
+        z_factor=args.z_factor
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import os
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import geopandas as gpd
+import rasterio
+import numpy as np
+import logging
+from rasterio.features import rasterize
+from rasterio.windows import bounds as window_bounds
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+from extract_statistics import DEFAULT_BLOCK_SIZE, band_encoding, generate_windows
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Number of histogram bins per zone used for percentiles
+DEFAULT_ZONE_BINS = 256
+
+def load_zones(zones_file, raster_crs):
+    """
+    Load the zone polygons and align them with the raster CRS.
+
+    Parameters:
+        zones_file (str): Path to the polygon layer.
+        raster_crs (CRS): The CRS of the raster.
+
+    Returns:
+        GeoDataFrame: The zone polygons in the raster CRS.
+
+    Raises:
+        ValueError: If the layer is empty or contains non-polygon geometries.
+    """
+    logging.info(f"Loading zones from: {zones_file}")
+    zones = gpd.read_file(zones_file)
+    if zones.empty:
+        raise ValueError("The zones layer is empty. Please provide a valid polygon layer.")
+    if not zones.geometry.type.isin(["Polygon", "MultiPolygon"]).all():
+        raise ValueError("The zones layer must contain only Polygon or MultiPolygon geometries.")
+    if zones.crs != raster_crs:
+        logging.info("CRS mismatch detected. Reprojecting zones to match raster CRS.")
+        zones = zones.to_crs(raster_crs)
+    return zones
+
+def rasterize_zone_ids(geometries, tree, src, window):
+    """
+    Burn the 1-based ids of the zones intersecting a window.
+
+    Parameters:
+        geometries (ndarray): Zone geometries in raster CRS.
+        tree (STRtree): Spatial index over the geometries.
+        src (DatasetReader): Opened raster dataset.
+        window (Window): The window to rasterize.
+
+    Returns:
+        ndarray: uint32 zone ids for the window (0 outside all zones), or None if no zone intersects it.
+    """
+    candidates = tree.query(box(*window_bounds(window, src.transform)))
+    if len(candidates) == 0:
+        return None
+    # The tree returns candidates in its own order; burn them in layer order so the last zone wins
+    candidates = np.sort(candidates)
+    return rasterize(
+        ((geometries[index], index + 1) for index in candidates),
+        out_shape=(window.height, window.width),
+        transform=src.window_transform(window),
+        fill=0,
+        dtype='uint32'
+    )
+
+def read_zone_values(src, band, window, zone_ids, read_lock):
+    """
+    Read a window and return the zone id and decoded value of every valid pixel inside a zone.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        band (int): Band index (1-based).
+        window (Window): The window to read.
+        zone_ids (ndarray): Zone ids for the window.
+        read_lock (Lock): Lock guarding reads from the source dataset.
+
+    Returns:
+        tuple: (zone ids, float64 values) as 1D arrays.
+    """
+    with read_lock:
+        data = src.read(band, window=window)
+        nodata, scale, offset = band_encoding(src, band)
+
+    valid = zone_ids > 0
+    if data.dtype.kind == 'f':
+        valid &= np.isfinite(data)
+    if nodata is not None:
+        valid &= data != nodata
+    values = data[valid].astype(np.float64)
+    if scale != 1 or offset != 0:
+        values = values * scale + offset
+    return zone_ids[valid], values
+
+def reduce_window(src, band, window, geometries, tree, zone_count, read_lock):
+    """
+    Aggregate count, sum, mean, M2, min and max per zone for one window.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        band (int): Band index (1-based).
+        window (Window): The window to process.
+        geometries (ndarray): Zone geometries in raster CRS.
+        tree (STRtree): Spatial index over the geometries.
+        zone_count (int): Number of zones.
+        read_lock (Lock): Lock guarding reads from the source dataset.
+
+    Returns:
+        dict: Arrays of length zone_count + 1 indexed by zone id, or None if the window has no zones.
+    """
+    zone_ids = rasterize_zone_ids(geometries, tree, src, window)
+    if zone_ids is None:
+        return None
+    zones, values = read_zone_values(src, band, window, zone_ids, read_lock)
+    if zones.size == 0:
+        return None
+
+    size = zone_count + 1
+    counts = np.bincount(zones, minlength=size)
+    sums = np.bincount(zones, weights=values, minlength=size)
+    means = np.divide(sums, counts, out=np.zeros(size), where=counts > 0)
+    m2 = np.bincount(zones, weights=np.square(values - means[zones]), minlength=size)
+
+    # Per-zone extremes from runs of equal zone ids after sorting
+    order = np.argsort(zones, kind='stable')
+    sorted_zones = zones[order]
+    sorted_values = values[order]
+    starts = np.flatnonzero(np.r_[True, sorted_zones[1:] != sorted_zones[:-1]])
+    present = sorted_zones[starts]
+    mins = np.full(size, np.inf)
+    maxs = np.full(size, -np.inf)
+    mins[present] = np.minimum.reduceat(sorted_values, starts)
+    maxs[present] = np.maximum.reduceat(sorted_values, starts)
+
+    return {"count": counts, "sum": sums, "mean": means, "m2": m2, "min": mins, "max": maxs}
+
+def merge_partials(total, partial):
+    """
+    Merge per-zone partial aggregates into running totals (vectorized Chan update).
+
+    Parameters:
+        total (dict): Running per-zone aggregates, updated in place.
+        partial (dict): Per-zone aggregates from one window.
+    """
+    count = total["count"] + partial["count"]
+    delta = partial["mean"] - total["mean"]
+    has_data = count > 0
+    weight = np.divide(partial["count"], count, out=np.zeros(count.size), where=has_data)
+
+    total["mean"] += delta * weight
+    total["m2"] += partial["m2"] + delta * delta * total["count"] * weight
+    total["count"] = count
+    total["sum"] += partial["sum"]
+    np.minimum(total["min"], partial["min"], out=total["min"])
+    np.maximum(total["max"], partial["max"], out=total["max"])
+
+def histogram_window(src, band, window, geometries, tree, zone_min, zone_max, bins, read_lock):
+    """
+    Build histograms for the zones present in one window over each zone's own value range.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        band (int): Band index (1-based).
+        window (Window): The window to process.
+        geometries (ndarray): Zone geometries in raster CRS.
+        tree (STRtree): Spatial index over the geometries.
+        zone_min (ndarray): Minimum value of each zone.
+        zone_max (ndarray): Maximum value of each zone.
+        bins (int): Number of bins per zone.
+        read_lock (Lock): Lock guarding reads from the source dataset.
+
+    Returns:
+        tuple: (ids of the zones present, histogram counts of shape (present zones, bins)),
+            or None if the window has no zones.
+    """
+    zone_ids = rasterize_zone_ids(geometries, tree, src, window)
+    if zone_ids is None:
+        return None
+    zones, values = read_zone_values(src, band, window, zone_ids, read_lock)
+    if zones.size == 0:
+        return None
+
+    low = zone_min[zones]
+    span = zone_max[zones] - low
+    bin_index = np.divide((values - low) * bins, span, out=np.zeros(values.size), where=span > 0)
+    bin_index = np.clip(bin_index.astype(np.int64), 0, bins - 1)
+
+    # Count into a compact block covering only the zones of this window
+    present, local = np.unique(zones, return_inverse=True)
+    counts = np.bincount(local * bins + bin_index, minlength=present.size * bins)
+    return present, counts.reshape(present.size, bins)
+
+def zone_percentiles(histograms, zone_min, zone_max, counts, percentile):
+    """
+    Estimate a percentile for every zone from its histogram.
+
+    Parameters:
+        histograms (ndarray): Per-zone histograms of shape (zone_count + 1, bins).
+        zone_min (ndarray): Minimum value of each zone.
+        zone_max (ndarray): Maximum value of each zone.
+        counts (ndarray): Number of valid pixels in each zone.
+        percentile (float): Percentile in [0, 100].
+
+    Returns:
+        ndarray: Percentile of each zone, accurate to one bin width; NaN for empty zones.
+    """
+    bins = histograms.shape[1]
+    has_data = counts > 0
+    zone_min = np.where(has_data, zone_min, 0.0)
+    zone_max = np.where(has_data, zone_max, 0.0)
+    rank = np.floor(percentile / 100 * np.maximum(counts - 1, 0))
+    cumulative = np.cumsum(histograms, axis=1)
+    index = np.minimum((cumulative <= rank[:, np.newaxis]).sum(axis=1), bins - 1)
+    rows = np.arange(histograms.shape[0])
+    before = np.where(index > 0, cumulative[rows, np.maximum(index - 1, 0)], 0)
+    in_bin = np.maximum(histograms[rows, index], 1)
+    width = (zone_max - zone_min) / bins
+    values = zone_min + width * (index + (rank - before + 0.5) / in_bin)
+    values = np.minimum(values, zone_max)
+    values[~has_data] = np.nan
+    return values
+
+def run_windows(executor, num_workers, function, windows, *args):
+    """
+    Run a per-window function in the thread pool and yield results as they complete.
+
+    At most 2 * num_workers windows are in flight at once, so only a bounded number
+    of unmerged results is held in memory regardless of the number of windows.
+
+    Parameters:
+        executor (ThreadPoolExecutor): The thread pool.
+        num_workers (int): Number of worker threads of the pool.
+        function (callable): Function called as function(src, band, window, *rest).
+        windows (list): Windows to process.
+        *args: (src, band) followed by the remaining arguments for the function.
+
+    Yields:
+        The non-empty results of the function.
+    """
+    src, band, *rest = args
+    windows = iter(windows)
+    pending = set()
+    while True:
+        for window in windows:
+            pending.add(executor.submit(function, src, band, window, *rest))
+            if len(pending) >= 2 * num_workers:
+                break
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            if result is not None:
+                yield result
+
+def calculate_zonal_statistics(raster_file, zones_file, output_file=None, band=1, percentiles=(),
+                               bins=DEFAULT_ZONE_BINS, block_size=DEFAULT_BLOCK_SIZE, num_workers=None):
+    """
+    Calculate statistics of a raster band for every polygon of a zone layer.
+
+    The raster is opened once and processed window by window in a thread pool.
+    For each window the intersecting zones are found with an STRtree, their ids
+    are rasterized and the pixel values are reduced per zone with bincount. The
+    results are joined back onto the polygons. Percentiles take a second pass
+    that builds a histogram over each zone's own range and are accurate to
+    (zone max - zone min) / bins. Where polygons overlap, each pixel is counted
+    for the zone that appears last in the layer.
+
+    Parameters:
+        raster_file (str): Path to the input raster file.
+        zones_file (str): Path to the polygon layer defining the zones.
+        output_file (str): Path to save the zones with their statistics (optional).
+        band (int): Band index to summarise (default: 1).
+        percentiles (iterable): Percentiles to calculate in [0, 100] (default: none).
+        bins (int): Number of histogram bins per zone for percentiles (default: 256).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
+
+    Returns:
+        GeoDataFrame: The zones with one column per statistic, or None if an error occurred.
+    """
+    try:
+        num_workers = num_workers or os.cpu_count() or 1
+
+        logging.info(f"Opening raster file: {raster_file}")
+        with rasterio.open(raster_file) as src:
+            if not 1 <= band <= src.count:
+                raise ValueError(f"Band {band} does not exist. The raster has {src.count} band(s).")
+            zones = load_zones(zones_file, src.crs)
+            geometries = zones.geometry.values
+            tree = STRtree(geometries)
+            zone_count = len(zones)
+            windows = list(generate_windows(src.width, src.height, block_size))
+            read_lock = threading.Lock()
+
+            logging.info(f"Calculating statistics for {zone_count} zones over {len(windows)} windows "
+                         f"using {num_workers} worker threads.")
+            size = zone_count + 1
+            totals = {
+                "count": np.zeros(size, dtype=np.int64),
+                "sum": np.zeros(size),
+                "mean": np.zeros(size),
+                "m2": np.zeros(size),
+                "min": np.full(size, np.inf),
+                "max": np.full(size, -np.inf),
+            }
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                for partial in run_windows(executor, num_workers, reduce_window, windows, src, band, geometries,
+                                           tree, zone_count, read_lock):
+                    merge_partials(totals, partial)
+
+                histograms = None
+                if percentiles:
+                    logging.info("Calculating per-zone histograms for percentiles.")
+                    histograms = np.zeros((size, bins), dtype=np.int64)
+                    for present, counts in run_windows(executor, num_workers, histogram_window, windows, src, band,
+                                                       geometries, tree, totals["min"], totals["max"], bins,
+                                                       read_lock):
+                        histograms[present] += counts
+
+        counts = totals["count"]
+        empty = counts == 0
+        results = {
+            "count": counts,
+            "sum": np.where(empty, np.nan, totals["sum"]),
+            "mean": np.where(empty, np.nan, totals["mean"]),
+            "min": np.where(empty, np.nan, totals["min"]),
+            "max": np.where(empty, np.nan, totals["max"]),
+            "std": np.where(empty, np.nan, np.sqrt(totals["m2"] / np.maximum(counts, 1))),
+        }
+        if histograms is not None:
+            for percentile in percentiles:
+                results[f"p{percentile:g}"] = zone_percentiles(
+                    histograms, totals["min"], totals["max"], counts, percentile
+                )
+
+        # Drop the background slot (id 0) and join the statistics back onto the polygons
+        for name, values in results.items():
+            zones[name] = values[1:]
+        logging.info(f"{int((~empty[1:]).sum())} of {zone_count} zones contain valid pixels.")
+
+        if output_file:
+            logging.info(f"Saving zonal statistics to: {output_file}")
+            zones.to_file(output_file, driver="GPKG")
+
+        logging.info("Zonal statistics completed successfully.")
+        return zones
+
+    except FileNotFoundError as e:
+        logging.error(f"File not found: {e}")
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
+    except rasterio.errors.RasterioIOError as e:
+        logging.error(f"Rasterio error occurred: {e}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculate raster statistics for every polygon in a layer.")
+    parser.add_argument('--raster', required=True, help="Path to the input raster")
+    parser.add_argument('--zones', required=True, help="Path to the polygon layer")
+    parser.add_argument('--output', required=True, help="Path to save the zones with statistics (GeoPackage)")
+    parser.add_argument('--band', type=int, default=1, help="Band to summarise (default: 1)")
+    parser.add_argument('--percentiles', type=float, nargs='*', default=[], help="Percentiles to calculate, e.g. 10 50 90")
+    args = parser.parse_args()
+
+    calculate_zonal_statistics(args.raster, args.zones, args.output, band=args.band, percentiles=args.percentiles)
+
+if __name__ == "__main__":
+    main()
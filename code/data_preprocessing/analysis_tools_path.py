@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# The preprocessing tools share helpers (processing windows, clip masks, the buffer engine)
+# with the analysis tools. Importing this module makes the analysis tool modules importable
+# by name, after the modules of this directory.
+ANALYSIS_TOOLS_DIR = str(Path(__file__).resolve().parent.parent / "analysis_tools")
+if ANALYSIS_TOOLS_DIR not in sys.path:
+    sys.path.append(ANALYSIS_TOOLS_DIR)
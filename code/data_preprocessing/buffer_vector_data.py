@@ -1,68 +1,30 @@
-import geopandas as gpd
-from pathlib import Path
-from pyproj import CRS
+import argparse
 import logging
 
+import analysis_tools_path
+from buffer_engine import add_buffer_arguments, buffer_style_options, buffer_vector_file
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def validate_and_reproject_crs(gdf):
-    """
-    Validate the CRS of a GeoDataFrame and reproject to a projected CRS if needed.
-
-    Parameters:
-        gdf (GeoDataFrame): Input GeoDataFrame.
-
-    Returns:
-        GeoDataFrame: GeoDataFrame with a projected CRS.
-    """
-    try:
-        if gdf.crs is None:
-            raise ValueError("The input vector file has no CRS defined. Define a CRS for accurate buffering.")
-
-        if not gdf.crs.is_projected:
-            logging.warning("The CRS is not projected. Reprojecting to EPSG:3857 (Web Mercator) for accurate buffering.")
-            gdf = gdf.to_crs(epsg=3857)
-        return gdf
-    except Exception as e:
-        logging.error(f"Error validating CRS: {e}")
-        raise
-
-def create_buffered_geometries(vector_file, output_file, buffer_distance=500):
+def create_buffered_geometries(vector_file, output_file, buffer_distance=500, num_workers=None, **style):
     """
     Create a buffer around each geometry in a vector file and save the result.
 
+    The layer is streamed through the buffer engine in chunks and buffered in
+    a process pool, so the whole layer is never held in memory. Layers without
+    a metric CRS are reprojected first.
+
     Parameters:
         vector_file (str): Path to the input vector file.
         output_file (str): Path to save the buffered geometries.
-        buffer_distance (float): Distance for the buffer in the CRS units (e.g., meters).
+        buffer_distance (float): Distance for the buffer in meters.
+        num_workers (int): Number of worker processes (default: number of CPU cores).
+        **style: projection, quad_segs, cap_style, join_style and mitre_limit (see buffer_engine).
     """
     try:
-        # Load the vector data
-        logging.info(f"Loading vector data from: {vector_file}")
-        gdf = gpd.read_file(vector_file)
-
-        # Validate and reproject CRS if needed
-        gdf = validate_and_reproject_crs(gdf)
-
-        # Create a buffer around each geometry
-        logging.info(f"Creating a buffer of {buffer_distance} units around each geometry.")
-        gdf['buffered_geometry'] = gdf.geometry.buffer(buffer_distance)
-
-        # Create a GeoDataFrame with buffered geometries
-        buffered_gdf = gpd.GeoDataFrame(
-            gdf.drop(columns='geometry'),  # Drop original geometry
-            geometry='buffered_geometry',  # Set buffered geometries as the new geometry
-            crs=gdf.crs  # Retain the original CRS
-        )
-
-        # Ensure output directory exists
-        output_dir = Path(output_file).parent
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        # Save the buffered geometries to a new file
-        logging.info(f"Saving buffered geometries to: {output_file}")
-        buffered_gdf.to_file(output_file)
+        # Buffer each geometry and save the result
+        buffer_vector_file(vector_file, output_file, buffer_distance, num_workers=num_workers, **style)
 
         logging.info("Buffering completed and file saved successfully.")
 
@@ -72,12 +34,17 @@ def create_buffered_geometries(vector_file, output_file, buffer_distance=500):
         logging.error(f"An error occurred: {e}")
 
 def main():
-    # Define input and output file paths
-    vector_file = 'data/vector_data.shp'
-    output_file = 'data/processed/buffered_vector_data.shp'
+    parser = argparse.ArgumentParser(description="Buffer each geometry of a vector file.")
+    parser.add_argument('input', nargs='?', default='data/vector_data.shp', help="Path to the input vector file")
+    parser.add_argument('buffer', nargs='?', type=float, default=500, help="Buffer distance in meters (default: 500)")
+    parser.add_argument('output', nargs='?', default='data/processed/buffered_vector_data.shp',
+                        help="Path to save the buffered geometries")
+    add_buffer_arguments(parser)
+    args = parser.parse_args()
 
     # Create buffered geometries
-    create_buffered_geometries(vector_file, output_file, buffer_distance=500)
+    create_buffered_geometries(args.input, args.output, buffer_distance=args.buffer, num_workers=args.workers,
+                               **buffer_style_options(args))
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,25 @@
+import os
+import re
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import geopandas as gpd
 import rasterio
-from rasterio.mask import mask
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
 from pathlib import Path
 import logging
 
+import analysis_tools_path
+from clip_raster_by_shapefile import clip_to_mask, load_geometry_mask
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Chips at least this wide and high are written with internal tiles of this size
+CHIP_TILE_SIZE = 256
+
 def validate_and_reproject_crs(aoi, raster_crs):
     """
     Validate the CRS of the AOI and reproject to match the raster CRS if necessary.
@@ -23,14 +36,20 @@ def validate_and_reproject_crs(aoi, raster_crs):
         return aoi.to_crs(raster_crs)
     return aoi
 
-def clip_raster_with_polygon(raster_file, polygon_file, output_file):
+def clip_raster_with_polygon(raster_file, polygon_file, output_file, mask_cache_dir=None):
     """
     Clip a raster file using a polygon shapefile and save the result.
 
+    With mask_cache_dir set, the crop window and mask of the AOI are cached per
+    raster grid, so clipping a stack of co-registered rasters to the same AOI
+    rasterizes it only once and the later clips are a windowed read plus a
+    mask apply.
+
     Parameters:
         raster_file (str): Path to the input raster file.
         polygon_file (str): Path to the polygon shapefile.
         output_file (str): Path to save the clipped raster.
+        mask_cache_dir (str): Directory for the geometry mask cache (optional).
     """
     try:
         # Load the polygon shapefile
@@ -47,13 +66,11 @@ def clip_raster_with_polygon(raster_file, polygon_file, output_file):
             raster_crs = src.crs
             aoi = validate_and_reproject_crs(aoi, raster_crs)
 
-            # Convert AOI geometry to GeoJSON format
-            logging.info("Converting AOI geometry to GeoJSON format.")
-            geo_json = [aoi.geometry.unary_union.__geo_interface__]
-
             # Perform the mask operation
             logging.info("Clipping raster with the AOI polygon.")
-            out_image, out_transform = mask(src, geo_json, crop=True)
+            shape_mask, window = load_geometry_mask(src, aoi.geometry.unary_union, mask_cache_dir)
+            nodata = src.nodata if src.nodata is not None else 0
+            out_image, out_transform = clip_to_mask(src, shape_mask, window, nodata)
 
             # Update metadata for the output raster
             out_meta = src.meta.copy()
@@ -72,7 +89,7 @@ def clip_raster_with_polygon(raster_file, polygon_file, output_file):
             # Save the clipped raster
             logging.info(f"Saving clipped raster to: {output_file}")
             with rasterio.open(output_file, 'w', **out_meta) as dest:
-                dest.write(out_image, 1)
+                dest.write(out_image)
 
         logging.info("Clipping operation completed successfully.")
 
@@ -85,14 +102,204 @@ def clip_raster_with_polygon(raster_file, polygon_file, output_file):
     except Exception as e:
         logging.error(f"An unexpected error occurred during raster clipping: {e}")
 
+def feature_windows(bounds, src):
+    """
+    Calculate the pixel window covering each feature's bounding box.
+
+    Parameters:
+        bounds (ndarray): Feature bounds of shape (n, 4) as (minx, miny, maxx, maxy) in raster CRS.
+        src (DatasetReader): Opened raster dataset.
+
+    Returns:
+        ndarray: Windows of shape (n, 4) as (col_off, row_off, width, height), clipped to the
+        raster extent. Features outside the raster get a zero width or height.
+    """
+    inverse = ~src.transform
+    xs = bounds[:, [0, 0, 2, 2]]
+    ys = bounds[:, [1, 3, 1, 3]]
+    cols = inverse.a * xs + inverse.b * ys + inverse.c
+    rows = inverse.d * xs + inverse.e * ys + inverse.f
+
+    col_start = np.clip(np.floor(cols.min(axis=1)), 0, src.width).astype(np.int64)
+    col_stop = np.clip(np.ceil(cols.max(axis=1)), 0, src.width).astype(np.int64)
+    row_start = np.clip(np.floor(rows.min(axis=1)), 0, src.height).astype(np.int64)
+    row_stop = np.clip(np.ceil(rows.max(axis=1)), 0, src.height).astype(np.int64)
+    return np.column_stack([col_start, row_start, col_stop - col_start, row_stop - row_start])
+
+def chip_file_name(chip_id):
+    """
+    Build a file name for a chip from its feature id.
+
+    Parameters:
+        chip_id: The feature id.
+
+    Returns:
+        str: The id with characters that are unsafe in file names replaced, plus '.tif'.
+    """
+    return re.sub(r'[^A-Za-z0-9._-]', '_', str(chip_id)) + '.tif'
+
+def clip_feature(src, geometry, window, chip_file, profile, read_lock):
+    """
+    Clip the raster to one feature and save it as a chip.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        geometry (Geometry): The feature geometry in raster CRS.
+        window (Window): Window covering the feature's bounding box.
+        chip_file (str): Path to save the chip.
+        profile (dict): Output profile shared by all chips.
+        read_lock (Lock): Lock guarding reads from the source dataset.
+
+    Returns:
+        int: Number of pixels inside the feature.
+    """
+    with read_lock:
+        data = src.read(window=window)
+    transform = src.window_transform(window)
+
+    # Pixels whose centre falls inside the feature, as rasterio.mask.mask does
+    inside = geometry_mask([geometry], out_shape=data.shape[1:], transform=transform, invert=True)
+    data[:, ~inside] = profile["nodata"]
+
+    chip_profile = dict(profile, width=data.shape[2], height=data.shape[1], transform=transform)
+    if min(data.shape[1:]) >= CHIP_TILE_SIZE:
+        chip_profile.update(tiled=True, blockxsize=CHIP_TILE_SIZE, blockysize=CHIP_TILE_SIZE)
+    with rasterio.open(chip_file, 'w', **chip_profile) as dst:
+        dst.write(data)
+    return int(inside.sum())
+
+def clip_raster_by_features(raster_file, polygon_file, output_dir, id_field=None, index_file=None,
+                            num_workers=None):
+    """
+    Clip a raster to every feature of a polygon layer, writing one chip per feature.
+
+    The raster and the polygon layer are opened once. Feature windows are
+    computed for all features together and the features are processed in order
+    of the raster block they start in, so neighbouring chips are read while
+    their blocks are still in GDAL's cache. Reads share the dataset under a
+    lock; masking, compression and writing of the chips run in a thread pool.
+    An index table lists every chip with its feature id, file, window and
+    geometry. Features that do not overlap the raster produce no chip.
+
+    Parameters:
+        raster_file (str): Path to the input raster file.
+        polygon_file (str): Path to the polygon layer.
+        output_dir (str): Directory to save the chips.
+        id_field (str): Attribute used to name the chips (default: the feature's position in the layer).
+        index_file (str): Path to save the index table, GeoPackage or .csv
+            (default: chips_index.gpkg in output_dir).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
+
+    Returns:
+        GeoDataFrame: The index table, or None if an error occurred.
+    """
+    try:
+        num_workers = num_workers or os.cpu_count() or 1
+
+        logging.info(f"Loading polygon layer from: {polygon_file}")
+        aoi = gpd.read_file(polygon_file)
+        if aoi.empty:
+            raise ValueError("The AOI shapefile is empty. Please provide a valid polygon file.")
+        if id_field is not None and id_field not in aoi.columns:
+            raise ValueError(f"Field '{id_field}' does not exist in the polygon layer.")
+        aoi = aoi[~(aoi.geometry.isna() | aoi.geometry.is_empty)]
+
+        chip_ids = aoi[id_field] if id_field is not None else aoi.index.to_series()
+        # Ids that differ only in unsafe characters or case would share a chip file on some file systems
+        chip_names = chip_ids.map(chip_file_name).str.lower()
+        if chip_names.duplicated().any():
+            duplicates = sorted(set(chip_ids[chip_names.duplicated(keep=False)].astype(str)))
+            raise ValueError(f"Feature ids must give unique chip file names; these ids collide: {duplicates[:10]}")
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        index_file = index_file or output_dir / "chips_index.gpkg"
+
+        with rasterio.open(raster_file) as src:
+            aoi = validate_and_reproject_crs(aoi, src.crs)
+            windows = feature_windows(aoi.geometry.bounds.to_numpy(), src)
+            overlaps = np.flatnonzero((windows[:, 2] > 0) & (windows[:, 3] > 0))
+            if overlaps.size < len(aoi):
+                logging.warning(f"{len(aoi) - overlaps.size} feature(s) do not overlap the raster and are skipped.")
+
+            # Visit the features block by block, row-major, like the raster is stored
+            block_height, block_width = src.block_shapes[0]
+            order = np.lexsort((windows[overlaps, 0] // block_width, windows[overlaps, 1] // block_height))
+            overlaps = overlaps[order]
+
+            profile = {
+                "driver": "GTiff",
+                "count": src.count,
+                "dtype": src.dtypes[0],
+                "crs": src.crs,
+                "nodata": src.nodata if src.nodata is not None else 0,
+                "compress": "deflate",
+            }
+            geometries = aoi.geometry.values
+            chip_files = [str(output_dir / chip_file_name(chip_ids.iloc[i])) for i in overlaps]
+            read_lock = threading.Lock()
+
+            logging.info(f"Clipping {overlaps.size} chips using {num_workers} worker threads.")
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = [
+                    executor.submit(clip_feature, src, geometries[i], Window(*windows[i]), chip_file,
+                                    profile, read_lock)
+                    for i, chip_file in zip(overlaps, chip_files)
+                ]
+                pixel_counts = [future.result() for future in futures]
+
+        # Index table in the original feature order
+        index = gpd.GeoDataFrame({
+            "chip_id": chip_ids.iloc[overlaps].to_numpy(),
+            "path": chip_files,
+            "col_off": windows[overlaps, 0],
+            "row_off": windows[overlaps, 1],
+            "width": windows[overlaps, 2],
+            "height": windows[overlaps, 3],
+            "pixels": pixel_counts,
+        }, geometry=geometries[overlaps], crs=aoi.crs, index=aoi.index[overlaps]).sort_index()
+
+        logging.info(f"Saving chip index to: {index_file}")
+        if Path(index_file).suffix.lower() == '.csv':
+            index.drop(columns="geometry").to_csv(index_file, index=False)
+        else:
+            index.to_file(index_file)
+
+        logging.info("Chip extraction completed successfully.")
+        return index
+
+    except FileNotFoundError as e:
+        logging.error(f"File not found: {e}")
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
+    except rasterio.errors.RasterioIOError as e:
+        logging.error(f"Rasterio error occurred: {e}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during chip extraction: {e}")
+    return None
+
 def main():
-    # Define input and output file paths
-    raster_file = 'data/raw_raster.tif'
-    polygon_file = 'data/aoi.shp'
-    output_file = 'data/processed/clip_raster_output.tif'
+    parser = argparse.ArgumentParser(description="Clip a raster by a polygon layer.")
+    parser.add_argument('raster', nargs='?', default='data/raw_raster.tif', help="Path to the input raster")
+    parser.add_argument('polygons', nargs='?', default='data/aoi.shp', help="Path to the polygon shapefile")
+    parser.add_argument('output', nargs='?', default='data/processed/clip_raster_output.tif',
+                        help="Path to save the clipped raster, or the chip directory with --per-feature")
+    parser.add_argument('--per-feature', action='store_true',
+                        help="Write one chip per feature instead of clipping to the union of all features")
+    parser.add_argument('--id-field', help="Attribute used to name the chips (default: feature position)")
+    parser.add_argument('--index', help="Path to the chip index table, GeoPackage or .csv "
+                                        "(default: chips_index.gpkg in the chip directory)")
+    parser.add_argument('--threads', type=int, help="Number of worker threads (default: number of CPU cores)")
+    parser.add_argument('--mask-cache', help="Directory for caching AOI masks across runs (union clip only)")
+    args = parser.parse_args()
 
-    # Perform the raster clipping
-    clip_raster_with_polygon(raster_file, polygon_file, output_file)
+    if args.per_feature:
+        # Write one chip per feature
+        clip_raster_by_features(args.raster, args.polygons, args.output, id_field=args.id_field,
+                                index_file=args.index, num_workers=args.threads)
+    else:
+        # Perform the raster clipping
+        clip_raster_with_polygon(args.raster, args.polygons, args.output, mask_cache_dir=args.mask_cache)
 
 if __name__ == "__main__":
     main()
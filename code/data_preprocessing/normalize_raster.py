@@ -1,92 +1,346 @@
+import argparse
 import rasterio
 import numpy as np
 import logging
 
+import analysis_tools_path
+from calculate_slope import generate_windows
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def calculate_normalized_values(data, valid_mask):
+# Processing window size (pixels) and internal tile size of the output GeoTIFF
+DEFAULT_BLOCK_SIZE = 1024
+OUTPUT_TILE_SIZE = 256
+
+# Number of histogram bins used to locate clip percentiles of floating point bands
+DEFAULT_HISTOGRAM_BINS = 4096
+
+# Default lower and upper percentiles for the robust percentile stretch
+DEFAULT_CLIP_PERCENTILES = (2, 98)
+
+# Output data types. Integer outputs store round(value * levels), reserve the
+# largest representable value for nodata and record 1 / levels as the band scale.
+OUTPUT_DTYPES = ("float32", "uint8", "uint16")
+
+def valid_mask(data, nodata):
     """
-    Normalize raster data to the range [0, 1].
+    Build a mask of the valid (not nodata and finite) cells of a block.
+
+    Parameters:
+        data (ndarray): Block of raster values.
+        nodata (float): Nodata value of the band, or None.
+
+    Returns:
+        ndarray: Boolean mask that is True for valid cells.
+    """
+    mask = np.isfinite(data) if data.dtype.kind == 'f' else np.ones(data.shape, dtype=bool)
+    if nodata is not None:
+        mask &= data != nodata
+    return mask
+
+def histogram_layout(dtype, bins, low=None, high=None):
+    """
+    Choose the histogram range and bin count for a band.
+
+    Integer bands of up to 16 bits get one bin per representable value, so the
+    histogram can be gathered in the same pass as min and max and its
+    percentiles are exact. Other bands need their value range first.
+
+    Parameters:
+        dtype (str): Data type of the band.
+        bins (int): Number of bins for bands without a per-value layout.
+        low (float): Minimum valid value of the band (required for non per-value layouts).
+        high (float): Maximum valid value of the band (required for non per-value layouts).
+
+    Returns:
+        tuple: (low edge, high edge, number of bins, whether each bin holds a single value).
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu' and dtype.itemsize <= 2:
+        info = np.iinfo(dtype)
+        return info.min - 0.5, info.max + 0.5, int(info.max) - int(info.min) + 1, True
+    return low, high, bins, False
+
+def accumulate_histogram(histogram, values, layout):
+    """
+    Add the values of one block to a band histogram, in place.
+
+    Parameters:
+        histogram (ndarray): Histogram counts to update.
+        values (ndarray): Valid values of the block.
+        layout (tuple): Histogram layout from histogram_layout.
+    """
+    low, high, bins, _ = layout
+    if high <= low:
+        histogram[0] += values.size
+        return
+    indices = ((values.astype(np.float64) - low) * (bins / (high - low))).astype(np.int64)
+    np.clip(indices, 0, bins - 1, out=indices)
+    histogram += np.bincount(indices, minlength=bins)
+
+def histogram_percentile(histogram, layout, percentile):
+    """
+    Locate a percentile in a band histogram.
+
+    Values are assumed to be spread evenly within a bin, so the result is
+    accurate to one bin width; per-value histograms return the exact value.
+
+    Parameters:
+        histogram (ndarray): Histogram counts.
+        layout (tuple): Histogram layout from histogram_layout.
+        percentile (float): Percentile in [0, 100].
+
+    Returns:
+        float: Value at the percentile.
+    """
+    low, high, bins, per_value = layout
+    cumulative = np.cumsum(histogram)
+    rank = percentile / 100 * (cumulative[-1] - 1)
+    index = min(int(np.searchsorted(cumulative, rank, side='right')), bins - 1)
+    width = (high - low) / bins
+    if per_value:
+        return low + width * (index + 0.5)
+    before = cumulative[index - 1] if index > 0 else 0
+    return low + width * (index + (rank - before + 0.5) / histogram[index])
+
+def calculate_normalized_values(data, valid_mask, min_value, max_value, out=None):
+    """
+    Scale raster data from [min_value, max_value] to the range [0, 1].
+
+    Values outside the range (e.g. beyond the clip percentiles) are clipped to 0 or 1.
 
     Parameters:
         data (ndarray): The raster data to normalize.
         valid_mask (ndarray): A boolean mask indicating valid data points.
+        min_value (float): Value mapped to 0.
+        max_value (float): Value mapped to 1.
+        out (ndarray): Float32 array to write the result into (optional).
 
     Returns:
-        ndarray: The normalized raster data.
+        ndarray: The normalized raster data, zero where the mask is False.
     """
-    try:
-        # Calculate min and max of valid data
-        min_value = np.min(data[valid_mask])
-        max_value = np.max(data[valid_mask])
+    if out is None:
+        out = np.empty(data.shape, dtype=np.float32)
+    np.subtract(data, min_value, out=out, casting='unsafe')
+    if max_value > min_value:
+        out *= np.float32(1 / (max_value - min_value))
+    else:
+        out.fill(0)
+    np.clip(out, 0, 1, out=out)
+    out[~valid_mask] = 0
+    return out
+
+def quantization_levels(output_dtype):
+    """
+    Return the number of steps that span [0, 1] in a quantized output type.
 
-        logging.info(f"Normalizing raster: Min value = {min_value}, Max value = {max_value}")
+    Parameters:
+        output_dtype (str): 'uint8' or 'uint16'.
 
-        # Normalize data
-        normalized_data = np.zeros_like(data, dtype=np.float32)
-        normalized_data[valid_mask] = (data[valid_mask] - min_value) / (max_value - min_value)
+    Returns:
+        int: Largest stored value for a normalized value of 1.
+    """
+    return int(np.iinfo(output_dtype).max) - 1
 
-        return normalized_data
-    except Exception as e:
-        logging.error(f"Error during normalization: {e}")
-        raise
+def gather_band_ranges(src, method, percentiles, bins, block_size):
+    """
+    Determine the value range mapped to [0, 1] for every band of a raster.
+
+    Min and max, and per-value histograms for integer bands of up to 16 bits,
+    come from a single windowed pass over all bands. Floating point bands need
+    an additional histogram pass for the percentile stretch.
 
-def normalize_raster(raster_file, output_file):
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        method (str): 'minmax' or 'percentile'.
+        percentiles (tuple): Lower and upper clip percentiles for the percentile stretch.
+        bins (int): Number of histogram bins for floating point bands.
+        block_size (int): Size of the processing windows in pixels.
+
+    Returns:
+        dict: Mapping of band index to (min value, max value), or None for bands without valid data.
+    """
+    bands = list(range(1, src.count + 1))
+    minimums = {band: np.inf for band in bands}
+    maximums = {band: -np.inf for band in bands}
+    layouts = {}
+    histograms = {}
+    if method == "percentile":
+        for band in bands:
+            layout = histogram_layout(src.dtypes[band - 1], bins)
+            if layout[3]:
+                layouts[band] = layout
+                histograms[band] = np.zeros(layout[2], dtype=np.int64)
+
+    logging.info(f"Gathering value ranges for {src.count} band(s).")
+    for window in generate_windows(src.width, src.height, block_size):
+        data = src.read(window=window)
+        for band in bands:
+            block = data[band - 1]
+            values = block[valid_mask(block, src.nodatavals[band - 1])]
+            if values.size == 0:
+                continue
+            minimums[band] = min(minimums[band], values.min())
+            maximums[band] = max(maximums[band], values.max())
+            if band in histograms:
+                accumulate_histogram(histograms[band], values, layouts[band])
+
+    ranges = {}
+    for band in bands:
+        if minimums[band] > maximums[band]:
+            logging.warning(f"Band {band} contains only nodata values.")
+            ranges[band] = None
+        else:
+            ranges[band] = (float(minimums[band]), float(maximums[band]))
+    if method == "minmax":
+        return ranges
+
+    remaining = [band for band in bands if band not in histograms and ranges[band] is not None]
+    if remaining:
+        logging.info(f"Calculating histograms for {len(remaining)} floating point band(s).")
+        for band in remaining:
+            layouts[band] = histogram_layout(src.dtypes[band - 1], bins, *ranges[band])
+            histograms[band] = np.zeros(bins, dtype=np.int64)
+        for window in generate_windows(src.width, src.height, block_size):
+            data = src.read(remaining, window=window)
+            for block, band in zip(data, remaining):
+                values = block[valid_mask(block, src.nodatavals[band - 1])]
+                accumulate_histogram(histograms[band], values, layouts[band])
+
+    for band in bands:
+        if ranges[band] is not None:
+            ranges[band] = tuple(
+                float(histogram_percentile(histograms[band], layouts[band], percentile))
+                for percentile in percentiles
+            )
+    return ranges
+
+def normalize_raster(raster_file, output_file, method="minmax", percentiles=DEFAULT_CLIP_PERCENTILES,
+                     bins=DEFAULT_HISTOGRAM_BINS, block_size=DEFAULT_BLOCK_SIZE, output_dtype="float32"):
     """
-    Normalize the values of a raster file to the range [0, 1] and save the result.
+    Normalize the values of every band of a raster file to the range [0, 1] and save the result.
+
+    The raster is streamed window by window: one pass gathers each band's range
+    and a second pass writes the scaled blocks to a tiled float32 GeoTIFF, so
+    memory use is bounded by a few windows rather than the raster size. With
+    method='percentile' the range is taken from the clip percentiles (2-98% by
+    default) and values beyond it are clipped, which keeps a few extreme pixels
+    from compressing the rest of the data into a narrow band.
+
+    With output_dtype 'uint8' or 'uint16' the normalized values are quantized to
+    254 or 65534 steps, with the top value as nodata and the step size written as
+    the band scale, so readers that apply GeoTIFF scale/offset get [0, 1] back
+    from a file 2-4 times smaller.
 
     Parameters:
         raster_file (str): Path to the input raster file.
         output_file (str): Path to save the normalized raster file.
+        method (str): 'minmax' for a min/max stretch or 'percentile' for a percentile clip (default: 'minmax').
+        percentiles (tuple): Lower and upper clip percentiles for method='percentile' (default: (2, 98)).
+        bins (int): Number of histogram bins for floating point bands (default: 4096).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        output_dtype (str): 'float32', 'uint8' or 'uint16' (default: 'float32').
     """
     try:
+        if output_dtype not in OUTPUT_DTYPES:
+            raise ValueError(f"Invalid output data type: {output_dtype}. Choose from {OUTPUT_DTYPES}.")
+        if method not in ("minmax", "percentile"):
+            raise ValueError(f"Invalid normalization method: {method}. Choose 'minmax' or 'percentile'.")
+        if method == "percentile" and not 0 <= percentiles[0] < percentiles[1] <= 100:
+            raise ValueError(f"Invalid clip percentiles: {percentiles}.")
+
         logging.info(f"Opening raster file: {raster_file}")
         with rasterio.open(raster_file) as src:
-            # Read the first band of the raster
-            data = src.read(1)
-
-            # Handle nodata values if present
-            nodata = src.nodata
-            if nodata is not None:
-                logging.info(f"Nodata value detected: {nodata}. Ignoring nodata values during normalization.")
-                valid_mask = data != nodata
-            else:
-                logging.info("No nodata value detected. Normalizing all data.")
-                valid_mask = np.ones_like(data, dtype=bool)
-
-            # Normalize the raster data
-            normalized_data = calculate_normalized_values(data, valid_mask)
+            for band, nodata in enumerate(src.nodatavals, start=1):
+                if nodata is not None:
+                    logging.info(f"Band {band} nodata value detected: {nodata}. "
+                                 f"Ignoring nodata values during normalization.")
 
-            # Replace nodata values with the original nodata value
-            if nodata is not None:
-                normalized_data[~valid_mask] = nodata
+            ranges = gather_band_ranges(src, method, percentiles, bins, block_size)
+            if all(value_range is None for value_range in ranges.values()):
+                raise ValueError("The raster contains only nodata values. Normalization cannot be performed.")
+            for band, value_range in ranges.items():
+                if value_range is not None:
+                    logging.info(f"Normalizing band {band}: Min value = {value_range[0]}, "
+                                 f"Max value = {value_range[1]}")
 
             # Save the normalized raster
             logging.info(f"Saving normalized raster to: {output_file}")
             meta = src.meta.copy()
+            quantized = output_dtype != "float32"
+            if quantized:
+                levels = quantization_levels(output_dtype)
+                meta["nodata"] = levels + 1
             meta.update({
-                "dtype": "float32",
-                "driver": "GTiff"
+                "dtype": output_dtype,
+                "driver": "GTiff",
+                "tiled": True,
+                "blockxsize": OUTPUT_TILE_SIZE,
+                "blockysize": OUTPUT_TILE_SIZE,
+                "BIGTIFF": "IF_SAFER"
             })
 
             with rasterio.open(output_file, 'w', **meta) as dest:
-                dest.write(normalized_data, 1)
+                if quantized:
+                    dest.scales = (1 / levels,) * src.count
+                    dest.offsets = (0.0,) * src.count
+                    encoded_buffer = np.empty(block_size * block_size, dtype=output_dtype)
+                buffer = np.empty(block_size * block_size, dtype=np.float32)
+                for window in generate_windows(src.width, src.height, block_size):
+                    data = src.read(window=window)
+                    size = window.height * window.width
+                    out = buffer[:size].reshape(window.height, window.width)
+                    for band, value_range in ranges.items():
+                        block = data[band - 1]
+                        nodata = src.nodatavals[band - 1]
+                        mask = valid_mask(block, nodata)
+                        if value_range is None:
+                            out.fill(0)
+                        else:
+                            calculate_normalized_values(block, mask, value_range[0], value_range[1], out=out)
+                        if quantized:
+                            out *= levels
+                            np.rint(out, out=out)
+                            encoded = encoded_buffer[:size].reshape(window.height, window.width)
+                            encoded[...] = out
+                            encoded[~mask] = levels + 1
+                            dest.write(encoded, band, window=window)
+                            continue
+                        # Replace nodata values with the original nodata value
+                        if nodata is not None:
+                            out[~mask] = nodata
+                        dest.write(out, band, window=window)
 
         logging.info("Normalization and saving completed successfully.")
 
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
     except rasterio.errors.RasterioIOError as e:
         logging.error(f"Rasterio error: {e}")
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
 
 def main():
-    # Define input and output file paths
-    raster_file = 'data/raw_raster.tif'
-    output_file = 'data/processed/normalized_raster.tif'
+    parser = argparse.ArgumentParser(description="Normalize every band of a raster to the range [0, 1].")
+    parser.add_argument('--input', default='data/raw_raster.tif', help="Path to the input raster")
+    parser.add_argument('--output', default='data/processed/normalized_raster.tif', help="Path to the output raster")
+    parser.add_argument('--method', choices=("minmax", "percentile"), default="minmax",
+                        help="Min/max stretch or percentile clip (default: minmax)")
+    parser.add_argument('--percentiles', type=float, nargs=2, default=DEFAULT_CLIP_PERCENTILES,
+                        metavar=('LOW', 'HIGH'), help="Clip percentiles for the percentile stretch (default: 2 98)")
+    parser.add_argument('--output-dtype', choices=OUTPUT_DTYPES, default="float32",
+                        help="Output data type; integer types are quantized with a scale (default: float32)")
+    args = parser.parse_args()
 
     # Normalize the raster
-    normalize_raster(raster_file, output_file)
+    normalize_raster(
+        args.input,
+        args.output,
+        method=args.method,
+        percentiles=tuple(args.percentiles),
+        output_dtype=args.output_dtype
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,443 @@
+import os
+import math
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import geopandas as gpd
+import rasterio
+import numpy as np
+import logging
+from pathlib import Path
+from pyproj import CRS
+from rasterio.windows import Window
+from scipy.ndimage import binary_erosion, distance_transform_edt
+from scipy.spatial import cKDTree
+from shapely import STRtree
+
+from rasterize_vector import validate_and_reproject_vector, generate_windows, rasterize_window, DEFAULT_BLOCK_SIZE, \
+    OUTPUT_TILE_SIZE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Value written where no feature lies within the maximum distance
+PROXIMITY_NODATA = -9999.0
+
+# Lower bounds of the metres per degree of latitude and, at the equator, of longitude,
+# used to size the halo of geographic grids
+METRES_PER_DEGREE_LATITUDE = 110574.0
+METRES_PER_DEGREE_LONGITUDE = 111320.0
+
+# Geographic grids: number of nearest feature pixels by straight-line distance that are
+# candidates, and how much further than the closest one a candidate may lie (as a fraction)
+# to have its geodesic distance measured. The ellipsoid reorders near ties only.
+NEAREST_CANDIDATES = 8
+CANDIDATE_TOLERANCE = 0.001
+
+def halo_size(transform, bounds, max_distance, geographic):
+    """
+    Calculate how many pixels around a window can hold a feature within max_distance.
+
+    Parameters:
+        transform (Affine): Affine transformation matrix of the grid.
+        bounds (BoundingBox): Bounds of the grid.
+        max_distance (float): Maximum distance in metres (geographic) or CRS units.
+        geographic (bool): Whether the grid is in a geographic CRS.
+
+    Returns:
+        tuple: (halo rows, halo columns).
+    """
+    if not geographic:
+        return math.ceil(max_distance / abs(transform.e)), math.ceil(max_distance / abs(transform.a))
+
+    # Degrees of longitude shrink towards the poles, so size the halo for the grid edge nearest a pole
+    max_latitude = min(max(abs(bounds.bottom), abs(bounds.top)), 89.0)
+    longitude_metres = max(METRES_PER_DEGREE_LONGITUDE * math.cos(math.radians(max_latitude)), 1.0)
+    return (
+        math.ceil(max_distance / (abs(transform.e) * METRES_PER_DEGREE_LATITUDE)),
+        math.ceil(max_distance / (abs(transform.a) * longitude_metres))
+    )
+
+def expand_window(window, halo, width, height):
+    """
+    Expand a window by a halo, clipped to the grid extent.
+
+    Parameters:
+        window (Window): The window to expand.
+        halo (tuple): (halo rows, halo columns).
+        width (int): Width of the grid in pixels.
+        height (int): Height of the grid in pixels.
+
+    Returns:
+        tuple: (expanded Window, slices selecting the original window inside the expanded one).
+    """
+    halo_rows, halo_cols = halo
+    row_start = max(window.row_off - halo_rows, 0)
+    col_start = max(window.col_off - halo_cols, 0)
+    row_stop = min(window.row_off + window.height + halo_rows, height)
+    col_stop = min(window.col_off + window.width + halo_cols, width)
+    expanded = Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+    inner = (
+        slice(window.row_off - row_start, window.row_off - row_start + window.height),
+        slice(window.col_off - col_start, window.col_off - col_start + window.width)
+    )
+    return expanded, inner
+
+def geocentric_coordinates(lons, lats, geod):
+    """
+    Convert longitudes and latitudes on the ellipsoid surface to Earth-centred Cartesian coordinates.
+
+    Straight-line distances between these points never exceed the geodesic
+    distances and rank them the same way up to near ties, so a k-d tree over
+    them finds nearest neighbours across the whole grid, antimeridian included.
+
+    Parameters:
+        lons, lats (ndarray): Coordinates in degrees.
+        geod (Geod): Ellipsoid of the grid's CRS.
+
+    Returns:
+        ndarray: (n, 3) coordinates in metres.
+    """
+    phi, lam = np.radians(lats), np.radians(lons)
+    sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+    prime_vertical = geod.a / np.sqrt(1 - geod.es * sin_phi ** 2)
+    return np.column_stack([
+        prime_vertical * cos_phi * np.cos(lam),
+        prime_vertical * cos_phi * np.sin(lam),
+        prime_vertical * (1 - geod.es) * sin_phi
+    ])
+
+def burn_features(geometries, tree, transform, window, width, height):
+    """
+    Burn the features into a window and find its feature pixels that border a non-feature pixel.
+
+    The nearest feature pixel of any other pixel is always such a boundary
+    pixel, so only these need to be searched.
+
+    Parameters:
+        geometries (ndarray): Feature geometries in grid CRS.
+        tree (STRtree): Spatial index over the geometries.
+        transform (Affine): Affine transformation matrix of the full grid.
+        window (Window): The window to burn.
+        width (int): Width of the grid in pixels.
+        height (int): Height of the grid in pixels.
+
+    Returns:
+        tuple: (boolean feature mask of the window, grid rows and grid columns of its boundary pixels).
+    """
+    ring, inner = expand_window(window, (1, 1), width, height)
+    burned = rasterize_window(geometries, tree, transform, ring, np.ones((len(geometries), 1)))
+    if burned is None:
+        empty = np.empty(0, dtype=np.int64)
+        return np.zeros((window.height, window.width), dtype=bool), empty, empty
+
+    features = burned[0] > 0
+    # Pixels beyond the grid count as features, so the grid edge is not a boundary
+    interior = binary_erosion(features, structure=np.ones((3, 3), dtype=bool), border_value=1)
+    rows, cols = np.nonzero((features & ~interior)[inner])
+    return features[inner], rows + window.row_off, cols + window.col_off
+
+def feature_index(transform, rows, cols, geod):
+    """
+    Build a k-d tree over the coordinates of feature pixel centres.
+
+    Geographic grids are indexed in geocentric coordinates, projected grids in
+    CRS coordinates.
+
+    Parameters:
+        transform (Affine): Affine transformation matrix of the full grid.
+        rows, cols (ndarray): Grid indices of the feature pixels.
+        geod (Geod): Ellipsoid of the grid's CRS, or None for projected grids.
+
+    Returns:
+        tuple: (cKDTree, pixel centre x or longitudes, pixel centre y or latitudes).
+    """
+    xs, ys = transform * (cols + 0.5, rows + 0.5)
+    points = np.column_stack([xs, ys]) if geod is None else geocentric_coordinates(xs, ys, geod)
+    return cKDTree(points), xs, ys
+
+def planar_proximity(transform, window, features, index):
+    """
+    Calculate the Euclidean distance from every pixel of a window of a projected grid to the nearest feature pixel.
+
+    Parameters:
+        transform (Affine): Affine transformation matrix of the full grid.
+        window (Window): The window to calculate.
+        features (ndarray): Boolean feature mask of the window.
+        index (tuple): Feature index of the whole grid from feature_index.
+
+    Returns:
+        ndarray: float32 distances for the window in CRS units.
+    """
+    distances = np.zeros((window.height, window.width), dtype=np.float32)
+    kdtree = index[0]
+    rows, cols = np.nonzero(~features)
+    if kdtree.n == 0:
+        distances[rows, cols] = PROXIMITY_NODATA
+        return distances
+
+    xs, ys = transform * (cols + window.col_off + 0.5, rows + window.row_off + 0.5)
+    distances[rows, cols], _ = kdtree.query(np.column_stack([xs, ys]))
+    return distances
+
+def geodesic_proximity(transform, window, features, index, max_distance, geod):
+    """
+    Calculate the geodesic distance from every pixel of a window to the nearest feature pixel.
+
+    The k-d tree proposes the NEAREST_CANDIDATES closest feature pixels by
+    straight-line distance; those within CANDIDATE_TOLERANCE of the closest are
+    measured on the ellipsoid and the shortest geodesic distance is kept. Only
+    when more candidates than that tie within the tolerance can the nearest be
+    missed, and the distance is then too long by at most about the tolerance.
+
+    Parameters:
+        transform (Affine): Affine transformation matrix of the full grid.
+        window (Window): The window to calculate.
+        features (ndarray): Boolean feature mask of the window.
+        index (tuple): Feature index from feature_index.
+        max_distance (float): Maximum distance in metres, or None for no limit.
+        geod (Geod): Ellipsoid of the grid's CRS.
+
+    Returns:
+        ndarray: float32 distances for the window, PROXIMITY_NODATA beyond max_distance.
+    """
+    distances = np.full((window.height, window.width), PROXIMITY_NODATA, dtype=np.float32)
+    distances[features] = 0
+    kdtree, feature_lons, feature_lats = index
+    if kdtree.n == 0:
+        return distances
+
+    rows, cols = np.nonzero(~features)
+    lons, lats = transform * (cols + window.col_off + 0.5, rows + window.row_off + 0.5)
+    # A straight line is never longer than the geodesic, so max_distance also bounds the search
+    bound = np.inf if max_distance is None else max_distance * (1 + 1e-9)
+    chords, candidates = kdtree.query(geocentric_coordinates(lons, lats, geod),
+                                      k=min(NEAREST_CANDIDATES, kdtree.n), distance_upper_bound=bound)
+    chords, candidates = chords.reshape(len(rows), -1), candidates.reshape(len(rows), -1)
+
+    measured = np.isfinite(chords) & (chords <= chords[:, :1] * (1 + CANDIDATE_TOLERANCE))
+    points, _ = np.nonzero(measured)
+    targets = candidates[measured]
+    geodesic = np.full(chords.shape, np.inf)
+    _, _, geodesic[measured] = geod.inv(lons[points], lats[points], feature_lons[targets], feature_lats[targets])
+    nearest = geodesic.min(axis=1)
+
+    if max_distance is not None:
+        nearest[nearest > max_distance] = np.inf
+    distances[rows, cols] = np.where(np.isfinite(nearest), nearest, PROXIMITY_NODATA)
+    return distances
+
+def proximity_window(transform, window, expanded, inner, geometries, tree, max_distance):
+    """
+    Calculate the distance from every pixel of a window of a projected grid to the nearest feature pixel.
+
+    The features are burned into the expanded window and an exact Euclidean
+    distance transform is run over it; the halo guarantees that every feature
+    within max_distance of the window is part of it.
+
+    Parameters:
+        transform (Affine): Affine transformation matrix of the full grid.
+        window (Window): The window to calculate.
+        expanded (Window): The window plus its halo.
+        inner (tuple): Slices selecting the window inside the expanded window.
+        geometries (ndarray): Feature geometries in grid CRS.
+        tree (STRtree): Spatial index over the geometries.
+        max_distance (float): Maximum distance, or None for no limit.
+
+    Returns:
+        ndarray: float32 distances for the window, PROXIMITY_NODATA beyond max_distance.
+    """
+    burned = rasterize_window(geometries, tree, transform, expanded, np.ones((len(geometries), 1)))
+    if burned is None or not burned.any():
+        return np.full((window.height, window.width), PROXIMITY_NODATA, dtype=np.float32)
+
+    background = burned[0] == 0
+    distances = distance_transform_edt(background, sampling=(abs(transform.e), abs(transform.a)))[inner]
+    distances = distances.astype(np.float32)
+    if max_distance is not None:
+        distances[distances > max_distance] = PROXIMITY_NODATA
+    return distances
+
+def process_window(dst, window, halo, geometries, tree, max_distance, geod, index, write_lock):
+    """
+    Calculate proximity for a single window and write it to the output raster.
+
+    Parameters:
+        dst (DatasetWriter): Opened output dataset.
+        window (Window): The window to process.
+        halo (tuple): (halo rows, halo columns).
+        geometries (ndarray): Feature geometries in grid CRS.
+        tree (STRtree): Spatial index over the geometries.
+        max_distance (float): Maximum distance, or None for no limit.
+        geod (Geod): Ellipsoid for geographic grids, or None for projected grids.
+        index (tuple): Feature index of the whole grid (without max_distance), or None.
+        write_lock (Lock): Lock guarding writes to the output dataset.
+    """
+    expanded, inner = expand_window(window, halo, dst.width, dst.height)
+    if geod is None and index is None:
+        distances = proximity_window(dst.transform, window, expanded, inner, geometries, tree, max_distance)
+    else:
+        features, rows, cols = burn_features(geometries, tree, dst.transform, expanded, dst.width, dst.height)
+        if geod is None:
+            distances = planar_proximity(dst.transform, window, features[inner], index)
+        else:
+            if index is None:
+                # Index only the feature pixels within the halo of this window
+                index = feature_index(dst.transform, rows, cols, geod)
+            distances = geodesic_proximity(dst.transform, window, features[inner], index, max_distance, geod)
+    with write_lock:
+        dst.write(distances, 1, window=window)
+
+def index_grid_features(geometries, tree, transform, width, height, block_size, geod, num_workers):
+    """
+    Index the boundary feature pixels of the whole grid, burning it window by window.
+
+    Parameters:
+        geometries (ndarray): Feature geometries in grid CRS.
+        tree (STRtree): Spatial index over the geometries.
+        transform (Affine): Affine transformation matrix of the grid.
+        width (int): Width of the grid in pixels.
+        height (int): Height of the grid in pixels.
+        block_size (int): Size of the processing windows in pixels.
+        geod (Geod): Ellipsoid of the grid's CRS, or None for projected grids.
+        num_workers (int): Number of worker threads.
+
+    Returns:
+        tuple: Feature index from feature_index.
+    """
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        results = list(executor.map(
+            lambda window: burn_features(geometries, tree, transform, window, width, height)[1:],
+            generate_windows(width, height, block_size)
+        ))
+    rows = np.concatenate([window_rows for window_rows, _ in results])
+    cols = np.concatenate([window_cols for _, window_cols in results])
+    logging.info(f"Indexed {len(rows)} feature boundary pixels.")
+    return feature_index(transform, rows, cols, geod)
+
+def create_proximity_raster(vector_file, raster_file, output_raster, max_distance=None,
+                            block_size=DEFAULT_BLOCK_SIZE, num_workers=None):
+    """
+    Calculate the distance from every pixel of a reference grid to the nearest vector feature.
+
+    The features are burned once per window onto the grid of the reference
+    raster (as rasterize_vector does, all touched pixels) and distances are
+    measured between pixel centres, 0 on feature pixels. Windows are processed
+    in a thread pool. With max_distance each window gets a halo of that
+    distance, so memory use is bounded by the block size plus halo. Without it
+    the boundary feature pixels of the whole grid are indexed once in a k-d
+    tree, so memory use grows with the feature boundaries, not with the grid.
+
+    Projected grids give exact Euclidean distances in CRS units, from a
+    distance transform of the haloed window or from the k-d tree. Geographic
+    grids give geodesic distances in metres (max_distance is in metres too): the
+    nearest feature pixel is searched among the boundary feature pixels of the
+    halo or of the whole grid with a k-d tree in Earth-centred coordinates, and
+    near ties are settled on the ellipsoid (see geodesic_proximity).
+
+    Parameters:
+        vector_file (str): Path to the input vector file (e.g., shapefile or GeoJSON).
+        raster_file (str): Path to the reference raster file for specifications.
+        output_raster (str): Path to save the float32 distance raster.
+        max_distance (float): Distances beyond this are written as nodata (default: no limit).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
+    """
+    try:
+        if max_distance is not None and max_distance <= 0:
+            raise ValueError("The maximum distance must be positive.")
+
+        num_workers = num_workers or os.cpu_count() or 1
+
+        logging.info(f"Loading vector data from: {vector_file}")
+        gdf = gpd.read_file(vector_file)
+
+        # Load reference raster for specs
+        logging.info(f"Loading reference raster: {raster_file}")
+        with rasterio.open(raster_file) as src:
+            width, height = src.width, src.height
+            transform = src.transform
+            crs = src.crs
+            bounds = src.bounds
+
+        # Validate and reproject vector data CRS
+        gdf = validate_and_reproject_vector(gdf, crs)
+        gdf = gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)]
+        if gdf.empty:
+            raise ValueError("The vector data has no features to measure distances to.")
+        geometries = np.asarray(gdf.geometry.values, dtype=object)
+        tree = STRtree(geometries)
+
+        geographic = crs is not None and crs.is_geographic
+        geod = CRS.from_wkt(crs.to_wkt()).get_geod() if geographic else None
+        windows = list(generate_windows(width, height, block_size))
+        index = None
+        if max_distance is None:
+            halo = (0, 0)
+            index = index_grid_features(geometries, tree, transform, width, height, block_size, geod, num_workers)
+        else:
+            halo = halo_size(transform, bounds, max_distance, geographic)
+
+        # Ensure output directory exists
+        output_dir = Path(output_raster).parent
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        logging.info(f"Saving proximity raster to: {output_raster}")
+        with rasterio.open(
+            output_raster,
+            'w',
+            driver='GTiff',
+            count=1,
+            dtype='float32',
+            crs=crs,
+            transform=transform,
+            width=width,
+            height=height,
+            nodata=PROXIMITY_NODATA,
+            tiled=True,
+            blockxsize=OUTPUT_TILE_SIZE,
+            blockysize=OUTPUT_TILE_SIZE,
+            compress='deflate',
+            BIGTIFF='IF_SAFER'
+        ) as dest:
+            logging.info(f"Calculating distances to {len(geometries)} features over {len(windows)} windows "
+                         f"with a halo of {halo[0]}x{halo[1]} pixels using {num_workers} worker threads.")
+
+            write_lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = [
+                    executor.submit(process_window, dest, window, halo, geometries, tree, max_distance, geod,
+                                    index, write_lock)
+                    for window in windows
+                ]
+                # Surface the first error raised by any worker
+                for future in futures:
+                    future.result()
+
+        logging.info("Proximity raster completed successfully.")
+
+    except FileNotFoundError as e:
+        logging.error(f"File not found: {e}")
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during the proximity calculation: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculate the distance from every pixel to the nearest feature.")
+    parser.add_argument('vector', nargs='?', default='data/vector_data.shp', help="Path to the input vector file")
+    parser.add_argument('output', nargs='?', default='data/processed/proximity.tif',
+                        help="Path to save the distance raster")
+    parser.add_argument('--reference', default='data/raw_raster.tif',
+                        help="Reference raster defining the output grid (default: data/raw_raster.tif)")
+    parser.add_argument('--max-distance', type=float,
+                        help="Maximum distance to calculate, in metres for geographic grids (default: no limit)")
+    parser.add_argument('--threads', type=int, help="Number of worker threads (default: number of CPU cores)")
+    args = parser.parse_args()
+
+    # Calculate the proximity raster
+    create_proximity_raster(args.vector, args.reference, args.output, max_distance=args.max_distance,
+                            num_workers=args.threads)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,36 @@
+import os
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import geopandas as gpd
 import rasterio
-from rasterio.features import rasterize
+import shapely
+from rasterio.features import rasterize, MergeAlg
+from rasterio.windows import bounds as window_bounds
+from shapely import STRtree
 import numpy as np
 import logging
 from pathlib import Path
 
+import analysis_tools_path
+from calculate_slope import generate_windows
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Processing window size (pixels) for tiled rasterization
+DEFAULT_BLOCK_SIZE = 1024
+
+# Internal tile size of the GeoTIFF output
+OUTPUT_TILE_SIZE = 256
+
+# How values of overlapping geometries combine: the last geometry wins, values are summed,
+# or the largest value wins
+MERGE_ALGORITHMS = ("replace", "add", "max")
+
+# Output data types tried, smallest first, when none is given
+OUTPUT_DTYPES = ("uint8", "uint16", "int16", "uint32", "int32", "int64", "uint64", "float32", "float64")
+
 def validate_and_reproject_vector(gdf, target_crs):
     """
     Validate and reproject a GeoDataFrame to match the target CRS.
@@ -52,32 +75,197 @@ def rasterize_vector(vector_gdf, transform, out_shape, dtype=np.uint8, invert=Fa
         logging.error(f"Error during rasterization: {e}")
         raise
 
-def rasterize_vector_to_raster(vector_file, raster_file, output_raster):
+def load_burn_values(gdf, attributes=None):
+    """
+    Collect the values to burn for every geometry and output band.
+
+    Parameters:
+        gdf (GeoDataFrame): Input vector data.
+        attributes (list): Attribute columns to burn, one band each (default: burn 1 into one band).
+
+    Returns:
+        ndarray: float64 values of shape (geometries, bands); NaN where a geometry has no value.
+
+    Raises:
+        ValueError: If an attribute is missing or not numeric.
+    """
+    if not attributes:
+        return np.ones((len(gdf), 1))
+
+    columns = []
+    for attribute in attributes:
+        if attribute not in gdf.columns:
+            raise ValueError(f"Attribute '{attribute}' does not exist in the vector data.")
+        if not np.issubdtype(gdf[attribute].dtype, np.number):
+            raise ValueError(f"Attribute '{attribute}' is not numeric.")
+        columns.append(gdf[attribute].to_numpy(dtype=np.float64, na_value=np.nan))
+    return np.column_stack(columns)
+
+def select_output_dtype(values, merge="replace"):
+    """
+    Choose the smallest output data type that holds every burned value and the fill value 0 exactly.
+
+    For 'add' the range is bounded by the sum of all positive and of all
+    negative values of a band, which holds whatever the overlaps are. Integer
+    types need integral values inside their range; float32 is chosen only if
+    every value and both bounds survive the round trip unchanged.
+
+    Parameters:
+        values (ndarray): Burn values of shape (geometries, bands).
+        merge (str): One of MERGE_ALGORITHMS.
+
+    Returns:
+        str: The first of OUTPUT_DTYPES that fits all bands.
+    """
+    finite = np.where(np.isnan(values), 0, values)
+    if merge == "add":
+        low = np.minimum(finite, 0).sum(axis=0).min(initial=0)
+        high = np.maximum(finite, 0).sum(axis=0).max(initial=0)
+    else:
+        low = min(finite.min(initial=0), 0)
+        high = max(finite.max(initial=0), 0)
+    integral = np.array_equal(finite, np.round(finite))
+    checked = np.append(finite.ravel(), [low, high])
+
+    for dtype in OUTPUT_DTYPES:
+        if np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            # float(info.max) + 1 is exact for every integer type, including the 64-bit ones
+            if integral and info.min <= low and high < float(info.max) + 1:
+                return dtype
+        else:
+            with np.errstate(over='ignore'):
+                if np.array_equal(checked.astype(dtype), checked):
+                    return dtype
+    return OUTPUT_DTYPES[-1]
+
+def rasterize_window(geometries, tree, transform, window, values, merge="replace", dtype=np.uint8):
+    """
+    Burn the geometries intersecting a window, one band per column of values.
+
+    Geometries are clipped to the window plus a one-pixel margin before burning,
+    so a large polygon costs only its vertices near the window. The margin keeps
+    all_touched results at the window edges identical to a full-grid burn.
+    'max' is a replace burn with the geometries in ascending value order, so the
+    largest value is burned last.
+
+    Parameters:
+        geometries (ndarray): Geometries in raster CRS.
+        tree (STRtree): Spatial index over the geometries.
+        transform (Affine): Affine transformation matrix of the full output raster.
+        window (Window): The window to rasterize.
+        values (ndarray): Burn values of shape (geometries, bands); NaN values are not burned.
+        merge (str): One of MERGE_ALGORITHMS (default: 'replace').
+        dtype (numpy dtype): Data type of the output.
+
+    Returns:
+        ndarray: Burned values of shape (bands, rows, cols), or None if no geometry intersects the window.
+    """
+    window_transform = rasterio.windows.transform(window, transform)
+    left, bottom, right, top = window_bounds(window, transform)
+    # In layer order, so with 'replace' the last geometry wins as in a full-grid burn
+    candidates = np.sort(tree.query(shapely.box(left, bottom, right, top)))
+    if len(candidates) == 0:
+        return None
+
+    margin_x, margin_y = abs(transform.a), abs(transform.e)
+    clipped = shapely.clip_by_rect(
+        geometries[candidates], left - margin_x, bottom - margin_y, right + margin_x, top + margin_y
+    )
+    keep = ~shapely.is_empty(clipped)
+    if not keep.any():
+        return None
+    clipped, candidates = clipped[keep], candidates[keep]
+
+    merge_alg = MergeAlg.add if merge == "add" else MergeAlg.replace
+    burned = np.zeros((values.shape[1], window.height, window.width), dtype=dtype)
+    for band in range(values.shape[1]):
+        band_values = values[candidates, band]
+        order = np.flatnonzero(~np.isnan(band_values))
+        if merge == "max":
+            order = order[np.argsort(band_values[order], kind='stable')]
+        if order.size == 0:
+            continue
+        rasterize(
+            zip(clipped[order], band_values[order]),
+            out=burned[band],
+            transform=window_transform,
+            all_touched=True,
+            merge_alg=merge_alg
+        )
+    return burned
+
+def process_window(dst, window, geometries, tree, values, merge, write_lock):
+    """
+    Rasterize a single window and write it to the output raster.
+
+    Windows without geometries are not written; the tiled output reads them as 0.
+
+    Parameters:
+        dst (DatasetWriter): Opened output dataset.
+        window (Window): The window to process.
+        geometries (ndarray): Geometries in raster CRS.
+        tree (STRtree): Spatial index over the geometries.
+        values (ndarray): Burn values of shape (geometries, bands).
+        merge (str): One of MERGE_ALGORITHMS.
+        write_lock (Lock): Lock guarding writes to the output dataset.
+    """
+    burned = rasterize_window(geometries, tree, dst.transform, window, values, merge, dst.dtypes[0])
+    if burned is None:
+        return
+    with write_lock:
+        dst.write(burned, window=window)
+
+def rasterize_vector_to_raster(vector_file, raster_file, output_raster, attributes=None, merge="replace",
+                               dtype=None, block_size=DEFAULT_BLOCK_SIZE, num_workers=None):
     """
     Rasterize vector data using the specifications of an input raster and save the output.
 
+    The output grid is split into windows that are burned in a thread pool and
+    written to a tiled GeoTIFF as they finish, so memory use is bounded by the
+    block size and number of workers rather than the size of the grid. An
+    STRtree selects the geometries intersecting each window.
+
+    Without attributes every geometry burns 1 into a single band; with merge='add'
+    that counts the geometries covering each pixel. With attributes, each
+    attribute is burned into its own band in the same pass. Unless a dtype is
+    given, the smallest type holding every possible output value is used.
+
     Parameters:
         vector_file (str): Path to the input vector file (e.g., shapefile or GeoJSON).
         raster_file (str): Path to the reference raster file for specifications.
         output_raster (str): Path to save the rasterized output.
+        attributes (list): Numeric attribute columns to burn, one band each (default: burn 1).
+        merge (str): How overlapping geometries combine, one of MERGE_ALGORITHMS (default: 'replace').
+        dtype (str): Output data type (default: the smallest type that fits the values).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
+        num_workers (int): Number of worker threads (default: number of CPU cores).
     """
     try:
+        if merge not in MERGE_ALGORITHMS:
+            raise ValueError(f"Invalid merge algorithm: {merge}. Choose from {MERGE_ALGORITHMS}.")
+
+        num_workers = num_workers or os.cpu_count() or 1
+
         logging.info(f"Loading vector data from: {vector_file}")
         gdf = gpd.read_file(vector_file)
 
         # Load reference raster for specs
         logging.info(f"Loading reference raster: {raster_file}")
         with rasterio.open(raster_file) as src:
-            out_shape = (src.height, src.width)
+            width, height = src.width, src.height
             transform = src.transform
             crs = src.crs
-            dtype = np.uint8
 
         # Validate and reproject vector data CRS
         gdf = validate_and_reproject_vector(gdf, crs)
+        gdf = gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)]
+        geometries = np.asarray(gdf.geometry.values, dtype=object)
+        tree = STRtree(geometries)
 
-        # Rasterize vector data
-        rasterized_data = rasterize_vector(gdf, transform, out_shape, dtype=dtype)
+        values = load_burn_values(gdf, attributes)
+        dtype = dtype or select_output_dtype(values, merge)
+        logging.info(f"Burning {values.shape[1]} band(s) with the '{merge}' merge into {dtype}.")
 
         # Ensure output directory exists
         output_dir = Path(output_raster).parent
@@ -89,14 +277,34 @@ def rasterize_vector_to_raster(vector_file, raster_file, output_raster):
             output_raster,
             'w',
             driver='GTiff',
-            count=1,
+            count=values.shape[1],
             dtype=dtype,
             crs=crs,
             transform=transform,
-            width=out_shape[1],
-            height=out_shape[0]
+            width=width,
+            height=height,
+            tiled=True,
+            blockxsize=OUTPUT_TILE_SIZE,
+            blockysize=OUTPUT_TILE_SIZE,
+            compress='deflate',
+            BIGTIFF='IF_SAFER'
         ) as dest:
-            dest.write(rasterized_data, 1)
+            if attributes:
+                dest.descriptions = tuple(attributes)
+
+            windows = list(generate_windows(width, height, block_size))
+            logging.info(f"Rasterizing {len(geometries)} geometries over {len(windows)} windows "
+                         f"using {num_workers} worker threads.")
+
+            write_lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = [
+                    executor.submit(process_window, dest, window, geometries, tree, values, merge, write_lock)
+                    for window in windows
+                ]
+                # Surface the first error raised by any worker
+                for future in futures:
+                    future.result()
 
         logging.info("Rasterization completed successfully.")
 
@@ -108,13 +316,24 @@ def rasterize_vector_to_raster(vector_file, raster_file, output_raster):
         logging.error(f"An unexpected error occurred during rasterization: {e}")
 
 def main():
-    # File paths
-    vector_file = 'data/vector_data.shp'
-    raster_file = 'data/raw_raster.tif'
-    output_raster = 'data/processed/rasterized_output.tif'
+    parser = argparse.ArgumentParser(description="Rasterize vector data onto the grid of a reference raster.")
+    parser.add_argument('vector', nargs='?', default='data/vector_data.shp', help="Path to the input vector file")
+    parser.add_argument('output', nargs='?', default='data/processed/rasterized_output.tif',
+                        help="Path to save the rasterized output")
+    parser.add_argument('--reference', default='data/raw_raster.tif',
+                        help="Reference raster defining the output grid (default: data/raw_raster.tif)")
+    parser.add_argument('--attributes', nargs='*',
+                        help="Numeric attributes to burn, one band each (default: burn 1 into one band)")
+    parser.add_argument('--merge', choices=MERGE_ALGORITHMS, default="replace",
+                        help="How overlapping geometries combine (default: replace)")
+    parser.add_argument('--dtype', choices=OUTPUT_DTYPES,
+                        help="Output data type (default: the smallest type that fits the values)")
+    parser.add_argument('--threads', type=int, help="Number of worker threads (default: number of CPU cores)")
+    args = parser.parse_args()
 
     # Rasterize vector data
-    rasterize_vector_to_raster(vector_file, raster_file, output_raster)
+    rasterize_vector_to_raster(args.vector, args.reference, args.output, attributes=args.attributes,
+                               merge=args.merge, dtype=args.dtype, num_workers=args.threads)
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,29 @@
+import os
+import shutil
+import argparse
+import numpy as np
 import rasterio
+import rasterio.shutil
 import logging
 from pathlib import Path
 
+import analysis_tools_path
+from calculate_slope import generate_windows
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Processing window size (pixels) for block-by-block copies
+DEFAULT_BLOCK_SIZE = 1024
+
+# Internal tile size of Cloud-Optimized GeoTIFF outputs
+COG_TILE_SIZE = 256
+
+# Compression methods for Cloud-Optimized GeoTIFF outputs. LERC is lossless
+# unless a max_z_error is given; the others use a horizontal (integer) or
+# floating point predictor.
+COG_COMPRESSIONS = ("DEFLATE", "ZSTD", "LERC", "LERC_DEFLATE", "LERC_ZSTD", "LZW", "NONE")
+
 def validate_raster(src):
     """
     Validate the input raster to ensure it contains valid data.
@@ -38,13 +57,130 @@ def extract_metadata(src):
         "height": src.height
     }
 
-def convert_raster_to_geotiff(input_raster, output_raster):
+def cog_creation_options(compression="DEFLATE", max_z_error=0, overview_resampling="average"):
+    """
+    Build the COG driver creation options.
+
+    Parameters:
+        compression (str): One of COG_COMPRESSIONS (default: 'DEFLATE').
+        max_z_error (float): Maximum error for LERC compression; 0 is lossless (default: 0).
+        overview_resampling (str): Resampling used to build the overviews (default: 'average').
+
+    Returns:
+        dict: Creation options for the COG driver.
+
+    Raises:
+        ValueError: If the compression method is not supported.
+    """
+    compression = compression.upper()
+    if compression not in COG_COMPRESSIONS:
+        raise ValueError(f"Invalid compression: {compression}. Choose from {COG_COMPRESSIONS}.")
+
+    options = {
+        "COMPRESS": compression,
+        "BLOCKSIZE": COG_TILE_SIZE,
+        "OVERVIEWS": "IGNORE_EXISTING",
+        "OVERVIEW_RESAMPLING": overview_resampling.upper(),
+        "NUM_THREADS": "ALL_CPUS",
+        "BIGTIFF": "IF_SAFER",
+    }
+    if compression.startswith("LERC"):
+        options["MAX_Z_ERROR"] = max_z_error
+    elif compression != "NONE":
+        # YES selects the horizontal predictor for integers and the floating point predictor for floats
+        options["PREDICTOR"] = "YES"
+    return options
+
+def convert_raster_to_cog(src, output_raster, compression="DEFLATE", max_z_error=0, overview_resampling="average"):
+    """
+    Write an opened raster as a Cloud-Optimized GeoTIFF.
+
+    The COG driver copies the source block by block into 256x256 compressed
+    tiles and builds the internal overviews through a temporary file, so memory
+    use stays constant for any raster size. The tiles and overviews give fast
+    windowed and reduced-resolution reads to the other tools and to viewers.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        output_raster (str): Path to save the COG output.
+        compression (str): One of COG_COMPRESSIONS (default: 'DEFLATE').
+        max_z_error (float): Maximum error for LERC compression; 0 is lossless (default: 0).
+        overview_resampling (str): Resampling used to build the overviews (default: 'average').
+    """
+    options = cog_creation_options(compression, max_z_error, overview_resampling)
+    logging.info(f"Writing Cloud-Optimized GeoTIFF with {options['COMPRESS']} compression to: {output_raster}")
+    rasterio.shutil.copy(src, output_raster, driver='COG', **options)
+
+def is_passthrough_compatible(src, cog=False, compression="DEFLATE", max_z_error=0):
+    """
+    Check whether a raster can be copied as-is instead of being re-encoded.
+
+    Any single-file GeoTIFF is a valid plain GeoTIFF output. For COG output the
+    source must already be a COG (GDAL's LAYOUT=COG marker) tiled at
+    COG_TILE_SIZE with internal overviews (unless it fits in a single tile), and
+    encoded exactly as cog_creation_options would encode it: the same
+    compression, predictor and LERC maximum error.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        cog (bool): Whether a Cloud-Optimized GeoTIFF is requested.
+        compression (str): Requested COG compression.
+        max_z_error (float): Requested maximum error for LERC compression.
+
+    Returns:
+        bool: True if the source file can be copied byte for byte.
+    """
+    if src.driver != 'GTiff' or len(src.files) != 1:
+        return False
+    if not cog:
+        return True
+
+    structure = src.tags(ns='IMAGE_STRUCTURE')
+    if structure.get('LAYOUT', '').upper() != 'COG':
+        return False
+
+    compression = compression.upper()
+    source_compression = src.compression.name.upper() if src.compression else "NONE"
+    if source_compression != compression:
+        return False
+
+    # PREDICTOR=YES resolves to the floating point predictor (3) for floats and horizontal (2) otherwise
+    if compression.startswith("LERC") or compression == "NONE":
+        expected_predictor = "1"
+    else:
+        expected_predictor = "3" if np.dtype(src.dtypes[0]).kind == 'f' else "2"
+    if structure.get('PREDICTOR', "1") != expected_predictor:
+        return False
+    if compression.startswith("LERC") and float(structure.get('MAX_Z_ERROR', 0)) != float(max_z_error):
+        return False
+
+    if any(shape != (COG_TILE_SIZE, COG_TILE_SIZE) for shape in src.block_shapes):
+        return False
+    fits_in_tile = src.width <= COG_TILE_SIZE and src.height <= COG_TILE_SIZE
+    return fits_in_tile or all(src.overviews(band) for band in src.indexes)
+
+def convert_raster_to_geotiff(input_raster, output_raster, cog=False, compression="DEFLATE", max_z_error=0,
+                              overview_resampling="average", block_size=DEFAULT_BLOCK_SIZE, passthrough=True):
     """
     Convert an input raster to GeoTIFF format and save the result.
 
+    The raster is copied window by window, so memory use does not grow with the
+    raster size. With cog=True the output is a tiled, compressed
+    Cloud-Optimized GeoTIFF with internal overviews.
+
+    When the input is already a GeoTIFF with a compatible layout (see
+    is_passthrough_compatible) the file is copied as-is, compressed tiles and
+    all, which runs at file-copy speed.
+
     Parameters:
         input_raster (str): Path to the input raster file.
         output_raster (str): Path to save the GeoTIFF output.
+        cog (bool): Write a Cloud-Optimized GeoTIFF (default: False).
+        compression (str): COG compression, one of COG_COMPRESSIONS (default: 'DEFLATE').
+        max_z_error (float): Maximum error for LERC compression; 0 is lossless (default: 0).
+        overview_resampling (str): Resampling used to build COG overviews (default: 'average').
+        block_size (int): Size of the copy windows in pixels (default: 1024).
+        passthrough (bool): Copy compatible GeoTIFFs without re-encoding (default: True).
     """
     try:
         logging.info(f"Opening input raster: {input_raster}")
@@ -56,15 +192,21 @@ def convert_raster_to_geotiff(input_raster, output_raster):
             output_dir = Path(output_raster).parent
             output_dir.mkdir(parents=True, exist_ok=True)
 
-            # Extract metadata for the output raster
-            metadata = extract_metadata(src)
-
-            # Write data to GeoTIFF
-            logging.info(f"Converting raster to GeoTIFF format and saving to: {output_raster}")
-            with rasterio.open(output_raster, 'w', **metadata) as dest:
-                for i in range(1, src.count + 1):  # Iterate over all bands
-                    logging.info(f"Processing band {i} of {src.count}")
-                    dest.write(src.read(i), i)
+            if passthrough and is_passthrough_compatible(src, cog, compression, max_z_error):
+                if os.path.abspath(input_raster) != os.path.abspath(output_raster):
+                    logging.info(f"Input layout is compatible. Copying without re-encoding to: {output_raster}")
+                    shutil.copyfile(input_raster, output_raster)
+            elif cog:
+                convert_raster_to_cog(src, output_raster, compression, max_z_error, overview_resampling)
+            else:
+                # Extract metadata for the output raster
+                metadata = extract_metadata(src)
+
+                # Write data to GeoTIFF
+                logging.info(f"Converting raster to GeoTIFF format and saving to: {output_raster}")
+                with rasterio.open(output_raster, 'w', **metadata) as dest:
+                    for window in generate_windows(src.width, src.height, block_size):
+                        dest.write(src.read(window=window), window=window)
 
         logging.info("Conversion to GeoTIFF completed successfully.")
 
@@ -78,12 +220,30 @@ def convert_raster_to_geotiff(input_raster, output_raster):
         logging.error(f"An unexpected error occurred during conversion: {e}")
 
 def main():
-    # Define file paths
-    input_raster = 'data/raw_raster.xyz'
-    output_raster = 'data/processed/output_raster.tif'
+    parser = argparse.ArgumentParser(description="Convert a raster to GeoTIFF or Cloud-Optimized GeoTIFF.")
+    parser.add_argument('--input', default='data/raw_raster.xyz', help="Path to the input raster")
+    parser.add_argument('--output', default='data/processed/output_raster.tif', help="Path to the output GeoTIFF")
+    parser.add_argument('--cog', action='store_true', help="Write a Cloud-Optimized GeoTIFF")
+    parser.add_argument('--compression', choices=COG_COMPRESSIONS, default="DEFLATE",
+                        help="COG compression (default: DEFLATE)")
+    parser.add_argument('--max-z-error', type=float, default=0,
+                        help="Maximum error for LERC compression; 0 is lossless (default: 0)")
+    parser.add_argument('--overview-resampling', default="average",
+                        help="Resampling used to build COG overviews (default: average)")
+    parser.add_argument('--no-passthrough', action='store_true',
+                        help="Re-encode even when the input GeoTIFF can be copied as-is")
+    args = parser.parse_args()
 
     # Convert raster to GeoTIFF
-    convert_raster_to_geotiff(input_raster, output_raster)
+    convert_raster_to_geotiff(
+        args.input,
+        args.output,
+        cog=args.cog,
+        compression=args.compression,
+        max_z_error=args.max_z_error,
+        overview_resampling=args.overview_resampling,
+        passthrough=not args.no_passthrough
+    )
 
 if __name__ == "__main__":
     main()
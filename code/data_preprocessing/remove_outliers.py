@@ -1,10 +1,33 @@
+import argparse
 import rasterio
+import numpy as np
+import pandas as pd
 import logging
 from pathlib import Path
 
+import analysis_tools_path
+from extract_statistics import merge_moments, select_exact_percentiles
+from normalize_raster import (
+    DEFAULT_BLOCK_SIZE, OUTPUT_TILE_SIZE, accumulate_histogram, generate_windows,
+    histogram_layout, histogram_percentile, valid_mask
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Outlier bounds: iqr uses Q1/Q3 -/+ threshold * IQR, zscore uses mean -/+ threshold * std
+# and mad uses median -/+ threshold * 1.4826 * MAD (the MAD scaled to a normal std)
+OUTLIER_METHODS = ("iqr", "zscore", "mad")
+OUTLIER_ACTIONS = ("nodata", "clamp")
+DEFAULT_THRESHOLD = 1.5
+MAD_SCALE = 1.4826
+
+# Histogram bins per refinement level when selecting exact quantiles of floating point data
+DEFAULT_HISTOGRAM_BINS = 65536
+
+# Rows per chunk when streaming CSV files
+DEFAULT_CSV_CHUNK_ROWS = 500_000
+
 def validate_raster(src):
     """
     Validate the input raster to ensure it contains valid data.
@@ -18,55 +41,311 @@ def validate_raster(src):
     if src.count == 0:
         raise ValueError("The input raster has no bands. Ensure the file contains valid data.")
 
-def extract_metadata(src):
+def histogram_median_absolute_deviation(histogram, layout, median):
+    """
+    Calculate the median absolute deviation from a value histogram.
+
+    Each bin contributes its count at the distance of its centre from the
+    median, so no further pass over the data is needed. The result is exact for
+    per-value histograms and accurate to one bin width otherwise.
+
+    Parameters:
+        histogram (ndarray): Histogram counts.
+        layout (tuple): Histogram layout from histogram_layout.
+        median (float): Median of the values.
+
+    Returns:
+        float: Median absolute deviation.
+    """
+    low, high, bins, _ = layout
+    centres = low + (high - low) / bins * (np.arange(bins) + 0.5)
+    deviations = np.abs(centres - median)
+    order = np.argsort(deviations, kind='stable')
+    cumulative = np.cumsum(histogram[order])
+    index = int(np.searchsorted(cumulative, (cumulative[-1] - 1) / 2, side='right'))
+    return float(deviations[order][min(index, bins - 1)])
+
+def calculate_robust_statistics(iterate_values, statistics, method, bins=DEFAULT_HISTOGRAM_BINS):
+    """
+    Calculate the quantiles the iqr and mad methods need, exactly.
+
+    Per-value histograms of integer data already hold the exact quantiles, so
+    they are read from the histogram. Other data are refined with streaming
+    selection: the quartiles for iqr, and for mad the median and then the median
+    of the absolute deviations from it.
+
+    Parameters:
+        iterate_values (callable): Returns a fresh iterator over 1D arrays of the valid values.
+        statistics (dict): Statistics with count, min, max, histogram and layout.
+        method (str): 'iqr' or 'mad'.
+        bins (int): Number of bins used at each refinement level.
+
+    Returns:
+        dict: q1 and q3 for iqr, median and mad for mad.
+    """
+    histogram, layout = statistics["histogram"], statistics["layout"]
+    per_value = layout is not None and layout[3]
+    low, high, count = statistics["min"], statistics["max"], statistics["count"]
+
+    if method == "iqr":
+        if per_value:
+            return {
+                "q1": histogram_percentile(histogram, layout, 25),
+                "q3": histogram_percentile(histogram, layout, 75),
+            }
+        first, third = select_exact_percentiles(iterate_values, count, [25, 75], low, high, bins)
+        return {"q1": first, "q3": third}
+
+    if per_value:
+        median = histogram_percentile(histogram, layout, 50)
+        return {"median": median, "mad": histogram_median_absolute_deviation(histogram, layout, median)}
+
+    median, = select_exact_percentiles(iterate_values, count, [50], low, high, bins)
+
+    def iterate_deviations():
+        return (np.abs(values.astype(np.float64) - median) for values in iterate_values())
+
+    deviation, = select_exact_percentiles(
+        iterate_deviations, count, [50], 0.0, max(high - median, median - low), bins
+    )
+    return {"median": median, "mad": deviation}
+
+def iterate_band_values(src, band, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Yield the valid values of one band window by window.
+
+    Parameters:
+        src (DatasetReader): Opened raster dataset.
+        band (int): Band index (1-based).
+        block_size (int): Size of the processing windows in pixels.
+
+    Yields:
+        ndarray: 1D array of valid values for each window.
+    """
+    for window in generate_windows(src.width, src.height, block_size):
+        block = src.read(band, window=window)
+        yield block[valid_mask(block, src.nodatavals[band - 1])]
+
+def gather_band_statistics(src, method, bins=DEFAULT_HISTOGRAM_BINS, block_size=DEFAULT_BLOCK_SIZE):
     """
-    Extract metadata from the input raster.
+    Stream over a raster and gather the statistics each band's outlier bounds need.
+
+    The first pass collects count, mean, standard deviation, min and max for all
+    bands, plus exact per-value histograms for integer bands of up to 16 bits.
+    The iqr and mad methods need quantiles, so other bands get further
+    selection passes once their range is known (see calculate_robust_statistics).
 
     Parameters:
         src (DatasetReader): Opened raster dataset.
+        method (str): One of OUTLIER_METHODS.
+        bins (int): Number of histogram bins per refinement level for floating point bands.
+        block_size (int): Size of the processing windows in pixels.
 
     Returns:
-        dict: Metadata for the output raster.
-    """
-    return {
-        "driver": "GTiff",
-        "count": src.count,
-        "dtype": src.dtypes[0],
-        "crs": src.crs,
-        "transform": src.transform,
-        "width": src.width,
-        "height": src.height
+        dict: Mapping of band index to statistics (count, mean, std, min, max and
+            q1 and q3 for iqr, median and mad for mad), or None for bands without valid data.
+    """
+    bands = list(range(1, src.count + 1))
+    accumulators = {
+        band: {"count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf}
+        for band in bands
     }
+    layouts = {}
+    histograms = {}
+    if method != "zscore":
+        for band in bands:
+            layout = histogram_layout(src.dtypes[band - 1], bins)
+            if layout[3]:
+                layouts[band] = layout
+                histograms[band] = np.zeros(layout[2], dtype=np.int64)
+
+    logging.info(f"Gathering statistics for {src.count} band(s).")
+    for window in generate_windows(src.width, src.height, block_size):
+        data = src.read(window=window)
+        for band in bands:
+            block = data[band - 1]
+            values = block[valid_mask(block, src.nodatavals[band - 1])]
+            merge_moments(accumulators[band], values)
+            if band in histograms:
+                accumulate_histogram(histograms[band], values, layouts[band])
+
+    statistics = {}
+    for band, accumulator in accumulators.items():
+        count = accumulator["count"]
+        if count == 0:
+            logging.warning(f"Band {band} contains only nodata values.")
+            statistics[band] = None
+            continue
+        statistics[band] = {
+            "count": count,
+            "mean": accumulator["mean"],
+            "std": float(np.sqrt(accumulator["m2"] / count)),
+            "min": float(accumulator["min"]),
+            "max": float(accumulator["max"]),
+            "histogram": histograms.get(band),
+            "layout": layouts.get(band),
+        }
+        if method != "zscore":
+            if band not in histograms:
+                logging.info(f"Selecting exact quantiles for band {band}.")
+            statistics[band].update(calculate_robust_statistics(
+                lambda band=band: iterate_band_values(src, band, block_size), statistics[band], method, bins
+            ))
+    return statistics
+
+def calculate_outlier_bounds(statistics, method, threshold):
+    """
+    Calculate the range of inlier values for one band.
+
+    Parameters:
+        statistics (dict): Band statistics from gather_band_statistics.
+        method (str): One of OUTLIER_METHODS.
+        threshold (float): Multiplier applied to the IQR, standard deviation or scaled MAD.
+
+    Returns:
+        tuple: (lower bound, upper bound) of the inlier values.
+    """
+    if method == "zscore":
+        spread = threshold * statistics["std"]
+        return statistics["mean"] - spread, statistics["mean"] + spread
 
-def convert_raster_to_geotiff(input_raster, output_raster):
+    if method == "iqr":
+        spread = threshold * (statistics["q3"] - statistics["q1"])
+        return statistics["q1"] - spread, statistics["q3"] + spread
+
+    spread = threshold * MAD_SCALE * statistics["mad"]
+    return statistics["median"] - spread, statistics["median"] + spread
+
+def default_nodata(dtype):
     """
-    Convert an input raster to GeoTIFF format and save the result.
+    Choose a nodata value for a data type when the input raster has none.
+
+    Parameters:
+        dtype (str): Data type of the raster.
+
+    Returns:
+        float: NaN for floating point types, otherwise the smallest (signed) or
+            largest (unsigned) representable value.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return float('nan')
+    info = np.iinfo(dtype)
+    return info.max if dtype.kind == 'u' else info.min
+
+def remove_block_outliers(block, nodata, bounds, action, output_nodata):
+    """
+    Replace or clamp the outliers of one band block, in place.
+
+    Parameters:
+        block (ndarray): Band values for one window. Modified in place.
+        nodata (float): Nodata value of the input band, or None.
+        bounds (tuple): (lower, upper) inlier bounds, or None for bands without valid data.
+        action (str): 'nodata' to mask outliers or 'clamp' to clip them to the bounds.
+        output_nodata (float): Nodata value of the output raster.
+
+    Returns:
+        int: Number of outliers in the block.
+    """
+    mask = valid_mask(block, nodata)
+    if nodata is not None and output_nodata != nodata:
+        block[~mask] = output_nodata
+    if bounds is None:
+        return 0
+
+    lower, upper = bounds
+    if block.dtype.kind in 'iu':
+        # Keep integer bounds inside the inlier range and the data type
+        info = np.iinfo(block.dtype)
+        lower = min(max(np.ceil(lower), info.min), info.max)
+        upper = min(max(np.floor(upper), info.min), info.max)
+    low_outliers = mask & (block < lower)
+    high_outliers = mask & (block > upper)
+    if action == "clamp":
+        block[low_outliers] = lower
+        block[high_outliers] = upper
+    else:
+        block[low_outliers | high_outliers] = output_nodata
+    return int(np.count_nonzero(low_outliers) + np.count_nonzero(high_outliers))
+
+def remove_raster_outliers(input_raster, output_raster, method="iqr", threshold=DEFAULT_THRESHOLD, action="nodata",
+                           bins=DEFAULT_HISTOGRAM_BINS, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Remove outliers from every band of a raster and save the result.
+
+    Bounds are derived per band from streamed statistics (see
+    gather_band_statistics), then a second windowed pass writes the outliers as
+    nodata or clamps them to the bounds. Memory use is bounded by a few windows,
+    so rasters larger than RAM are supported.
 
     Parameters:
         input_raster (str): Path to the input raster file.
-        output_raster (str): Path to save the GeoTIFF output.
+        output_raster (str): Path to save the cleaned raster.
+        method (str): 'iqr', 'zscore' or 'mad' (default: 'iqr').
+        threshold (float): Multiplier applied to the IQR, standard deviation or scaled MAD (default: 1.5).
+        action (str): 'nodata' to mask outliers or 'clamp' to clip them to the bounds (default: 'nodata').
+        bins (int): Number of histogram bins per refinement level for floating point bands (default: 65536).
+        block_size (int): Size of the processing windows in pixels (default: 1024).
     """
     try:
+        if method not in OUTLIER_METHODS:
+            raise ValueError(f"Invalid outlier method: {method}. Choose from {OUTLIER_METHODS}.")
+        if action not in OUTLIER_ACTIONS:
+            raise ValueError(f"Invalid outlier action: {action}. Choose from {OUTLIER_ACTIONS}.")
+        if threshold <= 0:
+            raise ValueError(f"The threshold must be positive, got {threshold}.")
+
         logging.info(f"Opening input raster: {input_raster}")
         with rasterio.open(input_raster) as src:
             # Validate the raster data
             validate_raster(src)
 
+            statistics = gather_band_statistics(src, method, bins, block_size)
+            if all(band_statistics is None for band_statistics in statistics.values()):
+                raise ValueError("The raster contains only nodata values. Outliers cannot be removed.")
+
+            bounds = {}
+            for band, band_statistics in statistics.items():
+                bounds[band] = None
+                if band_statistics is not None:
+                    bounds[band] = calculate_outlier_bounds(band_statistics, method, threshold)
+                    logging.info(f"Band {band} inlier range ({method}, threshold {threshold}): "
+                                 f"{bounds[band][0]} to {bounds[band][1]}")
+
+            output_nodata = src.nodata
+            if output_nodata is None and action == "nodata":
+                output_nodata = default_nodata(src.dtypes[0])
+                logging.info(f"The input has no nodata value. Marking outliers with {output_nodata}.")
+
             # Ensure output directory exists
-            output_dir = Path(output_raster).parent
-            output_dir.mkdir(parents=True, exist_ok=True)
+            Path(output_raster).parent.mkdir(parents=True, exist_ok=True)
+
+            meta = src.meta.copy()
+            meta.update({
+                "driver": "GTiff",
+                "nodata": output_nodata,
+                "tiled": True,
+                "blockxsize": OUTPUT_TILE_SIZE,
+                "blockysize": OUTPUT_TILE_SIZE,
+                "BIGTIFF": "IF_SAFER"
+            })
 
-            # Extract metadata for the output raster
-            metadata = extract_metadata(src)
+            logging.info(f"Writing cleaned raster to: {output_raster}")
+            outliers = {band: 0 for band in statistics}
+            with rasterio.open(output_raster, 'w', **meta) as dest:
+                for window in generate_windows(src.width, src.height, block_size):
+                    data = src.read(window=window)
+                    for band in statistics:
+                        outliers[band] += remove_block_outliers(
+                            data[band - 1], src.nodatavals[band - 1], bounds[band], action, output_nodata
+                        )
+                    dest.write(data, window=window)
 
-            # Write data to GeoTIFF
-            logging.info(f"Converting raster to GeoTIFF format and saving to: {output_raster}")
-            with rasterio.open(output_raster, 'w', **metadata) as dest:
-                for i in range(1, src.count + 1):  # Iterate over all bands
-                    logging.info(f"Processing band {i} of {src.count}")
-                    dest.write(src.read(i), i)
+            for band, count in outliers.items():
+                verb = "Clamped" if action == "clamp" else "Removed"
+                logging.info(f"{verb} {count} outlier(s) in band {band}.")
 
-        logging.info("Conversion to GeoTIFF completed successfully.")
+        logging.info("Outlier removal completed successfully.")
 
     except FileNotFoundError:
         logging.error(f"File not found: {input_raster}")
@@ -75,15 +354,218 @@ def convert_raster_to_geotiff(input_raster, output_raster):
     except rasterio.errors.RasterioIOError as e:
         logging.error(f"Rasterio error occurred: {e}")
     except Exception as e:
-        logging.error(f"An unexpected error occurred during conversion: {e}")
+        logging.error(f"An unexpected error occurred during outlier removal: {e}")
+
+def read_csv_chunks(input_csv, columns=None, chunk_rows=DEFAULT_CSV_CHUNK_ROWS):
+    """
+    Stream a CSV file in chunks of rows.
+
+    Parameters:
+        input_csv (str): Path to the CSV file.
+        columns (list): Columns to read (default: all columns).
+        chunk_rows (int): Number of rows per chunk.
+
+    Returns:
+        TextFileReader: Iterator over DataFrame chunks.
+    """
+    return pd.read_csv(input_csv, usecols=columns, chunksize=chunk_rows)
+
+def numeric_chunk_values(chunk, column):
+    """
+    Return the finite numeric values of one column of a chunk.
+
+    Parameters:
+        chunk (DataFrame): Chunk of rows.
+        column (str): Column name.
+
+    Returns:
+        ndarray: 1D float64 array of values, with non-numeric and missing entries removed.
+    """
+    values = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=np.float64)
+    return values[np.isfinite(values)]
+
+def iterate_column_values(input_csv, column, chunk_rows=DEFAULT_CSV_CHUNK_ROWS):
+    """
+    Yield the finite numeric values of one CSV column chunk by chunk.
+
+    Parameters:
+        input_csv (str): Path to the CSV file.
+        column (str): Column name.
+        chunk_rows (int): Number of rows per chunk.
+
+    Yields:
+        ndarray: 1D float64 array of values for each chunk.
+    """
+    for chunk in read_csv_chunks(input_csv, [column], chunk_rows):
+        yield numeric_chunk_values(chunk, column)
+
+def select_numeric_columns(input_csv, columns=None, sample_rows=10_000):
+    """
+    Determine which columns of a CSV file to check for outliers.
+
+    Parameters:
+        input_csv (str): Path to the CSV file.
+        columns (list): Columns requested by the caller (default: every numeric column).
+        sample_rows (int): Number of rows sampled to detect numeric columns.
+
+    Returns:
+        list: Column names.
+
+    Raises:
+        ValueError: If a requested column is missing or no numeric column is found.
+    """
+    sample = pd.read_csv(input_csv, nrows=sample_rows)
+    if columns:
+        missing = [column for column in columns if column not in sample.columns]
+        if missing:
+            raise ValueError(f"Columns not found in {input_csv}: {missing}")
+        return list(columns)
+
+    numeric = list(sample.select_dtypes(include='number').columns)
+    if not numeric:
+        raise ValueError(f"No numeric columns found in {input_csv}.")
+    return numeric
+
+def gather_column_statistics(input_csv, columns, method, chunk_rows=DEFAULT_CSV_CHUNK_ROWS,
+                             bins=DEFAULT_HISTOGRAM_BINS):
+    """
+    Stream over a CSV file and gather the statistics each column's outlier bounds need.
+
+    A first chunked pass collects count, mean, standard deviation, min and max
+    of every column. The iqr and mad methods need exact quantiles, so each
+    checked column then gets streaming selection passes over its chunks (see
+    calculate_robust_statistics). Only the checked columns are parsed and peak
+    memory does not depend on the number of rows.
+
+    Parameters:
+        input_csv (str): Path to the CSV file.
+        columns (list): Columns to check.
+        method (str): One of OUTLIER_METHODS.
+        chunk_rows (int): Number of rows per chunk.
+        bins (int): Number of histogram bins per refinement level.
+
+    Returns:
+        dict: Mapping of column name to statistics, or None for columns without numeric values,
+            in the form returned by gather_band_statistics.
+    """
+    accumulators = {
+        column: {"count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf}
+        for column in columns
+    }
+    logging.info(f"Gathering statistics for {len(columns)} column(s).")
+    for chunk in read_csv_chunks(input_csv, columns, chunk_rows):
+        for column in columns:
+            merge_moments(accumulators[column], numeric_chunk_values(chunk, column))
+
+    statistics = {}
+    for column, accumulator in accumulators.items():
+        count = accumulator["count"]
+        if count == 0:
+            logging.warning(f"Column {column} contains no numeric values.")
+            statistics[column] = None
+            continue
+        statistics[column] = {
+            "count": count,
+            "mean": accumulator["mean"],
+            "std": float(np.sqrt(accumulator["m2"] / count)),
+            "min": float(accumulator["min"]),
+            "max": float(accumulator["max"]),
+            "histogram": None,
+            "layout": None,
+        }
+        if method != "zscore":
+            logging.info(f"Selecting exact quantiles for column {column}.")
+            statistics[column].update(calculate_robust_statistics(
+                lambda column=column: iterate_column_values(input_csv, column, chunk_rows),
+                statistics[column], method, bins
+            ))
+    return statistics
+
+def remove_csv_outliers(input_csv, output_csv, method="iqr", threshold=DEFAULT_THRESHOLD, columns=None,
+                        chunk_rows=DEFAULT_CSV_CHUNK_ROWS):
+    """
+    Remove rows with outlying values from a CSV file and save the result.
+
+    Per-column bounds are derived from streamed statistics (see
+    gather_column_statistics), then a final chunked pass drops every row in which
+    any checked column lies outside its bounds and appends the remaining rows to
+    the output. Missing or non-numeric entries are not treated as outliers. Peak
+    memory depends on the chunk size and the selection limit, not on the file size.
+
+    Parameters:
+        input_csv (str): Path to the input CSV file.
+        output_csv (str): Path to save the cleaned CSV file.
+        method (str): 'iqr', 'zscore' or 'mad' (default: 'iqr').
+        threshold (float): Multiplier applied to the IQR, standard deviation or scaled MAD (default: 1.5).
+        columns (list): Columns to check (default: every numeric column).
+        chunk_rows (int): Number of rows per chunk (default: 500,000).
+    """
+    try:
+        if method not in OUTLIER_METHODS:
+            raise ValueError(f"Invalid outlier method: {method}. Choose from {OUTLIER_METHODS}.")
+        if threshold <= 0:
+            raise ValueError(f"The threshold must be positive, got {threshold}.")
+
+        logging.info(f"Opening input CSV: {input_csv}")
+        columns = select_numeric_columns(input_csv, columns)
+        statistics = gather_column_statistics(input_csv, columns, method, chunk_rows)
+
+        bounds = {}
+        for column, column_statistics in statistics.items():
+            if column_statistics is not None:
+                bounds[column] = calculate_outlier_bounds(column_statistics, method, threshold)
+                logging.info(f"Column {column} inlier range ({method}, threshold {threshold}): "
+                             f"{bounds[column][0]} to {bounds[column][1]}")
+
+        # Ensure output directory exists
+        Path(output_csv).parent.mkdir(parents=True, exist_ok=True)
+
+        logging.info(f"Writing cleaned rows to: {output_csv}")
+        total_rows = kept_rows = 0
+        header = True
+        for chunk in read_csv_chunks(input_csv, chunk_rows=chunk_rows):
+            keep = np.ones(len(chunk), dtype=bool)
+            for column, (lower, upper) in bounds.items():
+                values = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=np.float64)
+                keep &= ~((values < lower) | (values > upper))
+            chunk[keep].to_csv(output_csv, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            total_rows += len(chunk)
+            kept_rows += int(keep.sum())
+
+        logging.info(f"Removed {total_rows - kept_rows} of {total_rows} row(s) with outliers.")
+        logging.info("Outlier removal completed successfully.")
+
+    except FileNotFoundError:
+        logging.error(f"File not found: {input_csv}")
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
+    except pd.errors.ParserError as e:
+        logging.error(f"CSV parsing error: {e}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during outlier removal: {e}")
 
 def main():
-    # Define file paths
-    input_raster = 'data/raw_raster.xyz'
-    output_raster = 'data/processed/output_raster.tif'
+    parser = argparse.ArgumentParser(description="Remove outliers from every band of a raster or from a CSV file.")
+    parser.add_argument('input', nargs='?', default='data/raw_raster.tif', help="Path to the input raster or CSV file")
+    parser.add_argument('threshold', nargs='?', type=float, default=DEFAULT_THRESHOLD,
+                        help="Multiplier applied to the IQR, standard deviation or scaled MAD (default: 1.5)")
+    parser.add_argument('output', nargs='?', default='data/processed/cleaned_raster.tif',
+                        help="Path to save the cleaned raster or CSV file")
+    parser.add_argument('--method', choices=OUTLIER_METHODS, default="iqr", help="Outlier bounds (default: iqr)")
+    parser.add_argument('--action', choices=OUTLIER_ACTIONS, default="nodata",
+                        help="Raster only: mask outliers as nodata or clamp them to the bounds (default: nodata)")
+    parser.add_argument('--columns', nargs='*', help="CSV only: columns to check (default: every numeric column)")
+    args = parser.parse_args()
 
-    # Convert raster to GeoTIFF
-    convert_raster_to_geotiff(input_raster, output_raster)
+    if Path(args.input).suffix.lower() == '.csv':
+        # Drop rows with outliers from the CSV file
+        remove_csv_outliers(args.input, args.output, method=args.method, threshold=args.threshold,
+                            columns=args.columns)
+    else:
+        # Remove outliers from the raster
+        remove_raster_outliers(args.input, args.output, method=args.method, threshold=args.threshold,
+                               action=args.action)
 
 if __name__ == "__main__":
     main()
@@ -1,11 +1,29 @@
+import os
+import json
+import hashlib
+import argparse
 import rasterio
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+import rasterio.shutil
+from affine import Affine
+from rasterio.crs import CRS
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import calculate_default_transform, Resampling
 import logging
 from pathlib import Path
 
+import analysis_tools_path
+from calculate_slope import generate_windows
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Output window size (pixels) and internal tile size of the output GeoTIFF
+DEFAULT_BLOCK_SIZE = 1024
+OUTPUT_TILE_SIZE = 256
+
+# Working memory GDAL may use for one warp chunk, in MB
+DEFAULT_WARP_MEMORY_MB = 256
+
 def validate_raster(src):
     """
     Validate the input raster to ensure it contains valid data.
@@ -19,7 +37,7 @@ def validate_raster(src):
     if src.count == 0:
         raise ValueError("The input raster has no bands. Ensure the file contains valid data.")
 
-def calculate_transform(src_crs, target_crs, width, height, bounds):
+def calculate_transform(src_crs, target_crs, width, height, bounds, resolution=None):
     """
     Calculate the transform, width, and height for the target CRS.
 
@@ -29,27 +47,193 @@ def calculate_transform(src_crs, target_crs, width, height, bounds):
         width (int): Width of the source raster.
         height (int): Height of the source raster.
         bounds (tuple): Bounds of the source raster.
+        resolution (float): Target pixel size in target CRS units (default: derived from the source).
 
     Returns:
         tuple: (Affine transform, width, height) for the target CRS.
     """
     try:
         logging.info(f"Calculating transform for target CRS: {target_crs}")
-        return calculate_default_transform(src_crs, target_crs, width, height, *bounds)
+        return calculate_default_transform(src_crs, target_crs, width, height, *bounds, resolution=resolution)
     except Exception as e:
         logging.error(f"Error calculating transform: {e}")
         raise
 
-def reproject_raster(src_file, dst_file, target_crs='EPSG:4326', resampling_method=Resampling.nearest):
+def grid_cache_path(cache_dir, src, target_crs, resolution=None):
+    """
+    Return the cache file path for a source grid, CRS pair and resolution.
+
+    Co-registered rasters share the same key, so the target grid computed for
+    the first of them is reused by the rest.
+
+    Parameters:
+        cache_dir (str): Directory holding the grid cache.
+        src (DatasetReader): Opened source raster dataset.
+        target_crs (str): Target CRS.
+        resolution (float): Target pixel size, or None for the default.
+
+    Returns:
+        Path: Path of the target grid JSON file.
+    """
+    key = json.dumps({
+        "src_crs": src.crs.to_wkt(),
+        "src_transform": list(src.transform)[:6],
+        "src_shape": [src.height, src.width],
+        "target_crs": CRS.from_user_input(target_crs).to_wkt(),
+        "resolution": resolution,
+    }, sort_keys=True)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    return Path(cache_dir) / f"{digest}.json"
+
+def load_target_grid(src, target_crs, resolution=None, cache_dir=None):
+    """
+    Determine the target grid of a reprojection, using the grid cache when given.
+
+    Parameters:
+        src (DatasetReader): Opened source raster dataset.
+        target_crs (str): Target CRS.
+        resolution (float): Target pixel size, or None for the default.
+        cache_dir (str): Directory holding the grid cache (optional).
+
+    Returns:
+        tuple: (Affine transform, width, height) for the target CRS.
+    """
+    if cache_dir is None:
+        return calculate_transform(src.crs, target_crs, src.width, src.height, src.bounds, resolution)
+
+    grid_path = grid_cache_path(cache_dir, src, target_crs, resolution)
+    if grid_path.exists():
+        logging.info(f"Using cached target grid: {grid_path}")
+        with open(grid_path) as f:
+            grid = json.load(f)
+        return Affine(*grid["transform"]), grid["width"], grid["height"]
+
+    transform, width, height = calculate_transform(
+        src.crs, target_crs, src.width, src.height, src.bounds, resolution
+    )
+    grid_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = grid_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_path, 'w') as f:
+        json.dump({"transform": list(transform)[:6], "width": width, "height": height}, f)
+    os.replace(temp_path, grid_path)
+    return transform, width, height
+
+def open_warped(src, target_crs, transform, width, height, resampling_method=Resampling.nearest,
+                num_threads=None, warp_mem_limit=DEFAULT_WARP_MEMORY_MB):
+    """
+    Open a warped view of all bands of a raster on a target grid.
+
+    Windows read from the view are warped on demand, all bands in one warp
+    operation, so the coordinate transformation is computed once per chunk
+    rather than once per band. GDAL splits each warp across num_threads threads.
+
+    Parameters:
+        src (DatasetReader): Opened source raster dataset.
+        target_crs (str): Target CRS.
+        transform (Affine): Transform of the target grid.
+        width (int): Width of the target grid in pixels.
+        height (int): Height of the target grid in pixels.
+        resampling_method (Resampling): Resampling method (default is Resampling.nearest).
+        num_threads (int): Number of warp threads (default: number of CPU cores).
+        warp_mem_limit (int): Warp working memory in MB (default: 256).
+
+    Returns:
+        WarpedVRT: The warped dataset view. The caller must close it.
+    """
+    num_threads = num_threads or os.cpu_count() or 1
+    return WarpedVRT(
+        src,
+        crs=target_crs,
+        transform=transform,
+        width=width,
+        height=height,
+        resampling=resampling_method,
+        warp_mem_limit=warp_mem_limit,
+        NUM_THREADS=num_threads
+    )
+
+def create_virtual_reprojection(src_file, vrt_file, target_crs='EPSG:4326', resampling_method=Resampling.nearest,
+                                num_threads=None, warp_mem_limit=DEFAULT_WARP_MEMORY_MB, resolution=None,
+                                grid_cache_dir=None):
+    """
+    Save a virtual warped dataset (GDAL VRT) that reprojects a raster on demand.
+
+    The VRT file holds only the warp definition and a reference to the source,
+    so no full-size intermediate raster is written. Any tool that opens rasters
+    with rasterio (clipping, statistics, NDVI, slope) accepts the .vrt path and
+    only the windows it actually reads are warped, with the same thread count
+    and warp memory limit as a full reprojection.
+
+    Parameters:
+        src_file (str): Path to the input raster file.
+        vrt_file (str): Path to save the VRT file.
+        target_crs (str): EPSG code for the target CRS (default is 'EPSG:4326').
+        resampling_method (Resampling): Resampling method (default is Resampling.nearest).
+        num_threads (int): Number of warp threads (default: number of CPU cores).
+        warp_mem_limit (int): Warp working memory in MB (default: 256).
+        resolution (float): Target pixel size in target CRS units (default: derived from the source).
+        grid_cache_dir (str): Directory for the target grid cache (optional).
+    """
+    try:
+        logging.info(f"Opening source raster: {src_file}")
+        # The VRT references its source by absolute path, so it opens from any working directory
+        with rasterio.open(os.path.abspath(src_file)) as src:
+            validate_raster(src)
+            transform, width, height = load_target_grid(src, target_crs, resolution, grid_cache_dir)
+
+            Path(vrt_file).parent.mkdir(parents=True, exist_ok=True)
+            logging.info(f"Saving virtual reprojection to: {vrt_file}")
+            with open_warped(
+                src, target_crs, transform, width, height, resampling_method, num_threads, warp_mem_limit
+            ) as vrt:
+                rasterio.shutil.copy(vrt, vrt_file, driver='VRT')
+
+        logging.info("Virtual reprojection created successfully.")
+
+    except FileNotFoundError:
+        logging.error(f"File not found: {src_file}")
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
+    except rasterio.errors.RasterioIOError as e:
+        logging.error(f"Rasterio error: {e}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during reprojection: {e}")
+
+def reproject_raster(src_file, dst_file, target_crs='EPSG:4326', resampling_method=Resampling.nearest,
+                     num_threads=None, warp_mem_limit=DEFAULT_WARP_MEMORY_MB, block_size=DEFAULT_BLOCK_SIZE,
+                     resolution=None, grid_cache_dir=None):
     """
     Reproject a raster to a target CRS and save the result.
 
+    All bands are warped together through a warped VRT and written to a tiled
+    GeoTIFF one output window at a time, so memory use is bounded by the block
+    size and warp memory limit and the warp itself runs on several threads.
+
+    A dst_file ending in .vrt creates a virtual warped dataset instead (see
+    create_virtual_reprojection) and no pixels are warped up front.
+
+    With grid_cache_dir set, the target grid is cached per source grid, CRS pair
+    and resolution, so co-registered time-series scenes skip
+    calculate_default_transform. The resampling itself is always done by GDAL.
+
     Parameters:
         src_file (str): Path to the input raster file.
         dst_file (str): Path to save the reprojected raster file.
         target_crs (str): EPSG code for the target CRS (default is 'EPSG:4326').
         resampling_method (Resampling): Resampling method (default is Resampling.nearest).
+        num_threads (int): Number of warp threads (default: number of CPU cores).
+        warp_mem_limit (int): Warp working memory in MB (default: 256).
+        block_size (int): Size of the output windows in pixels (default: 1024).
+        resolution (float): Target pixel size in target CRS units (default: derived from the source).
+        grid_cache_dir (str): Directory for the target grid cache (optional).
     """
+    if Path(dst_file).suffix.lower() == '.vrt':
+        create_virtual_reprojection(
+            src_file, dst_file, target_crs, resampling_method, num_threads, warp_mem_limit, resolution,
+            grid_cache_dir
+        )
+        return
+
     try:
         logging.info(f"Opening source raster: {src_file}")
         with rasterio.open(src_file) as src:
@@ -57,17 +241,20 @@ def reproject_raster(src_file, dst_file, target_crs='EPSG:4326', resampling_meth
             validate_raster(src)
 
             # Calculate transformation, width, and height for the new CRS
-            transform, width, height = calculate_transform(
-                src.crs, target_crs, src.width, src.height, src.bounds
-            )
+            transform, width, height = load_target_grid(src, target_crs, resolution, grid_cache_dir)
 
             # Create metadata for the destination file
             dst_meta = src.meta.copy()
             dst_meta.update({
+                'driver': 'GTiff',
                 'crs': target_crs,
                 'transform': transform,
                 'width': width,
-                'height': height
+                'height': height,
+                'tiled': True,
+                'blockxsize': OUTPUT_TILE_SIZE,
+                'blockysize': OUTPUT_TILE_SIZE,
+                'BIGTIFF': 'IF_SAFER'
             })
 
             # Ensure output directory exists
@@ -75,19 +262,14 @@ def reproject_raster(src_file, dst_file, target_crs='EPSG:4326', resampling_meth
             output_dir.mkdir(parents=True, exist_ok=True)
 
             # Reproject and save the raster
-            logging.info(f"Reprojecting raster and saving to: {dst_file}")
-            with rasterio.open(dst_file, 'w', **dst_meta) as dst:
-                for i in range(1, src.count + 1):
-                    logging.info(f"Reprojecting band {i} of {src.count}")
-                    reproject(
-                        source=rasterio.band(src, i),
-                        destination=rasterio.band(dst, i),
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=transform,
-                        dst_crs=target_crs,
-                        resampling=resampling_method
-                    )
+            logging.info(f"Reprojecting {src.count} band(s) and saving to: {dst_file}")
+            with open_warped(
+                src, target_crs, transform, width, height, resampling_method, num_threads, warp_mem_limit
+            ) as vrt, rasterio.open(dst_file, 'w', **dst_meta) as dst:
+                windows = list(generate_windows(width, height, block_size))
+                logging.info(f"Warping {len(windows)} windows.")
+                for window in windows:
+                    dst.write(vrt.read(window=window), window=window)
 
         logging.info("Reprojection completed successfully.")
 
@@ -101,12 +283,31 @@ def reproject_raster(src_file, dst_file, target_crs='EPSG:4326', resampling_meth
         logging.error(f"An unexpected error occurred during reprojection: {e}")
 
 def main():
-    # Define input and output file paths
-    src_file = 'raw_data/landsat_2020.tif'
-    dst_file = 'processed_data/landsat_2020_reprojected.tif'
+    parser = argparse.ArgumentParser(description="Reproject a raster to a target CRS.")
+    parser.add_argument('--input', default='raw_data/landsat_2020.tif', help="Path to the input raster")
+    parser.add_argument('--output', default='processed_data/landsat_2020_reprojected.tif',
+                        help="Path to save the reprojected raster; a .vrt path creates a virtual warped dataset")
+    parser.add_argument('--crs', default='EPSG:4326', help="Target CRS (default: EPSG:4326)")
+    parser.add_argument('--resampling', choices=[method.name for method in Resampling], default='nearest',
+                        help="Resampling method (default: nearest)")
+    parser.add_argument('--threads', type=int, help="Number of warp threads (default: number of CPU cores)")
+    parser.add_argument('--warp-mem', type=int, default=DEFAULT_WARP_MEMORY_MB,
+                        help="Warp working memory in MB (default: 256)")
+    parser.add_argument('--resolution', type=float, help="Target pixel size in target CRS units")
+    parser.add_argument('--grid-cache', help="Directory for caching target grids across runs")
+    args = parser.parse_args()
 
     # Reproject the raster
-    reproject_raster(src_file, dst_file)
+    reproject_raster(
+        args.input,
+        args.output,
+        target_crs=args.crs,
+        resampling_method=Resampling[args.resampling],
+        num_threads=args.threads,
+        warp_mem_limit=args.warp_mem,
+        resolution=args.resolution,
+        grid_cache_dir=args.grid_cache
+    )
 
 if __name__ == "__main__":
     main()
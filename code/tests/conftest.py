@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The tools import their sibling modules by name, so put both tool directories on the path
+CODE_DIR = Path(__file__).resolve().parent.parent
+for directory in ("data_preprocessing", "analysis_tools"):
+    sys.path.insert(0, str(CODE_DIR / directory))
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from pyproj import Geod
+from shapely.geometry import Point
+
+from buffer_engine import buffer_geometries_geodesic
+
+GEOD = Geod(ellps="WGS84")
+
+
+@pytest.mark.parametrize("projection", ["utm", "aeqd"])
+@pytest.mark.parametrize("longitude", [179.999, -179.999])
+def test_buffer_across_antimeridian(projection, longitude):
+    distance = 500.0
+    buffered, = buffer_geometries_geodesic(np.array([Point(longitude, -16.5)], dtype=object), "EPSG:4326",
+                                           distance, projection)
+
+    assert buffered.is_valid
+    assert buffered.geom_type == "MultiPolygon"
+    west, south, east, north = buffered.bounds
+    assert -180 <= west and east <= 180
+    assert north - south < 0.01
+
+    area, _ = GEOD.geometry_area_perimeter(buffered)
+    assert abs(area) == pytest.approx(np.pi * distance ** 2, rel=0.01)
+
+
+def test_buffer_away_from_antimeridian_stays_polygon():
+    buffered, = buffer_geometries_geodesic(np.array([Point(10, 50)], dtype=object), "EPSG:4326", 500.0)
+
+    assert buffered.geom_type == "Polygon"
+    area, _ = GEOD.geometry_area_perimeter(buffered)
+    assert abs(area) == pytest.approx(np.pi * 500.0 ** 2, rel=0.01)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from remove_outliers import gather_band_statistics, gather_column_statistics, remove_raster_outliers
+
+
+def write_spiked_raster(path):
+    """Write two float32 bands of N(100, 10) noise, each with a single +/-1e6 spike."""
+    rng = np.random.default_rng(0)
+    data = rng.normal(100, 10, (2, 300, 400)).astype(np.float32)
+    data[0, 5, 5] = 1e6
+    data[1, 7, 7] = -1e6
+    with rasterio.open(path, 'w', driver='GTiff', width=400, height=300, count=2, dtype='float32',
+                       crs='EPSG:32633', transform=from_origin(0, 3000, 10, 10)) as dst:
+        dst.write(data)
+    return data.astype(np.float64)
+
+
+@pytest.mark.parametrize("method", ["iqr", "mad"])
+def test_spike_does_not_blur_quantiles(tmp_path, method):
+    data = write_spiked_raster(tmp_path / "spiked.tif")
+    with rasterio.open(tmp_path / "spiked.tif") as src:
+        statistics = gather_band_statistics(src, method)
+
+    for band, values in enumerate(data, start=1):
+        values = values.ravel()
+        if method == "iqr":
+            expected = np.percentile(values, [25, 75])
+            actual = [statistics[band]["q1"], statistics[band]["q3"]]
+        else:
+            median = np.median(values)
+            expected = [median, np.median(np.abs(values - median))]
+            actual = [statistics[band]["median"], statistics[band]["mad"]]
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)
+
+
+def test_spiked_raster_removes_expected_outliers(tmp_path):
+    data = write_spiked_raster(tmp_path / "spiked.tif")
+    remove_raster_outliers(str(tmp_path / "spiked.tif"), str(tmp_path / "cleaned.tif"), method="mad", threshold=3)
+
+    with rasterio.open(tmp_path / "cleaned.tif") as dst:
+        cleaned = dst.read()
+    for band, values in enumerate(data):
+        median = np.median(values)
+        spread = 3 * 1.4826 * np.median(np.abs(values - median))
+        expected = np.count_nonzero(np.abs(values - median) > spread)
+        assert np.count_nonzero(np.isnan(cleaned[band])) == expected
+
+
+@pytest.mark.parametrize("method", ["iqr", "mad"])
+def test_csv_quantiles_match_numpy_across_chunks(tmp_path, method):
+    rng = np.random.default_rng(1)
+    values = rng.normal(50, 5, 20_000)
+    values[[3, 11]] = [1e9, -1e9]
+    csv = tmp_path / "points.csv"
+    pd.DataFrame({"id": np.arange(values.size), "value": values}).to_csv(csv, index=False)
+
+    statistics = gather_column_statistics(str(csv), ["value"], method, chunk_rows=3_000)["value"]
+    if method == "iqr":
+        expected = np.percentile(values, [25, 75])
+        actual = [statistics["q1"], statistics["q3"]]
+    else:
+        median = np.median(values)
+        expected = [median, np.median(np.abs(values - median))]
+        actual = [statistics["median"], statistics["mad"]]
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)